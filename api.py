@@ -0,0 +1,240 @@
+"""Headless HTTP API over the same services as the Gradio app.
+
+    python api.py --workers 4 --port 8000
+    uvicorn api:app --workers 4
+
+Every worker process builds its own ChatModule graph over the shared
+LOCAL_DATA_PATH: the docstore, catalog, sparse index, chat histories and
+ingestion jobs are SQLite databases safe to share between processes, and
+vectors live in Qdrant. The embedded vector store is single-process, so it is
+limited to one worker.
+"""
+import os
+import base64
+import logging
+import argparse
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import List
+
+import uvicorn
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from injector import Injector
+from pydantic import BaseModel
+
+from rag.config import Config
+from rag.services.chat_service import ChatService
+from rag.services.voice_service import VoiceChatService
+from rag.services.ingest_jobs import IngestJobService
+from rag.manager.llm_manager import LLMManager
+from rag.manager.index_manager import IndexManager
+from rag.manager.catalog_manager import CatalogManager
+from rag.manager.rerank_manager import RerankManager
+from rag.manager.response_cache import ResponseCache
+from rag.manager.embed_manager import EmbeddingManager
+from rag.manager.session_manager import DEFAULT_SESSION_ID, SessionManager
+from rag.manager.voice.audio_io import read_wav, wav_bytes
+from rag.services.request_queue import RequestQueue
+from rag import telemetry
+from rag.startup import log_startup_report, timed
+from main import ChatModule
+
+injector = Injector([ChatModule()])
+config = injector.get(Config)
+logging.basicConfig(level=config.LOG_LEVEL)
+# Workers cannot share METRICS_PORT; each one serves its own metrics on /metrics.
+telemetry.configure(replace(config, METRICS_PORT=0))
+logger = logging.getLogger(__name__)
+
+
+class ChatRequest(BaseModel):
+    message: str
+    session_id: str = DEFAULT_SESSION_ID
+
+
+class ChatResponse(BaseModel):
+    response: str
+    session_id: str
+
+
+def warm_up() -> None:
+    """Load the text chat path in the background, like the Gradio app does."""
+    try:
+        with timed("text chat ready"):
+            injector.get(IndexManager)
+            injector.get(ChatService)
+        # Joins the election for running ingestion jobs.
+        injector.get(IngestJobService)
+        injector.get(LLMManager).warm_up()
+        if config.RERANK_ENABLED:
+            with timed("reranker"):
+                injector.get(RerankManager).warm_up()
+        if config.WARMUP_VOICE:
+            with timed("voice chat ready"):
+                voice_chat_service = injector.get(VoiceChatService)
+                voice_chat_service.voice_to_text.warm_up()
+                voice_chat_service.text_to_voice.warm_up()
+    except Exception as e:
+        logger.error(f"Warm-up failed, components will load on first use: {e}")
+    finally:
+        log_startup_report()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.WARMUP_ON_START:
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+
+
+app = FastAPI(title="RAG Chat API", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    response = await injector.get(ChatService).achat(request.message, session_id=request.session_id)
+    return ChatResponse(response=response, session_id=request.session_id)
+
+
+@app.post("/chat/stream")
+async def stream_chat(request: ChatRequest):
+    """The answer as a plain text stream, token by token.
+
+    Disconnecting stops generation, and the unfinished turn is left out of the history.
+    """
+    tokens = injector.get(ChatService).astream_chat(request.message, session_id=request.session_id)
+    return StreamingResponse(tokens, media_type="text/plain; charset=utf-8")
+
+
+@app.delete("/chat/{session_id}", status_code=204)
+def reset_chat(session_id: str):
+    injector.get(ChatService).reset_chat(session_id=session_id)
+
+
+@app.post("/voice")
+def voice_chat(audio: UploadFile = File(...), session_id: str = Form(DEFAULT_SESSION_ID)):
+    """Answer a recorded question (PCM WAV); the spoken answer comes back as a base64 WAV."""
+    try:
+        data, sample_rate = read_wav(audio.file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Expected a PCM WAV file: {e}")
+    transcription, response, speech = injector.get(VoiceChatService).voice_chat(
+        data, sample_rate, session_id=session_id
+    )
+    return {
+        "transcription": transcription,
+        "response": response,
+        "audio": base64.b64encode(wav_bytes(speech, config.TTS_SAMPLE_RATE)).decode("ascii") if speech is not None else None,
+        "session_id": session_id,
+    }
+
+
+@app.post("/ingest", status_code=202)
+def ingest(files: List[UploadFile] = File(...)):
+    """Queue the uploaded files as one ingestion job; poll /ingest/jobs/{job_id} for progress."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for position, upload in enumerate(files):
+            name = Path(upload.filename or "").name
+            if not name:
+                raise HTTPException(status_code=400, detail="Uploaded file has no name")
+            # The job copies each file into its own directory, keeping the name the index knows it by.
+            path = Path(directory, str(position), name)
+            path.parent.mkdir()
+            with open(path, "wb") as f:
+                while chunk := upload.file.read(1 << 20):
+                    f.write(chunk)
+            paths.append(str(path))
+        job_id = injector.get(IngestJobService).submit(paths)
+    return {"job_id": job_id}
+
+
+@app.get("/ingest/jobs")
+def list_jobs(limit: int = 20):
+    return [asdict(job) for job in injector.get(IngestJobService).list_jobs(limit)]
+
+
+@app.get("/ingest/jobs/{job_id}")
+def get_job(job_id: str):
+    job = injector.get(IngestJobService).get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return asdict(job)
+
+
+@app.delete("/ingest/jobs/{job_id}")
+def cancel_job(job_id: str):
+    status = injector.get(IngestJobService).cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"No job {job_id}")
+    return {"job_id": job_id, "status": status}
+
+
+@app.get("/files")
+def list_files(offset: int = 0, limit: int = 50):
+    """Indexed files, most recently ingested first."""
+    catalog = injector.get(CatalogManager)
+    return {
+        "total": catalog.stats()["files"],
+        "files": [asdict(file) for file in catalog.list_files(offset=offset, limit=limit)],
+    }
+
+
+@app.delete("/files/{file_name}")
+def delete_file(file_name: str):
+    if injector.get(CatalogManager).get_file(file_name) is None:
+        raise HTTPException(status_code=404, detail=f"{file_name} is not indexed")
+    pages = injector.get(IndexManager).delete_file(file_name)
+    return {"file_name": file_name, "pages": pages}
+
+
+@app.get("/stats")
+def stats():
+    """Corpus totals, and the caches and queues of the worker that answered."""
+    return {
+        "pid": os.getpid(),
+        "corpus": injector.get(CatalogManager).stats(),
+        "sessions": len(injector.get(SessionManager)),
+        "llm_queue": injector.get(RequestQueue).stats(),
+        "response_cache": injector.get(ResponseCache).stats(),
+        "embedding_cache": injector.get(EmbeddingManager).cache_stats(),
+        "query_embedding_batches": injector.get(EmbeddingManager).batch_stats(),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(telemetry.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.API_HOST)
+    parser.add_argument("--port", type=int, default=config.API_PORT)
+    parser.add_argument("--workers", type=int, default=config.API_WORKERS)
+    args = parser.parse_args()
+    if args.workers > 1:
+        single_process = [
+            f"{name}={value!r}" for name, value, shared in (
+                ("VECTOR_STORE_BACKEND", config.VECTOR_STORE_BACKEND, "qdrant"),
+                ("DOCSTORE_BACKEND", config.DOCSTORE_BACKEND, "sqlite"),
+                ("CHAT_STORE_BACKEND", config.CHAT_STORE_BACKEND, "sqlite"),
+            ) if value != shared
+        ]
+        if single_process:
+            parser.error(f"--workers {args.workers} needs stores shared between processes; "
+                         f"these are per process: {', '.join(single_process)}")
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
+import math
+import time
 import base64
+import logging
+import threading
 import gradio as gr
 from pathlib import Path
 from rag.config import Config
-from rag.manager.file_manager import FileManager
 
 from injector import Injector
 from rag.services.chat_service import ChatService
@@ -11,52 +14,177 @@ from rag.manager.llm_manager import LLMManager
 from rag.manager.embed_manager import EmbeddingManager
 from rag.manager.vector_store_manager import VectorStoreManager
 from rag.manager.index_manager import IndexManager
+from rag.manager.catalog_manager import CatalogManager
 from rag.manager.node_manager import NodeManager
+from rag.manager.rerank_manager import RerankManager
+from rag.services.ingest_jobs import IngestJobService
+from rag import telemetry
+from rag.startup import log_startup_report, timed
 from main import ChatModule
 
 # Injector configuration to initialize dependencies
 injector = Injector([ChatModule()])
+logging.basicConfig(level=injector.get(Config).LOG_LEVEL)
+telemetry.configure(injector.get(Config))
+logger = logging.getLogger(__name__)
+
+FILES_PER_PAGE = 20
+CATALOG_HEADERS = ["File", "Pages", "Chunks", "Size (KB)", "Embedding model", "Indexed at"]
+JOB_HEADERS = ["Job", "File", "Status", "Pages parsed", "Nodes embedded", "Nodes upserted", "Error"]
+JOBS_SHOWN = 10
+JOB_POLL_SECONDS = 2
 
 class GradioRAGChat:
     def __init__(self):
-        # Inject necessary services
-        self.chat_service = injector.get(ChatService)
-        self.voice_chat_service = injector.get(VoiceChatService)
-        self.index_manager = injector.get(IndexManager)
-        self.chat_history = []
-
-    def upload_file(self, file):
-        """Handle file upload and indexing."""
-        if file is not None:
-            documents = FileManager.load_file(file.name)
-            if documents:
-                self.index_manager.ingest(documents)
-                return "File uploaded and indexed successfully!"
-            else:
-                return "Error processing the file."
-        return "No file uploaded."
-
-    def chat(self, message, history):
-        """Process user message and update chat history."""
-        self.chat_history = history or []
-        response = self.chat_service.chat(message)
-        self.chat_history.append((message, response))
-        return self.chat_history, self.chat_history
-
-    def voice_chat(self, audio):
-        """Process voice input, transcribe, chat, and convert response to speech."""
+        # Services are resolved on first use (or by the warm-up thread) so the UI comes up
+        # without waiting for Qdrant, the index or any model. Injector singletons are thread-safe.
+        self.config = injector.get(Config)
+        if self.config.WARMUP_ON_START:
+            threading.Thread(target=self.warm_up, name="warm-up", daemon=True).start()
+
+    @property
+    def chat_service(self) -> ChatService:
+        return injector.get(ChatService)
+
+    @property
+    def voice_chat_service(self) -> VoiceChatService:
+        return injector.get(VoiceChatService)
+
+    @property
+    def index_manager(self) -> IndexManager:
+        return injector.get(IndexManager)
+
+    @property
+    def catalog(self) -> CatalogManager:
+        return injector.get(CatalogManager)
+
+    @property
+    def ingest_jobs(self) -> IngestJobService:
+        return injector.get(IngestJobService)
+
+    def warm_up(self):
+        """Load the text chat path (and optionally the voice models) in the background."""
+        try:
+            with timed("text chat ready"):
+                self.index_manager
+                self.chat_service
+            # Starts the job workers, which resume jobs interrupted by the last shutdown.
+            self.ingest_jobs
+            # Loads the model in Ollama and caches the prompt prefix before the first user.
+            injector.get(LLMManager).warm_up()
+            if self.config.RERANK_ENABLED:
+                with timed("reranker"):
+                    injector.get(RerankManager).warm_up()
+            if self.config.WARMUP_VOICE:
+                with timed("voice chat ready"):
+                    voice_chat_service = self.voice_chat_service
+                    voice_chat_service.voice_to_text.warm_up()
+                    voice_chat_service.text_to_voice.warm_up()
+        except Exception as e:
+            logger.error(f"Warm-up failed, components will load on first use: {e}")
+        finally:
+            log_startup_report()
+
+    def upload_file(self, files):
+        """Queue the uploaded files as one background ingestion job."""
+        if not files:
+            return "No file uploaded."
+        files = files if isinstance(files, list) else [files]
+        try:
+            job_id = self.ingest_jobs.submit(files)
+        except Exception as e:
+            logger.error(f"Error queueing {len(files)} files: {e}")
+            return "Error processing the file."
+        return f"Queued job {job_id} with {len(files)} file(s); progress is shown below."
+
+    def list_jobs(self):
+        """One row per file of the most recent ingestion jobs."""
+        rows = []
+        for job in self.ingest_jobs.list_jobs(JOBS_SHOWN):
+            for file in job.files:
+                status = file.status
+                if job.cancel_requested and status == "running":
+                    status = "cancelling"
+                elif job.status == "cancelled" and status == "queued":
+                    status = "cancelled"
+                pages = f"{file.pages_parsed}/{file.total_pages}" if file.total_pages else str(file.pages_parsed)
+                rows.append([
+                    job.job_id, file.file_name, status, pages, file.nodes_embedded, file.nodes_upserted, file.error or "",
+                ])
+        return rows
+
+    def cancel_job(self, job_id):
+        """Cancel a queued or running ingestion job."""
+        job_id = (job_id or "").strip()
+        status = self.ingest_jobs.cancel(job_id) if job_id else None
+        if status is None:
+            message = f"No job {job_id}." if job_id else "No job id given."
+        elif status in ("queued", "running"):
+            message = f"Cancelling job {job_id}."
+        else:
+            message = f"Job {job_id} is already {status}."
+        return message, self.list_jobs()
+
+    def refresh_ingest_status(self, page):
+        """Polled while the upload tab is open: job progress and the indexed files."""
+        return (self.list_jobs(), *self.list_files(page))
+
+    def list_files(self, page):
+        """One page of the indexed files, most recently ingested first."""
+        page = max(1, int(page or 1))
+        stats = self.catalog.stats()
+        files = self.catalog.list_files(offset=(page - 1) * FILES_PER_PAGE, limit=FILES_PER_PAGE)
+        rows = [
+            [
+                file.file_name, file.documents, file.nodes, round(file.bytes / 1024, 1), file.embed_model or "",
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(file.last_ingested)),
+            ]
+            for file in files
+        ]
+        pages = max(1, math.ceil(stats["files"] / FILES_PER_PAGE))
+        summary = f"{stats['files']} files, {stats['documents']} pages, {stats['nodes']} chunks (page {page} of {pages})"
+        return rows, summary
+
+    def delete_file(self, file_name, page):
+        """Remove a file from the index and refresh the file list."""
+        file_name = (file_name or "").strip()
+        if not file_name:
+            status = "No file name given."
+        elif self.catalog.get_file(file_name) is None:
+            status = f"{file_name} is not indexed."
+        else:
+            pages = self.index_manager.delete_file(file_name)
+            status = f"Deleted {file_name} ({pages} pages)."
+        return (status, *self.list_files(page))
+
+    async def chat(self, message, history, request: gr.Request):
+        """Stream the answer to the user message into this session's chat history."""
+        history = (history or []) + [(message, "")]
+        response = ""
+        # Gradio cancels this task when the user stops or leaves, which cancels the stream.
+        async for token in self.chat_service.astream_chat(message, session_id=request.session_hash):
+            response += token
+            history[-1] = (message, response)
+            yield history, history
+
+    def voice_chat(self, audio, history, request: gr.Request):
+        """Transcribe the recorded clip, chat, and answer with speech, all in memory."""
+        history = history or []
         if audio is not None:
-            transcription, response = self.voice_chat_service.run_voice_chat()
+            sample_rate, data = audio
+            transcription, response, speech = self.voice_chat_service.voice_chat(
+                data, sample_rate, session_id=request.session_hash
+            )
             if transcription and response:
-                self.chat_history.append((transcription, response))
-                return gr.Audio(value="output.wav", visible=True), self.chat_history, self.chat_history
-        return None, self.chat_history, self.chat_history
+                history.append((transcription, response))
+                if speech is not None:
+                    return gr.Audio(value=(self.config.TTS_SAMPLE_RATE, speech), visible=True), history, history
+        return None, history, history
 
-    def reset_chat(self):
-        """Reset the chat history and conversation context."""
-        self.chat_history = []
-        self.chat_service.reset_chat()
-        return self.chat_history
+    def reset_chat(self, request: gr.Request):
+        """Reset the chat history and conversation context of this session."""
+        self.chat_service.reset_chat(session_id=request.session_hash)
+        return []
 
     def launch(self):
         """Launch the Gradio app with a custom layout and functionality."""
@@ -88,26 +216,58 @@ class GradioRAGChat:
 
             # Upload Document Tab
             with gr.Tab("Upload Document"):
-                file_upload = gr.File(label="Upload PDF Document")
+                file_upload = gr.File(label="Upload PDF Documents", file_count="multiple")
                 upload_button = gr.Button("Upload and Index")
                 upload_output = gr.Textbox(label="Upload Status")
-                upload_button.click(self.upload_file, inputs=file_upload, outputs=upload_output)
+
+                gr.Markdown("### Ingestion jobs")
+                job_table = gr.Dataframe(headers=JOB_HEADERS, interactive=False)
+                with gr.Row():
+                    cancel_id = gr.Textbox(label="Job")
+                    cancel_button = gr.Button("Cancel job")
+                cancel_output = gr.Textbox(label="Cancel Status")
+
+                gr.Markdown("### Indexed files")
+                catalog_summary = gr.Markdown()
+                catalog_table = gr.Dataframe(headers=CATALOG_HEADERS, interactive=False)
+                with gr.Row():
+                    catalog_page = gr.Number(value=1, label="Page", precision=0)
+                    refresh_button = gr.Button("Refresh")
+                with gr.Row():
+                    delete_name = gr.Textbox(label="File name")
+                    delete_button = gr.Button("Delete from index")
+                delete_output = gr.Textbox(label="Delete Status")
+
+                upload_button.click(self.upload_file, inputs=file_upload, outputs=upload_output).then(
+                    self.list_jobs, outputs=job_table
+                )
+                cancel_button.click(self.cancel_job, inputs=cancel_id, outputs=[cancel_output, job_table])
+                refresh_button.click(self.list_files, inputs=catalog_page, outputs=[catalog_table, catalog_summary])
+                catalog_page.submit(self.list_files, inputs=catalog_page, outputs=[catalog_table, catalog_summary])
+                delete_button.click(
+                    self.delete_file,
+                    inputs=[delete_name, catalog_page],
+                    outputs=[delete_output, catalog_table, catalog_summary],
+                )
 
             # Text Chat Tab
             with gr.Tab("Text Chat"):
                 chatbot = gr.Chatbot(label="Chat History")
                 msg = gr.Textbox(label="Message")
-                clear = gr.Button("Clear")
-                msg.submit(self.chat, inputs=[msg, chatbot], outputs=[chatbot, chatbot])
+                with gr.Row():
+                    stop = gr.Button("Stop")
+                    clear = gr.Button("Clear")
+                chat_event = msg.submit(self.chat, inputs=[msg, chatbot], outputs=[chatbot, chatbot])
+                stop.click(None, cancels=[chat_event])
                 clear.click(self.reset_chat, outputs=chatbot)
 
             # Voice Chat Tab
             with gr.Tab("Voice Chat"):
-                audio_input = gr.Audio(source="microphone", type="filepath")
+                audio_input = gr.Audio(source="microphone", type="numpy")
                 voice_output = gr.Audio(label="AI Response", visible=False)
                 voice_chatbot = gr.Chatbot(label="Voice Chat History")
                 voice_clear = gr.Button("Clear Voice Chat")
-                audio_input.stop_recording(self.voice_chat, inputs=[audio_input], outputs=[voice_output, voice_chatbot, voice_chatbot])
+                audio_input.stop_recording(self.voice_chat, inputs=[audio_input, voice_chatbot], outputs=[voice_output, voice_chatbot, voice_chatbot])
                 voice_clear.click(self.reset_chat, outputs=voice_chatbot)
 
             # Footer with logo
@@ -116,7 +276,17 @@ class GradioRAGChat:
                     f"<div class='footer'><img class='footer-logo' src='{f_base64}' alt='Chat'></div>"
                 )
 
-        # Launch the Gradio interface
+            # The catalog is a small SQLite file, so listing does not wait for the index to load.
+            demo.load(self.list_files, inputs=catalog_page, outputs=[catalog_table, catalog_summary])
+            demo.load(
+                self.refresh_ingest_status,
+                inputs=catalog_page,
+                outputs=[job_table, catalog_table, catalog_summary],
+                every=JOB_POLL_SECONDS,
+            )
+
+        # Launch the Gradio interface; streaming handlers need the queue
+        demo.queue()
         demo.launch()
 
 
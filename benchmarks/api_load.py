@@ -0,0 +1,169 @@
+"""Throughput and latency of the HTTP API (api.py) under concurrent clients.
+
+    python -m benchmarks.api_load --workers 1 2 4 --clients 16 --requests 20
+    python -m benchmarks.api_load --url http://localhost:8000 --clients 32 --stream
+
+With --workers, a server is started for each worker count (python api.py --workers N,
+against the Ollama and Qdrant in rag/config.py) and stopped afterwards; with --url a
+running server is measured. Each client keeps its own session and sends distinct
+questions back to back, so answers do not come from the response cache. One round of
+--clients requests warms the workers up first and is not counted.
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.harness import percentiles
+from benchmarks.run import RESULTS_DIR, git_commit
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+QUESTIONS = [
+    "What is the interest rate on fixed deposits?",
+    "How do I open a savings account?",
+    "What are the charges for an international transfer?",
+    "Which documents are needed for a home loan?",
+    "What is the minimum balance for a current account?",
+]
+
+
+async def run(url: str, clients: int, requests_per_client: int, stream: bool, timeout: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors = 0
+
+    async def user(client: httpx.AsyncClient, n: int) -> None:
+        nonlocal errors
+        session_id = f"load-{n}-{time.time_ns()}"
+        for i in range(requests_per_client):
+            body = {"message": f"{QUESTIONS[i % len(QUESTIONS)]} (client {n}, question {i})", "session_id": session_id}
+            begin = time.perf_counter()
+            try:
+                if stream:
+                    first_token = None
+                    async with client.stream("POST", "/chat/stream", json=body) as response:
+                        response.raise_for_status()
+                        async for chunk in response.aiter_text():
+                            if first_token is None and chunk:
+                                first_token = time.perf_counter() - begin
+                    first_tokens.append(first_token if first_token is not None else time.perf_counter() - begin)
+                else:
+                    response = await client.post("/chat", json=body)
+                    response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - begin)
+        try:
+            await client.delete(f"/chat/{session_id}")
+        except httpx.HTTPError:
+            pass
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+        begin = time.perf_counter()
+        await asyncio.gather(*(user(client, n) for n in range(clients)))
+        elapsed = time.perf_counter() - begin
+
+    result = {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_s": len(latencies) / elapsed,
+        "latency": percentiles(latencies) if latencies else {},
+    }
+    if stream:
+        result["first_token"] = percentiles(first_tokens) if first_tokens else {}
+    return result
+
+
+def start_server(workers: int, port: int, startup_timeout: float) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "api.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=REPO_ROOT,
+    )
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"api.py --workers {workers} exited with code {server.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    stop_server(server)
+    raise RuntimeError(f"api.py --workers {workers} did not answer /health within {startup_timeout:.0f}s")
+
+
+def stop_server(server: subprocess.Popen) -> None:
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def measure(url: str, workers: Optional[int], args: argparse.Namespace) -> Dict[str, Any]:
+    asyncio.run(run(url, args.clients, 1, args.stream, args.timeout))
+    result = {"workers": workers, **asyncio.run(run(url, args.clients, args.requests, args.stream, args.timeout))}
+    line = (
+        f"  workers={workers if workers is not None else '?':<3} clients={args.clients:<3} "
+        f"{result['requests_per_s']:8.2f} requests/s  errors {result['errors']}"
+    )
+    if result["latency"]:
+        line += f"  p50 {result['latency']['p50_ms']:.0f}ms  p99 {result['latency']['p99_ms']:.0f}ms"
+    if result.get("first_token"):
+        line += f"  first token p50 {result['first_token']['p50_ms']:.0f}ms"
+    print(line, file=sys.stderr)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="A running server; otherwise one is started for each --workers.")
+    target.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8765, help="For the servers started with --workers.")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=10, help="Per client.")
+    parser.add_argument("--stream", action="store_true", help="Use /chat/stream and report the time to first token.")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per request, in seconds.")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, help="Defaults to benchmarks/results/api-load-<commit>-<time>.json")
+    args = parser.parse_args()
+
+    results = []
+    if args.url:
+        results.append(measure(args.url, None, args))
+    else:
+        for workers in args.workers:
+            server = start_server(workers, args.port, args.startup_timeout)
+            try:
+                results.append(measure(f"http://127.0.0.1:{args.port}", workers, args))
+            finally:
+                stop_server(server)
+
+    commit = git_commit()
+    output = args.output or RESULTS_DIR / f"api-load-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "url": args.url,
+        "requests_per_client": args.requests,
+        "stream": args.stream,
+        "results": results,
+    }, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Compare two benchmark result files: python -m benchmarks.compare OLD.json NEW.json"""
+import sys
+import json
+from typing import Any, Dict, List, Tuple
+
+# (section, metric, higher_is_better)
+METRICS: List[Tuple[str, str, bool]] = [
+    ("ingest", "nodes_per_s", True),
+    ("chat", "p50_ms", False),
+    ("chat", "p90_ms", False),
+    ("chat", "p99_ms", False),
+    ("startup", "cold_s", False),
+    ("startup", "warm_s", False),
+    ("", "peak_rss_mb", False),
+]
+
+
+def load(path: str) -> Dict[int, Dict[str, Any]]:
+    with open(path) as f:
+        return {result["pages"]: result for result in json.load(f)["results"]}
+
+
+def value(result: Dict[str, Any], section: str, metric: str) -> float:
+    return (result.get(section, {}) if section else result).get(metric, float("nan"))
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        raise SystemExit(__doc__)
+    old, new = load(sys.argv[1]), load(sys.argv[2])
+    for pages in sorted(old.keys() & new.keys()):
+        print(f"{pages} pages")
+        for section, metric, higher_is_better in METRICS:
+            before, after = value(old[pages], section, metric), value(new[pages], section, metric)
+            change = (after - before) / before * 100 if before else float("nan")
+            better = change > 0 if higher_is_better else change < 0
+            marker = "" if abs(change) < 5 else ("  better" if better else "  WORSE")
+            name = f"{section}.{metric}" if section else metric
+            print(f"  {name:<20} {before:>12.2f} -> {after:>12.2f}  ({change:+.1f}%){marker}")
+
+
+if __name__ == "__main__":
+    main()
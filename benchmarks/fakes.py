@@ -0,0 +1,120 @@
+"""Deterministic, latency-configurable stand-ins for the Ollama embedding model and LLM."""
+import time
+import zlib
+import asyncio
+import threading
+from typing import Any, List, Optional
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.llms import (
+    CompletionResponse, CompletionResponseAsyncGen, CompletionResponseGen, CustomLLM, LLMMetadata,
+)
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+from rag.manager.sparse_index_manager import tokenize
+
+
+class FakeEmbedding(BaseEmbedding):
+    """Hashed bag-of-words vectors: texts sharing words are similar, so retrieval is meaningful."""
+
+    dim: int = Field(default=384)
+    latency_ms: float = Field(default=0.0, description="Sleep per call (one call embeds a whole batch).")
+    text_latency_ms: float = Field(default=0.0, description="Extra sleep per text in a call.")
+    server_slots: int = Field(default=0, description="Calls served at once, like OLLAMA_NUM_PARALLEL; 0 is unlimited.")
+    _slots: Optional[threading.Semaphore] = PrivateAttr(default=None)
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._slots = threading.BoundedSemaphore(self.server_slots) if self.server_slots > 0 else None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            # crc32 rather than hash(): stable across processes and runs.
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dim] += 1.0 if bucket & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm > 0 else vector).tolist()
+
+    def _sleep(self, texts: int = 1) -> None:
+        seconds = (self.latency_ms + self.text_latency_ms * texts) / 1000.0
+        if not seconds:
+            return
+        if self._slots is None:
+            time.sleep(seconds)
+            return
+        with self._slots:
+            time.sleep(seconds)
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        self._sleep()
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        self._sleep()
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self._sleep(len(texts))
+        return [self._vector(text) for text in texts]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+
+class FakeLLM(CustomLLM):
+    """Emits a fixed answer of num_tokens tokens after first_token_ms, then one every token_ms."""
+
+    num_tokens: int = Field(default=64)
+    first_token_ms: float = Field(default=0.0)
+    token_ms: float = Field(default=0.0)
+    context_window: int = Field(default=8192)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "FakeLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(context_window=self.context_window, num_output=self.num_tokens, model_name="fake")
+
+    def _tokens(self, prompt: str) -> List[str]:
+        words = tokenize(prompt)[-self.num_tokens:] or ["ok"]
+        return [f"{words[i % len(words)]} " for i in range(self.num_tokens)]
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        time.sleep((self.first_token_ms + self.token_ms * max(0, self.num_tokens - 1)) / 1000.0)
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        def gen() -> CompletionResponseGen:
+            text = ""
+            for i, token in enumerate(self._tokens(prompt)):
+                time.sleep((self.first_token_ms if i == 0 else self.token_ms) / 1000.0)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+        return gen()
+
+    # Like the Ollama async client, the async methods wait without blocking the event loop.
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        await asyncio.sleep((self.first_token_ms + self.token_ms * max(0, self.num_tokens - 1)) / 1000.0)
+        return CompletionResponse(text="".join(self._tokens(prompt)))
+
+    @llm_completion_callback()
+    async def astream_complete(self, prompt: str, formatted: bool = False,
+                               **kwargs: Any) -> CompletionResponseAsyncGen:
+        async def gen() -> CompletionResponseAsyncGen:
+            text = ""
+            for i, token in enumerate(self._tokens(prompt)):
+                await asyncio.sleep((self.first_token_ms if i == 0 else self.token_ms) / 1000.0)
+                text += token
+                yield CompletionResponse(text=text, delta=token)
+        return gen()
@@ -0,0 +1,177 @@
+"""ChatModule wired to the fakes and an in-memory Qdrant, plus the measurements themselves."""
+import gc
+import sys
+import time
+import resource
+import statistics
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+from injector import Injector, provider, singleton
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from main import ChatModule
+from rag.config import Config
+from rag.manager.embed_manager import EmbeddingManager
+from rag.manager.index_manager import IndexManager
+from rag.manager.llm_manager import LLMManager
+from rag.manager.vector_store_manager import VectorStoreManager
+from rag.services.chat_service import ChatService
+from rag.startup import startup_report
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+
+
+class FakeLLMManager(LLMManager):
+    def __init__(self, config: Config, llm: FakeLLM) -> None:
+        self._fake = llm
+        super().__init__(config)
+
+    def _create_llm(self, config):
+        return self._fake
+
+
+class FakeEmbeddingManager(EmbeddingManager):
+    def __init__(self, config: Config, embed_model: FakeEmbedding) -> None:
+        self._fake = embed_model
+        super().__init__(config)
+
+    def _create_base_model(self, config):
+        return self._fake
+
+    def _embed_queries(self, queries):
+        # Fake query and text vectors are the same; one call (one latency_ms sleep) per batch, like Ollama.
+        return self._fake.get_text_embedding_batch(queries)
+
+
+class InMemoryVectorStoreManager(VectorStoreManager):
+    def __init__(self, config: Config, client: QdrantClient) -> None:
+        self._shared_client = client
+        super().__init__(config)
+
+    def _create_clients(self, config: Config) -> Tuple[QdrantClient, Optional[AsyncQdrantClient]]:
+        # A second ":memory:" async client would not see the same data; the benchmark is sync only.
+        return self._shared_client, None
+
+
+class BenchmarkModule(ChatModule):
+    """Same graph as the app; only the Ollama and Qdrant edges are replaced.
+
+    The Qdrant client is passed in so a "restart" (a new Injector) sees the
+    vectors the previous one ingested, like a real Qdrant server would.
+    """
+
+    def __init__(self, config: Config, client: QdrantClient, llm: FakeLLM, embed_model: FakeEmbedding) -> None:
+        self._config = config
+        self._client = client
+        self._llm = llm
+        self._embed_model = embed_model
+
+    @singleton
+    @provider
+    def provide_config(self) -> Config:
+        return self._config
+
+    @singleton
+    @provider
+    def provide_llm_manager(self, config: Config) -> LLMManager:
+        return FakeLLMManager(config, self._llm)
+
+    @singleton
+    @provider
+    def provide_embedding_manager(self, config: Config) -> EmbeddingManager:
+        return FakeEmbeddingManager(config, self._embed_model)
+
+    @singleton
+    @provider
+    def provide_vector_store_manager(self, config: Config) -> VectorStoreManager:
+        return InMemoryVectorStoreManager(config, self._client)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p90_ms": pick(0.90) * 1000,
+        "p99_ms": pick(0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def start(module: BenchmarkModule) -> Tuple[Injector, float]:
+    begin = time.perf_counter()
+    injector = Injector([module])
+    injector.get(IndexManager)
+    injector.get(ChatService)
+    return injector, time.perf_counter() - begin
+
+
+def run_benchmark(config: Config, num_pages: int, num_queries: int, llm: FakeLLM,
+                  embed_model: FakeEmbedding, files_per_batch: int = 10) -> Dict[str, Any]:
+    client = QdrantClient(":memory:")
+    corpus = SyntheticCorpus(num_pages)
+
+    injector, cold_start = start(BenchmarkModule(config, client, llm, embed_model))
+    index_manager = injector.get(IndexManager)
+
+    pages = 0
+    batch: List = []
+    begin = time.perf_counter()
+    for documents in corpus.files():
+        batch.extend(documents)
+        if len(batch) >= files_per_batch * corpus.pages_per_file:
+            pages += len(index_manager.ingest(batch))
+            batch = []
+    if batch:
+        pages += len(index_manager.ingest(batch))
+    ingest_seconds = time.perf_counter() - begin
+    nodes = len(index_manager.storage_context.docstore.docs)
+
+    chat_service = injector.get(ChatService)
+    latencies = []
+    for i, query in enumerate(corpus.queries(num_queries)):
+        session_id = f"bench-{i}"
+        begin = time.perf_counter()
+        chat_service.chat(query, session_id=session_id)
+        latencies.append(time.perf_counter() - begin)
+        chat_service.reset_chat(session_id)
+
+    del injector, index_manager, chat_service
+    gc.collect()
+    _, warm_start = start(BenchmarkModule(config, client, llm, embed_model))
+
+    return {
+        "pages": num_pages,
+        "nodes": nodes,
+        "startup": {
+            "cold_s": cold_start,
+            "warm_s": warm_start,
+            "components_ms": {name: seconds * 1000 for name, seconds in startup_report().items()},
+        },
+        "ingest": {
+            "seconds": ingest_seconds,
+            "pages_per_s": pages / ingest_seconds if ingest_seconds else 0.0,
+            "nodes_per_s": nodes / ingest_seconds if ingest_seconds else 0.0,
+        },
+        "chat": percentiles(latencies) if latencies else {},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def describe(llm: FakeLLM, embed_model: FakeEmbedding, config: Config) -> Dict[str, Any]:
+    return {
+        "llm": {"num_tokens": llm.num_tokens, "first_token_ms": llm.first_token_ms, "token_ms": llm.token_ms},
+        "embedding": {"dim": embed_model.dim, "latency_ms": embed_model.latency_ms},
+        "config": asdict(config),
+    }
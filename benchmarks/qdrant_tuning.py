@@ -0,0 +1,161 @@
+"""Recall versus latency for the Qdrant collection settings in Config.
+
+    python -m benchmarks.qdrant_tuning --points 200000 --queries 200
+    python -m benchmarks.qdrant_tuning --quantization none scalar binary --on-disk --ef 32 64 128 256
+    python -m benchmarks.qdrant_tuning --set QDRANT_GRPC=true --set QDRANT_HNSW_M=32
+
+Needs a Qdrant server (QDRANT_HOST/QDRANT_PORT); every collection setting is
+built in a throwaway collection through VectorStoreManager, and every search
+setting (ef, rescoring) is measured against exact top-k computed in numpy.
+--local runs against an in-memory client to check the script itself; local
+mode searches exhaustively, so its numbers say nothing about the settings.
+"""
+import sys
+import json
+import uuid
+import time
+import logging
+import argparse
+import itertools
+import statistics
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+from qdrant_client import QdrantClient
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from rag.config import Config
+from rag.manager.vector_store_manager import VectorStoreManager, search_params
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fakes import FakeEmbedding
+from benchmarks.run import RESULTS_DIR, git_commit, parse_overrides
+
+
+def embed_corpus(points: int, queries: int, dim: int):
+    corpus = SyntheticCorpus(points)
+    embed_model = FakeEmbedding(dim=dim)
+    texts = [document.text for documents in corpus.files() for document in documents]
+    vectors = np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+    query_vectors = np.asarray([embed_model.get_query_embedding(q) for q in corpus.queries(queries)], dtype=np.float32)
+    return vectors, query_vectors
+
+
+def exact_top_k(vectors: np.ndarray, query_vectors: np.ndarray, top_k: int) -> List[List[int]]:
+    normed = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    scores = query_vectors @ normed.T
+    return [list(np.argsort(-row)[:top_k]) for row in scores]
+
+
+def wait_until_indexed(client: QdrantClient, collection: str, timeout: float = 600.0) -> float:
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if client.get_collection(collection).status == "green":
+            break
+        time.sleep(0.5)
+    return time.perf_counter() - start
+
+
+def make_manager(config: Config, local_client: QdrantClient = None) -> VectorStoreManager:
+    if local_client is not None:
+        from benchmarks.harness import InMemoryVectorStoreManager
+        return InMemoryVectorStoreManager(config, local_client)
+    return VectorStoreManager(config)
+
+
+def build_collection(config: Config, vectors: np.ndarray, local_client: QdrantClient = None):
+    manager = make_manager(config, local_client)
+    if manager.client.collection_exists(config.QDRANT_COLLECTION):
+        # Left over from an interrupted run; start from an empty collection.
+        manager.client.delete_collection(config.QDRANT_COLLECTION)
+        manager = make_manager(config, local_client)
+    # Qdrant point ids must be integers or UUIDs.
+    nodes = [TextNode(id_=str(uuid.UUID(int=i)), text="", embedding=vector.tolist(), metadata={"position": i})
+             for i, vector in enumerate(vectors)]
+    start = time.perf_counter()
+    manager.vector_store.add(nodes)
+    upsert_s = time.perf_counter() - start
+    index_s = wait_until_indexed(manager.client, config.QDRANT_COLLECTION)
+    return manager, upsert_s, index_s
+
+
+def measure(manager: VectorStoreManager, config: Config, query_vectors: np.ndarray,
+            truth: List[List[int]], top_k: int) -> Dict[str, Any]:
+    params = search_params(config)
+    latencies, hits = [], 0
+    for query_vector, expected in zip(query_vectors, truth):
+        start = time.perf_counter()
+        result = manager.vector_store.query(
+            VectorStoreQuery(query_embedding=query_vector.tolist(), similarity_top_k=top_k),
+            search_params=params,
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {node.metadata["position"] for node in result.nodes}
+        hits += len(found & set(int(i) for i in expected))
+    latencies.sort()
+    return {
+        "recall": hits / (len(truth) * top_k),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--quantization", nargs="+", default=["none", "scalar", "binary"])
+    parser.add_argument("--on-disk", action="store_true", help="Also build every setting with vectors on disk.")
+    parser.add_argument("--ef", type=int, nargs="+", default=[0, 32, 64, 128, 256], help="0 is Qdrant's default.")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Config override.")
+    parser.add_argument("--local", action="store_true", help="In-memory client; checks the script only.")
+    parser.add_argument("--output", type=Path, help="Defaults to benchmarks/results/qdrant-<commit>-<time>.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    base = replace(Config(**parse_overrides(args.set)), QDRANT_COLLECTION="rag_tuning_benchmark")
+    print(f"Embedding {args.points} points and {args.queries} queries...", file=sys.stderr)
+    vectors, query_vectors = embed_corpus(args.points, args.queries, args.dim)
+    truth = exact_top_k(vectors, query_vectors, args.top_k)
+    local_client = QdrantClient(":memory:") if args.local else None
+
+    results = []
+    for quantization, on_disk in itertools.product(args.quantization, [False, True] if args.on_disk else [False]):
+        config = replace(base, QDRANT_QUANTIZATION=quantization, QDRANT_ON_DISK=on_disk)
+        manager, upsert_s, index_s = build_collection(config, vectors, local_client)
+        try:
+            for ef, rescore in itertools.product(args.ef, [True, False] if quantization != "none" else [True]):
+                setting = replace(config, QDRANT_HNSW_EF=ef, QDRANT_QUANTIZATION_RESCORE=rescore)
+                result = {
+                    "quantization": quantization, "on_disk": on_disk, "ef": ef, "rescore": rescore,
+                    "upsert_points_per_s": len(vectors) / upsert_s, "index_s": index_s,
+                    **measure(manager, setting, query_vectors, truth, args.top_k),
+                }
+                print(
+                    f"  {quantization:>6} on_disk={on_disk!s:5} ef={ef or 'default':>7} rescore={rescore!s:5} "
+                    f"recall@{args.top_k} {result['recall']:.3f}  p50 {result['p50_ms']:.2f}ms  "
+                    f"p99 {result['p99_ms']:.2f}ms", file=sys.stderr,
+                )
+                results.append(result)
+        finally:
+            manager.client.delete_collection(config.QDRANT_COLLECTION)
+
+    commit = git_commit()
+    output = args.output or RESULTS_DIR / f"qdrant-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "points": args.points, "dim": args.dim, "top_k": args.top_k, "local": args.local,
+        "hnsw": {"m": base.QDRANT_HNSW_M, "ef_construct": base.QDRANT_HNSW_EF_CONSTRUCT},
+        "upsert": {"batch_size": base.UPSERT_BATCH_SIZE, "concurrency": base.QDRANT_UPSERT_CONCURRENCY},
+        "results": results,
+    }, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
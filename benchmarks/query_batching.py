@@ -0,0 +1,97 @@
+"""Query embedding throughput and latency under concurrency, with and without micro-batching.
+
+    python -m benchmarks.query_batching --embed-latency-ms 15 --threads 1 4 16 32
+    python -m benchmarks.query_batching --set EMBED_QUERY_BATCH_WAIT_MS=5 --set EMBED_QUERY_BATCH_SIZE=32
+
+Each thread embeds distinct queries back to back through EmbeddingManager with
+the cache off, against a FakeEmbedding that serves --server-slots calls at a
+time (Ollama runs embedding requests for a model one after the other by
+default) and costs --embed-latency-ms per call plus --embed-text-ms per query.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List
+
+from rag.config import Config
+from benchmarks.fakes import FakeEmbedding
+from benchmarks.harness import FakeEmbeddingManager, percentiles
+from benchmarks.run import RESULTS_DIR, git_commit, parse_overrides
+
+
+def run(config: Config, threads: int, queries_per_thread: int, embed_model: FakeEmbedding) -> Dict[str, Any]:
+    manager = FakeEmbeddingManager(config, embed_model)
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+
+    def worker(n: int) -> None:
+        for i in range(queries_per_thread):
+            begin = time.perf_counter()
+            manager.embedding_model.get_query_embedding(f"question {i} from user {n} about deposit rates")
+            latencies[n].append(time.perf_counter() - begin)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    begin = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - begin
+    return {
+        "batching": config.EMBED_QUERY_BATCHING,
+        "threads": threads,
+        "queries_per_s": threads * queries_per_thread / elapsed,
+        "latency": percentiles([latency for thread in latencies for latency in thread]),
+        "batches": manager.batch_stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--queries", type=int, default=50, help="Per thread.")
+    parser.add_argument("--embed-latency-ms", type=float, default=15.0)
+    parser.add_argument("--embed-text-ms", type=float, default=1.0)
+    parser.add_argument("--server-slots", type=int, default=1, help="0 is unlimited.")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Config override.")
+    parser.add_argument("--output", type=Path, help="Defaults to benchmarks/results/query-batching-<commit>-<time>.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    base = replace(Config(**parse_overrides(args.set)), EMBED_CACHE_ENABLED=False)
+    results = []
+    for threads in args.threads:
+        for batching in (False, True):
+            embed_model = FakeEmbedding(latency_ms=args.embed_latency_ms, text_latency_ms=args.embed_text_ms,
+                                        server_slots=args.server_slots)
+            result = run(replace(base, EMBED_QUERY_BATCHING=batching), threads, args.queries, embed_model)
+            mean_batch = result["batches"].get("mean_batch_size", 1.0)
+            print(
+                f"  threads={threads:<3} batching={batching!s:5} {result['queries_per_s']:8.1f} queries/s  "
+                f"p50 {result['latency']['p50_ms']:.1f}ms  p99 {result['latency']['p99_ms']:.1f}ms  "
+                f"mean batch {mean_batch:.1f}", file=sys.stderr,
+            )
+            results.append(result)
+
+    commit = git_commit()
+    output = args.output or RESULTS_DIR / f"query-batching-{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embed_latency_ms": args.embed_latency_ms,
+        "embed_text_ms": args.embed_text_ms,
+        "server_slots": args.server_slots,
+        "max_batch_size": base.EMBED_QUERY_BATCH_SIZE,
+        "max_wait_ms": base.EMBED_QUERY_BATCH_WAIT_MS,
+        "results": results,
+    }, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
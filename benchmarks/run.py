@@ -0,0 +1,135 @@
+"""Offline benchmarks: ingest throughput, chat latency, startup time and peak RSS.
+
+    python -m benchmarks.run --pages 1000 10000 --queries 200
+    python -m benchmarks.run --pages 100000 --embed-latency-ms 15 --set RETRIEVAL_MODE=hybrid
+
+Every size runs in its own process so peak RSS is per size. Results are
+written as JSON (see benchmarks/compare.py to diff two runs).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, List
+
+from rag.config import Config
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def parse_overrides(pairs: List[str]) -> Dict[str, Any]:
+    types = {field.name: field.type for field in fields(Config)}
+    overrides = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        if key not in types:
+            raise SystemExit(f"Unknown Config field: {key}")
+        kind = types[key]
+        overrides[key] = value.lower() in ("1", "true", "yes") if kind is bool else kind(value)
+    return overrides
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_single(args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks.fakes import FakeEmbedding, FakeLLM
+    from benchmarks.harness import describe, run_benchmark
+
+    data_dir = tempfile.mkdtemp(prefix="rag-bench-")
+    try:
+        config = Config(**{
+            # Reranking would download a model; the response cache would turn the latency
+            # numbers into cache hits. Both can be switched back on with --set.
+            "RERANK_ENABLED": False,
+            "RESPONSE_CACHE_ENABLED": False,
+            **parse_overrides(args.set),
+            "LOCAL_DATA_PATH": data_dir,
+            "SHOW_PROGRESS": False,
+        })
+        llm = FakeLLM(num_tokens=args.llm_tokens, first_token_ms=args.llm_first_token_ms, token_ms=args.llm_token_ms)
+        embed_model = FakeEmbedding(dim=args.embed_dim, latency_ms=args.embed_latency_ms,
+                                    embed_batch_size=config.EMBED_BATCH_SIZE)
+        result = run_benchmark(config, args.single, args.queries, llm, embed_model)
+        result["setup"] = describe(llm, embed_model, config)
+        return result
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000], help="Corpus sizes (one node per page).")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--embed-dim", type=int, default=384)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Per embedding call (batch).")
+    parser.add_argument("--llm-tokens", type=int, default=64)
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0)
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="Config override.")
+    parser.add_argument("--output", type=Path, help="Defaults to benchmarks/results/<commit>-<time>.json")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.single is not None:
+        json.dump(run_single(args), sys.stdout)
+        return
+
+    results = []
+    for pages in args.pages:
+        command = [
+            sys.executable, "-m", "benchmarks.run", "--single", str(pages),
+            "--queries", str(args.queries),
+            "--embed-dim", str(args.embed_dim),
+            "--embed-latency-ms", str(args.embed_latency_ms),
+            "--llm-tokens", str(args.llm_tokens),
+            "--llm-first-token-ms", str(args.llm_first_token_ms),
+            "--llm-token-ms", str(args.llm_token_ms),
+        ]
+        for override in args.set:
+            command += ["--set", override]
+        print(f"Benchmarking {pages} pages...", file=sys.stderr)
+        completed = subprocess.run(command, capture_output=True, text=True, cwd=Path(__file__).parent.parent)
+        if completed.returncode != 0:
+            print(completed.stderr, file=sys.stderr)
+            raise SystemExit(f"Benchmark for {pages} pages failed")
+        result = json.loads(completed.stdout)
+        chat = result["chat"]
+        print(
+            f"  {result['nodes']} nodes: ingest {result['ingest']['nodes_per_s']:.0f} nodes/s, "
+            f"chat p50 {chat.get('p50_ms', 0):.1f}ms p99 {chat.get('p99_ms', 0):.1f}ms, "
+            f"warm start {result['startup']['warm_s']:.2f}s, peak RSS {result['peak_rss_mb']:.0f}MB",
+            file=sys.stderr,
+        )
+        results.append(result)
+
+    commit = git_commit()
+    output = args.output or RESULTS_DIR / f"{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }, indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
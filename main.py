@@ -4,12 +4,20 @@ from rag.manager.node_manager import NodeManager
 from rag.manager.index_manager import IndexManager
 from rag.manager.embed_manager import EmbeddingManager
 from rag.manager.vector_store_manager import VectorStoreManager
+from rag.manager.session_manager import SessionManager
+from rag.manager.response_cache import ResponseCache
+from rag.manager.sparse_index_manager import SparseIndexManager
+from rag.manager.catalog_manager import CatalogManager
+from rag.manager.rerank_manager import RerankManager
 from rag.manager.voice.voice_to_text_manager import VoiceToTextManager
 from rag.manager.voice.text_to_voice_manager import TextToVoiceManager
 from rag.services.voice_service import VoiceChatService
 from rag.services.chat_service import ChatService
+from rag.services.request_queue import RequestQueue
+from rag.services.ingest_jobs import IngestJobService
 
 from rag.config import Config
+from rag.startup import timed
 from llama_index.core.storage import StorageContext
 
 class ChatModule(Module):
@@ -21,22 +29,57 @@ class ChatModule(Module):
     @singleton
     @provider
     def provide_llm_manager(self, config: Config) -> LLMManager:
-        return LLMManager(config)
+        with timed("llm"):
+            return LLMManager(config)
 
     @singleton
     @provider
     def provide_embedding_manager(self, config: Config) -> EmbeddingManager:
-        return EmbeddingManager(config)
+        with timed("embedding"):
+            return EmbeddingManager(config)
 
     @singleton
     @provider
     def provide_vector_store_manager(self, config: Config) -> VectorStoreManager:
-        return VectorStoreManager(config)
+        with timed("vector store"):
+            return VectorStoreManager(config)
 
     @singleton
     @provider
     def provide_node_manager(self, config: Config) -> NodeManager:
-        return NodeManager(config)
+        with timed("docstore"):
+            return NodeManager(config)
+
+    @singleton
+    @provider
+    def provide_session_manager(self, config: Config) -> SessionManager:
+        return SessionManager(config)
+
+    @singleton
+    @provider
+    def provide_response_cache(self, config: Config, catalog: CatalogManager) -> ResponseCache:
+        return ResponseCache(config, catalog)
+
+    @singleton
+    @provider
+    def provide_sparse_index_manager(self, config: Config) -> SparseIndexManager:
+        with timed("sparse index"):
+            return SparseIndexManager(config)
+
+    @singleton
+    @provider
+    def provide_catalog_manager(self, config: Config) -> CatalogManager:
+        return CatalogManager(config)
+
+    @singleton
+    @provider
+    def provide_rerank_manager(self, config: Config) -> RerankManager:
+        return RerankManager(config)
+
+    @singleton
+    @provider
+    def provide_request_queue(self, config: Config) -> RequestQueue:
+        return RequestQueue(config)
 
     @singleton
     @provider
@@ -49,13 +92,26 @@ class ChatModule(Module):
 
     @singleton
     @provider
-    def provide_index_manager(self, config: Config, storage_context: StorageContext, embedding_manager: EmbeddingManager) -> IndexManager:
-        return IndexManager(
-            storage_context=storage_context,
-            embed_model=embedding_manager.embedding_model,
-            local_data_path=config.LOCAL_DATA_PATH,
-            show_progress=config.SHOW_PROGRESS,
-        )
+    def provide_index_manager(self, config: Config, storage_context: StorageContext, embedding_manager: EmbeddingManager,
+                              response_cache: ResponseCache, sparse_index: SparseIndexManager,
+                              catalog: CatalogManager) -> IndexManager:
+        with timed("index"):
+            return IndexManager(
+                storage_context=storage_context,
+                embed_model=embedding_manager.embedding_model,
+                local_data_path=config.LOCAL_DATA_PATH,
+                show_progress=config.SHOW_PROGRESS,
+                num_workers=config.INGEST_WORKERS,
+                embed_concurrency=config.EMBED_CONCURRENCY,
+                response_cache=response_cache,
+                sparse_index=sparse_index,
+                catalog=catalog,
+            )
+    @singleton
+    @provider
+    def provide_ingest_job_service(self, config: Config, index_manager: IndexManager) -> IngestJobService:
+        return IngestJobService(config, index_manager)
+
     @singleton
     @provider
     def provide_voice_chat_service(self, config: Config, chat_service: ChatService,
@@ -5,16 +5,92 @@ class Config:
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
     QDRANT_COLLECTION: str = "rag_collection"
+    VECTOR_STORE_BACKEND: str = "qdrant"  # "qdrant" or "embedded" (in-process, under LOCAL_DATA_PATH)
+    EMBEDDED_HNSW: bool = True  # ANN index for the embedded store if hnswlib is installed; exact search otherwise
+    EMBEDDED_HNSW_M: int = 16
+    EMBEDDED_HNSW_EF_CONSTRUCT: int = 100
+    EMBEDDED_HNSW_EF: int = 64
+    QDRANT_GRPC: bool = False  # talk to Qdrant over gRPC on QDRANT_GRPC_PORT instead of REST
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_QUANTIZATION: str = "none"  # "none", "scalar" (int8) or "binary"
+    QDRANT_QUANTIZATION_RESCORE: bool = True  # re-rank candidates with the original vectors
+    QDRANT_OVERSAMPLING: float = 2.0
+    QDRANT_ON_DISK: bool = False  # keep original vectors on disk (memmapped)
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_HNSW_EF: int = 0  # search-time ef; 0 leaves it to Qdrant
+    QDRANT_UPSERT_CONCURRENCY: int = 2
     LOCAL_DATA_PATH: str = "local_data"
+    DOCSTORE_BACKEND: str = "sqlite"  # "sqlite" or "simple" (JSON files)
     SHOW_PROGRESS: bool = True
+    LOG_LEVEL: str = "INFO"
+    TELEMETRY_ENABLED: bool = False
+    TELEMETRY_REQUEST_LOG: bool = True  # one JSON line per request on the "rag.requests" logger
+    METRICS_PORT: int = 9464  # Prometheus /metrics endpoint; 0 disables it
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8000
+    API_WORKERS: int = 1  # processes serving api.py; more than one needs Qdrant and the sqlite stores
+    INGEST_WORKERS: int = 4
+    INGEST_JOB_WORKERS: int = 1  # background threads running upload jobs
+    INGEST_JOB_HISTORY: int = 50  # finished jobs kept for the status table
+    PDF_PARSE_WORKERS: int = 2  # processes parsing page ranges; 1 parses in the request thread
+    PDF_PAGES_PER_BATCH: int = 16
+    EMBED_BATCH_SIZE: int = 32
+    EMBED_CONCURRENCY: int = 4
+    UPSERT_BATCH_SIZE: int = 256
     
     OLLAMA_URL: str = "http://localhost:11434"
     EMBED_MODEL: str = "nomic-embed-text:latest"
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_QUERY_BATCHING: bool = True  # concurrent query embeddings share one Ollama call
+    EMBED_QUERY_BATCH_SIZE: int = 16
+    EMBED_QUERY_BATCH_WAIT_MS: float = 2.0  # how long the first query waits for others to join
+    EMBED_CACHE_MEMORY_SIZE: int = 10000
+    EMBED_CACHE_MAX_ENTRIES: int = 1000000
     LLM_MODEL: str = "gemma2:2b"
+    LLM_CONTEXT_WINDOW: int = 8192  # num_ctx sent to Ollama
+    LLM_NUM_THREAD: int = 0  # 0 lets Ollama pick
+    LLM_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a request; "-1m" is forever
     TEMPERATURE: float = 0.1
     TIMEOUT: float = 300.0
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_QUEUE_SIZE: int = 64
+    LLM_QUEUE_TIMEOUT: float = 120.0
     SIMILARITY_TOP_K: int = 5
-    SYSTEM_PROMPT: str = "You are a helpful AI assistant. Use the provided context to answer the user's questions."
-    SIMILARITY_CUTTOFF: float = 0.2
+    RETRIEVAL_MODE: str = "dense"  # "dense" or "hybrid" (dense + BM25, fused with reciprocal rank fusion)
+    SPARSE_TOP_K: int = 10
+    RRF_K: int = 60
+    SPARSE_MMAP_SIZE: int = 268435456
+    SYSTEM_PROMPT: str = "You are an AI assistant designed to provide accurate and concise answers based on retrieved bank documents."
+    SIMILARITY_CUTTOFF: float = 0.2  # on dense similarity; in hybrid mode applied before fusion
+    CONTEXT_PACKING_ENABLED: bool = True
+    CONTEXT_TOKEN_BUDGET: int = 0  # retrieved context per prompt; 0 is what LLM_CONTEXT_WINDOW leaves after history and the answer
+    CONTEXT_DEDUP_THRESHOLD: float = 0.8  # share of a chunk's word 3-grams already in a better chunk to drop it
     RERANK_TOP_K: int = 2
+    RERANK_ENABLED: bool = True
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_QUANTIZE: bool = True
+    RERANK_LATENCY_BUDGET_MS: float = 300.0
+    CHAT_MEMORY_TOKEN_LIMIT: int = 3000
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_TTL: float = 3600.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    CHAT_STORE_BACKEND: str = "sqlite"  # "sqlite" (shared by every worker, survives restarts) or "memory"
+    MAX_SESSIONS: int = 500
+    SESSION_IDLE_TIMEOUT: float = 1800.0
+    WARMUP_ON_START: bool = True
+    WARMUP_VOICE: bool = False
+    RECORDING_DURATION: int = 5
+    VAD_ENERGY_THRESHOLD: float = 0.01
+    VAD_SEGMENT_SILENCE_MS: int = 300
+    VAD_END_SILENCE_MS: int = 800
+    MAX_UTTERANCE_SECONDS: float = 15.0
+    TTS_SAMPLE_RATE: int = 16000
+    WHISPER_BATCH_SIZE: int = 4
+    WHISPER_BATCH_WAIT_MS: float = 20.0
+    WHISPER_QUEUE_SIZE: int = 32
+    WHISPER_QUANTIZE: bool = True
+    TTS_MODEL_PATH: str = "microsoft/speecht5_tts"
     AUDIO_MODEL_PATH: str = r'C:\Users\shres\Desktop\voice\whisper'
@@ -0,0 +1,227 @@
+import time
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from injector import inject, singleton
+from llama_index.core.schema import BaseNode, MetadataMode
+
+from rag.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Removed or replaced documents kept in the change log for processes catching up.
+CHANGE_LOG_SIZE = 10000
+
+
+@dataclass
+class CatalogFile:
+    file_name: str
+    file_hash: Optional[str]
+    documents: int
+    nodes: int
+    bytes: int
+    embed_model: Optional[str]
+    first_ingested: float
+    last_ingested: float
+
+
+@singleton
+class CatalogManager:
+    """What is indexed, per file and per document (page), stored in SQLite.
+
+    Kept up to date by IndexManager on every ingest and delete, with running
+    totals, so counts are O(1) and listing a page of files never touches the
+    docstore. Documents without a file_name are counted but not listed.
+
+    Every removed or replaced document is appended to a change log, so other
+    processes sharing LOCAL_DATA_PATH can drop what they cached about it.
+    """
+
+    @inject
+    def __init__(self, config: Config) -> None:
+        local_data_path = Path(config.LOCAL_DATA_PATH)
+        local_data_path.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(local_data_path / "catalog.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                file_name TEXT PRIMARY KEY,
+                file_hash TEXT,
+                documents INTEGER NOT NULL DEFAULT 0,
+                nodes INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                embed_model TEXT,
+                first_ingested REAL NOT NULL,
+                last_ingested REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS files_last_ingested ON files (last_ingested);
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                file_name TEXT,
+                nodes INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                ingested REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_file_name ON documents (file_name);
+            CREATE TABLE IF NOT EXISTS stats (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO stats (key, value) VALUES ('files', 0), ('documents', 0), ('nodes', 0), ('bytes', 0);
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_id TEXT NOT NULL
+            );
+            """
+        )
+
+    def add_nodes(self, nodes: Sequence[BaseNode], embed_model: Optional[str] = None) -> None:
+        """Record the documents these nodes belong to; a document seen before is replaced."""
+        documents: Dict[str, dict] = defaultdict(lambda: {"file_name": None, "nodes": 0, "bytes": 0})
+        for node in nodes:
+            document = documents[node.ref_doc_id or node.node_id]
+            document["file_name"] = node.metadata.get("file_name")
+            document["nodes"] += 1
+            document["bytes"] += len(node.get_content(metadata_mode=MetadataMode.NONE).encode("utf-8"))
+        if not documents:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_doc_ids(list(documents))
+                for doc_id, document in documents.items():
+                    self._conn.execute(
+                        "INSERT INTO documents (doc_id, file_name, nodes, bytes, ingested) VALUES (?, ?, ?, ?, ?)",
+                        (doc_id, document["file_name"], document["nodes"], document["bytes"], now),
+                    )
+                    self._update_stats(documents=1, nodes=document["nodes"], bytes=document["bytes"])
+                    if document["file_name"] is not None:
+                        self._update_file(document["file_name"], 1, document["nodes"], document["bytes"], embed_model, now)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_doc_ids(list(doc_ids))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete_doc_ids(self, doc_ids: List[str]) -> None:
+        for doc_id in doc_ids:
+            row = self._conn.execute(
+                "SELECT file_name, nodes, bytes FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if row is None:
+                continue
+            file_name, nodes, size = row
+            self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("INSERT INTO changes (doc_id) VALUES (?)", (doc_id,))
+            self._update_stats(documents=-1, nodes=-nodes, bytes=-size)
+            if file_name is not None:
+                self._update_file(file_name, -1, -nodes, -size)
+
+        if doc_ids:
+            self._conn.execute(
+                "DELETE FROM changes WHERE seq <= (SELECT max(seq) FROM changes) - ?", (CHANGE_LOG_SIZE,)
+            )
+
+    def _update_file(self, file_name: str, documents: int, nodes: int, size: int,
+                     embed_model: Optional[str] = None, now: Optional[float] = None) -> None:
+        if documents > 0:
+            if self._file_documents(file_name) == 0:
+                self._update_stats(files=1)
+            self._conn.execute(
+                "INSERT INTO files (file_name, documents, nodes, bytes, embed_model, first_ingested, last_ingested) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (file_name) DO UPDATE SET documents = documents + excluded.documents, "
+                "nodes = nodes + excluded.nodes, bytes = bytes + excluded.bytes, "
+                "embed_model = coalesce(excluded.embed_model, embed_model), last_ingested = excluded.last_ingested",
+                (file_name, documents, nodes, size, embed_model, now, now),
+            )
+            return
+        self._conn.execute(
+            "UPDATE files SET documents = documents + ?, nodes = nodes + ?, bytes = bytes + ? WHERE file_name = ?",
+            (documents, nodes, size, file_name),
+        )
+        if self._file_documents(file_name) == 0:
+            self._conn.execute("DELETE FROM files WHERE file_name = ?", (file_name,))
+            self._update_stats(files=-1)
+
+    def _file_documents(self, file_name: str) -> int:
+        row = self._conn.execute("SELECT documents FROM files WHERE file_name = ?", (file_name,)).fetchone()
+        return row[0] if row else 0
+
+    def _update_stats(self, **deltas: int) -> None:
+        for key, delta in deltas.items():
+            self._conn.execute("UPDATE stats SET value = value + ? WHERE key = ?", (delta, key))
+
+    def set_file_hash(self, file_name: str, file_hash: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE files SET file_hash = ? WHERE file_name = ?", (file_hash, file_name))
+
+    def document_ids(self, file_name: str) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                "SELECT doc_id FROM documents WHERE file_name = ?", (file_name,)
+            )}
+
+    def get_file(self, file_name: str) -> Optional[CatalogFile]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_name, file_hash, documents, nodes, bytes, embed_model, first_ingested, last_ingested "
+                "FROM files WHERE file_name = ?", (file_name,)
+            ).fetchone()
+        return CatalogFile(*row) if row else None
+
+    def list_files(self, offset: int = 0, limit: int = 50) -> List[CatalogFile]:
+        """Most recently ingested first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_name, file_hash, documents, nodes, bytes, embed_model, first_ingested, last_ingested "
+                "FROM files ORDER BY last_ingested DESC, file_name LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [CatalogFile(*row) for row in rows]
+
+    def last_change(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT coalesce(max(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, seq: int) -> Tuple[int, Optional[List[str]]]:
+        """Documents removed or replaced after change seq, and the latest seq.
+
+        None instead of the list means the log no longer reaches back to seq.
+        """
+        with self._lock:
+            first, last = self._conn.execute("SELECT min(seq), max(seq) FROM changes").fetchone()
+            if last is None or last <= seq:
+                return seq, []
+            if first > seq + 1:
+                return last, None
+            doc_ids = [row[0] for row in self._conn.execute(
+                "SELECT doc_id FROM changes WHERE seq > ? AND seq <= ?", (seq, last)
+            )]
+        return last, doc_ids
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT key, value FROM stats").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
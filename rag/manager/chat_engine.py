@@ -0,0 +1,32 @@
+from typing import AsyncGenerator, Generator, List, Tuple
+from llama_index.core.chat_engine import ContextChatEngine
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.schema import NodeWithScore
+
+
+class StreamingContextChatEngine(ContextChatEngine):
+    """ContextChatEngine whose answers can be streamed and abandoned.
+
+    ContextChatEngine.stream_chat and astream_chat copy the answer into memory on a
+    background thread or task that reads the LLM stream to the end, so closing the
+    response does not stop generation and a cancelled answer still becomes part of
+    the conversation. stream_turn and astream_turn hand out the LLM token stream
+    itself: closing it stops the request to the LLM. Nothing is written to memory
+    until the caller records the finished turn with record_turn.
+    """
+
+    def stream_turn(self, message: str) -> Tuple[List[NodeWithScore], Generator[str, None, None]]:
+        nodes = self._get_nodes(message)
+        synthesizer = self._get_response_synthesizer(self._memory.get(input=message), streaming=True)
+        response = synthesizer.synthesize(message, nodes)
+        return nodes, response.response_gen
+
+    async def astream_turn(self, message: str) -> Tuple[List[NodeWithScore], AsyncGenerator[str, None]]:
+        nodes = await self._aget_nodes(message)
+        synthesizer = self._get_response_synthesizer(await self._memory.aget(input=message), streaming=True)
+        response = await synthesizer.asynthesize(message, nodes)
+        return nodes, response.response_gen
+
+    def record_turn(self, message: str, answer: str) -> None:
+        self._memory.put(ChatMessage(role=MessageRole.USER, content=message))
+        self._memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=answer))
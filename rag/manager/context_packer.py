@@ -0,0 +1,158 @@
+import re
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeRelationship, NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from rag import telemetry
+
+logger = logging.getLogger(__name__)
+
+# A block cut to fit the budget should still be worth reading.
+MIN_TRUNCATED_TOKENS = 64
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """Turns the retrieved chunks into as few prompt tokens as possible.
+
+    Chunks mostly contained in a better-ranked one (overlapping sections, the
+    same text uploaded twice) are dropped, sections of the same page are merged
+    into one block in page order, and blocks are added best first until
+    token_budget is reached. The last block that does not fit is cut if enough
+    of the budget is left.
+    """
+
+    token_budget: int = Field(default=2048)
+    dedup_threshold: float = Field(default=0.8)
+    _tokenizer: Callable[[str], List] = PrivateAttr()
+
+    def __init__(self, token_budget: int = 2048, dedup_threshold: float = 0.8,
+                 tokenizer: Optional[Callable[[str], List]] = None) -> None:
+        super().__init__(token_budget=token_budget, dedup_threshold=dedup_threshold)
+        self._tokenizer = tokenizer or get_tokenizer()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _count_tokens(self, node: TextNode) -> int:
+        # What the response synthesizer puts in the prompt for this node.
+        return len(self._tokenizer(node.get_content(metadata_mode=MetadataMode.LLM)))
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if not nodes:
+            return nodes
+        # Keyed by object: merged blocks are new nodes and get counted on their own.
+        token_counts = {id(node.node): self._count_tokens(node.node) for node in nodes}
+        tokens_before = sum(token_counts.values())
+        packed, tokens_after = self._pack(self._merge_pages(self._deduplicate(nodes)), token_counts)
+        saved = tokens_before - tokens_after
+        logger.info(
+            f"Context: {len(nodes)} chunks, {tokens_before} tokens -> {len(packed)} blocks, "
+            f"{tokens_after} tokens ({saved} saved, budget {self.token_budget})"
+        )
+        telemetry.annotate(context_tokens=tokens_after, context_tokens_saved=saved)
+        telemetry.count("rag_context_tokens_saved_total", saved)
+        return packed
+
+    def _deduplicate(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        kept: List[Tuple[NodeWithScore, Set[Tuple[str, ...]]]] = []
+        for node in nodes:
+            shingles = _shingles(node.node.get_content(metadata_mode=MetadataMode.NONE))
+            duplicate = False
+            for i, (other, other_shingles) in enumerate(kept):
+                smaller = min(len(shingles), len(other_shingles))
+                if smaller == 0 or len(shingles & other_shingles) / smaller < self.dedup_threshold:
+                    continue
+                duplicate = True
+                if len(shingles) > len(other_shingles):
+                    # A child section of a parent we already have: keep the fuller text at the better rank.
+                    kept[i] = (NodeWithScore(node=node.node, score=other.score), shingles)
+                break
+            if not duplicate:
+                kept.append((node, shingles))
+        return [node for node, _ in kept]
+
+    @staticmethod
+    def _merge_pages(nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        pages: Dict[str, List[NodeWithScore]] = {}
+        for node in nodes:
+            pages.setdefault(node.node.ref_doc_id or node.node.node_id, []).append(node)
+        merged = []
+        # Pages keep the rank of their best chunk.
+        for page_nodes in pages.values():
+            if len(page_nodes) == 1:
+                merged.append(page_nodes[0])
+                continue
+            in_page_order = sorted(
+                page_nodes,
+                key=lambda node: node.node.start_char_idx if node.node.start_char_idx is not None else 0,
+            )
+            first = page_nodes[0].node
+            metadata = {k: v for k, v in first.metadata.items() if k != "header_path"}
+            block = TextNode(
+                id_=first.node_id,
+                text="\n\n".join(node.node.get_content(metadata_mode=MetadataMode.NONE) for node in in_page_order),
+                metadata=metadata,
+                excluded_embed_metadata_keys=list(first.excluded_embed_metadata_keys),
+                excluded_llm_metadata_keys=list(first.excluded_llm_metadata_keys),
+                relationships={
+                    k: v for k, v in first.relationships.items() if k == NodeRelationship.SOURCE
+                },
+            )
+            merged.append(NodeWithScore(node=block, score=max(node.score or 0.0 for node in page_nodes)))
+        return merged
+
+    def _pack(self, nodes: List[NodeWithScore], token_counts: Dict[int, int]) -> Tuple[List[NodeWithScore], int]:
+        packed, used = [], 0
+        for node in nodes:
+            tokens = token_counts.get(id(node.node))
+            if tokens is None:
+                tokens = self._count_tokens(node.node)
+            remaining = self.token_budget - used
+            if tokens <= remaining:
+                packed.append(node)
+                used += tokens
+                continue
+            if remaining < MIN_TRUNCATED_TOKENS:
+                continue
+            truncated = self._truncate(node, remaining)
+            if truncated is not None:
+                packed.append(truncated)
+                used += self._count_tokens(truncated.node)
+            break
+        return packed, used
+
+    def _truncate(self, node: NodeWithScore, max_tokens: int) -> Optional[NodeWithScore]:
+        text = node.node.get_content(metadata_mode=MetadataMode.NONE)
+        text_tokens = len(self._tokenizer(text))
+        budget = max_tokens - (self._count_tokens(node.node) - text_tokens)
+        if budget < MIN_TRUNCATED_TOKENS:
+            return None
+        # Cut proportionally at a line break, shrinking until it fits.
+        length = len(text) * budget // text_tokens
+        while length > 0:
+            cut = text[:length]
+            line_break = cut.rfind("\n")
+            if line_break > length // 2:
+                cut = cut[:line_break]
+            if len(self._tokenizer(cut)) <= budget:
+                block = node.node.model_copy()
+                block.set_content(cut.rstrip())
+                return NodeWithScore(node=block, score=node.score)
+            length = length * 9 // 10
+        return None
@@ -0,0 +1,144 @@
+import time
+import queue
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from rag import telemetry
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class BatchedQueryEmbedding(BaseEmbedding):
+    """Wraps an embedding model so concurrent query embeddings go out as one batched call.
+
+    Queries wait in a queue for a single worker thread, which takes everything
+    that arrives within max_wait_ms of the first one (up to max_batch_size) and
+    hands it to embed_queries in one call. While a batch is at the server the
+    next one fills up, so batches grow with load; a query that came alone
+    after a batch of one does not wait for company. Text embeddings for
+    ingestion are already batched and pass straight through.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _embed_queries: Callable[[List[str]], List[Embedding]] = PrivateAttr()
+    _max_batch_size: int = PrivateAttr()
+    _max_wait: float = PrivateAttr()
+    _requests: "queue.Queue[Tuple[str, Future]]" = PrivateAttr()
+    _worker: Optional[threading.Thread] = PrivateAttr(default=None)
+    _worker_lock: threading.Lock = PrivateAttr()
+    _stats_lock: threading.Lock = PrivateAttr()
+    _batch_sizes: Dict[int, int] = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, embed_queries: Callable[[List[str]], List[Embedding]],
+                 max_batch_size: int = 16, max_wait_ms: float = 2.0, **kwargs: Any) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._embed_queries = embed_queries
+        self._max_batch_size = max(1, max_batch_size)
+        self._max_wait = max_wait_ms / 1000.0
+        self._requests = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = {}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "BatchedQueryEmbedding"
+
+    def _submit(self, query: str) -> Future:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="query-embedder", daemon=True)
+                    self._worker.start()
+        future: Future = Future()
+        self._requests.put((query, future))
+        return future
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._submit(query).result()
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await asyncio.wrap_future(self._submit(query))
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._embed_model.get_text_embedding(text)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return await self._embed_model.aget_text_embedding(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return self._embed_model.get_text_embedding_batch(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._embed_model.aget_text_embedding_batch(texts)
+
+    def _run(self) -> None:
+        concurrent = False
+        while True:
+            batch = [self._requests.get()]
+            deadline = time.perf_counter() + (self._max_wait if concurrent else 0.0)
+            while len(batch) < self._max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    # Whatever is already queued joins even when the wait is over.
+                    batch.append(self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait())
+                except queue.Empty:
+                    break
+            concurrent = len(batch) > 1
+            # Callers that were cancelled while queued (e.g. a client that disconnected)
+            # are dropped; the others can no longer be cancelled once this returns True.
+            batch = [(query, future) for query, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._embed_batch(batch)
+            except Exception:
+                # Every later query embedding waits on this thread, so it must not die.
+                logger.exception(f"Query embedding worker failed on a batch of {len(batch)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Query embedding failed"))
+
+    def _embed_batch(self, batch: List[Tuple[str, Future]]) -> None:
+        try:
+            embeddings = self._embed_queries([query for query, _ in batch])
+        except Exception as e:
+            logger.warning(f"Embedding a batch of {len(batch)} queries failed: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+        telemetry.histogram("rag_query_embedding_batch_size", len(batch), BATCH_SIZE_BUCKETS)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            sizes = dict(self._batch_sizes)
+        batches = sum(sizes.values())
+        queries = sum(size * count for size, count in sizes.items())
+        stats: Dict[str, Any] = {
+            "batches": batches,
+            "queries": queries,
+            "mean_batch_size": queries / batches if batches else 0.0,
+            "max_batch_size": max(sizes, default=0),
+            "queued": self._requests.qsize(),
+        }
+        # Cumulative like the Prometheus buckets: batches of at most `bound` queries.
+        for bound in BATCH_SIZE_BUCKETS:
+            stats[f"batches_le_{bound}"] = sum(count for size, count in sizes.items() if size <= bound)
+        return stats
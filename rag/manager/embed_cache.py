@@ -0,0 +1,202 @@
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Embeddings keyed by (model name, content hash): an in-memory LRU over a SQLite table."""
+
+    def __init__(self, db_path: str, model_name: str, memory_size: int = 10000, max_entries: int = 1000000) -> None:
+        self.model_name = model_name
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, hash)"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind: str, text: str) -> str:
+        return hashlib.sha256(f"{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        disk_lookups = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results[i] = embedding
+                else:
+                    disk_lookups.append(i)
+
+            if disk_lookups:
+                now = time.time()
+                touched = []
+                for i in disk_lookups:
+                    row = self._conn.execute(
+                        "SELECT vector FROM embeddings WHERE model = ? AND hash = ?",
+                        (self.model_name, keys[i]),
+                    ).fetchone()
+                    if row is None:
+                        self.misses += 1
+                        continue
+                    embedding = array("f", row[0]).tolist()
+                    self.disk_hits += 1
+                    results[i] = embedding
+                    self._remember(keys[i], embedding)
+                    touched.append((now, self.model_name, keys[i]))
+                if touched:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?", touched
+                    )
+        return results
+
+    def put_many(self, keys: List[str], embeddings: List[List[float]]) -> None:
+        now = time.time()
+        rows = [
+            (self.model_name, key, array("f", embedding).tobytes(), now)
+            for key, embedding in zip(keys, embeddings)
+        ]
+        with self._lock:
+            for key, embedding in zip(keys, embeddings):
+                self._remember(key, embedding)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._conn.total_changes
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._disk_entries += self._conn.total_changes - before
+            if self._disk_entries > self.max_entries:
+                self._evict()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        # Trim to 90% of the limit so eviction does not run on every insert.
+        excess = self._disk_entries - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN "
+            "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._disk_entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        logger.info(f"Evicted {excess} cached embeddings, {self._disk_entries} left")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_entries,
+            }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embedding model so repeated texts and queries are served from an EmbeddingCache."""
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        key = EmbeddingCache.make_key("query", query)
+        embedding = self._cache.get_many([key])[0]
+        if embedding is None:
+            embedding = self._embed_model.get_query_embedding(query)
+            self._cache.put_many([key], [embedding])
+        return embedding
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        key = EmbeddingCache.make_key("query", query)
+        embedding = self._cache.get_many([key])[0]
+        if embedding is None:
+            embedding = await self._embed_model.aget_query_embedding(query)
+            self._cache.put_many([key], [embedding])
+        return embedding
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, embeddings, missing = self._lookup_texts(texts)
+        if missing:
+            computed = self._embed_model.get_text_embedding_batch([texts[i] for i in missing])
+            self._store_texts(keys, embeddings, missing, computed)
+        return embeddings
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, embeddings, missing = self._lookup_texts(texts)
+        if missing:
+            computed = await self._embed_model.aget_text_embedding_batch([texts[i] for i in missing])
+            self._store_texts(keys, embeddings, missing, computed)
+        return embeddings
+
+    def _lookup_texts(self, texts: List[str]):
+        keys = [EmbeddingCache.make_key("text", text) for text in texts]
+        embeddings = self._cache.get_many(keys)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        return keys, embeddings, missing
+
+    def _store_texts(self, keys, embeddings, missing, computed) -> None:
+        for i, embedding in zip(missing, computed):
+            embeddings[i] = embedding
+        self._cache.put_many([keys[i] for i in missing], computed)
@@ -1,15 +1,59 @@
 import logging
+from pathlib import Path
+from typing import Any, Dict, List
 from injector import inject, singleton
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.embeddings.ollama import OllamaEmbedding
 
+from rag.manager.embed_cache import CachedEmbedding, EmbeddingCache
+from rag.manager.embed_batcher import BatchedQueryEmbedding
+
 logger = logging.getLogger(__name__)
 
 @singleton
 class EmbeddingManager:
     def __init__(self, config) -> None:
-        self.embedding_model = OllamaEmbedding(
+        self.base_embedding_model = self._create_base_model(config)
+        self.cache = None
+        self.batcher = None
+        self.embedding_model = self.base_embedding_model
+        if config.EMBED_QUERY_BATCHING:
+            # Under the cache, so only queries that miss it wait for a batch.
+            self.batcher = BatchedQueryEmbedding(
+                self.base_embedding_model,
+                self._embed_queries,
+                max_batch_size=config.EMBED_QUERY_BATCH_SIZE,
+                max_wait_ms=config.EMBED_QUERY_BATCH_WAIT_MS,
+            )
+            self.embedding_model = self.batcher
+        if config.EMBED_CACHE_ENABLED:
+            local_data_path = Path(config.LOCAL_DATA_PATH)
+            local_data_path.mkdir(parents=True, exist_ok=True)
+            self.cache = EmbeddingCache(
+                db_path=str(local_data_path / "embed_cache.db"),
+                model_name=config.EMBED_MODEL,
+                memory_size=config.EMBED_CACHE_MEMORY_SIZE,
+                max_entries=config.EMBED_CACHE_MAX_ENTRIES,
+            )
+            self.embedding_model = CachedEmbedding(self.embedding_model, self.cache)
+
+    def _create_base_model(self, config) -> BaseEmbedding:
+        return OllamaEmbedding(
             model_name=config.EMBED_MODEL,
             base_url=config.OLLAMA_URL,
+            embed_batch_size=config.EMBED_BATCH_SIZE,
             ollama_additional_kwargs={"mirostat": 0},
         )
-    
\ No newline at end of file
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """One call for a batch of queries; models without a batched query API embed them one by one."""
+        model = self.base_embedding_model
+        if isinstance(model, OllamaEmbedding):
+            return model.get_general_text_embeddings([model._format_query(query) for query in queries])
+        return [model.get_query_embedding(query) for query in queries]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats() if self.cache else {}
+
+    def batch_stats(self) -> Dict[str, Any]:
+        return self.batcher.stats() if self.batcher else {}
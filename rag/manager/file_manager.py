@@ -1,13 +1,67 @@
 # Saves files and load data
 import os
+import shutil
+import hashlib
 import tempfile
 import logging
-from typing import Optional, List
-import pymupdf4llm
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Iterator, Optional, List, Tuple
+import pymupdf
+from pymupdf4llm.helpers import pymupdf_rag
 from llama_index.core import Document
 
+from rag import telemetry
+
 logger = logging.getLogger(__name__)
 
+# Parser processes outlive a single upload; starting them (and importing pymupdf) is
+# the expensive part.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _parse_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking the app would copy its threads and open sockets into the workers.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _reset_parse_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _parse_page_range(file_path: str, start: int, stop: int, hdr_info: pymupdf_rag.IdentifyHeaders) -> List[Document]:
+    """Markdown for pages [start, stop) of a PDF, one Document per page like LlamaMarkdownReader.
+
+    hdr_info maps font sizes to header levels for the whole document, so a page comes
+    out the same whichever range it is parsed in.
+    """
+    with pymupdf.open(file_path) as pdf:
+        metadata = dict(pdf.metadata or {})
+        total_pages = pdf.page_count
+        # The same converter LlamaMarkdownReader uses, whether or not pymupdf4llm's layout mode is on.
+        chunks = pymupdf_rag.to_markdown(pdf, pages=list(range(start, stop)), hdr_info=hdr_info, page_chunks=True)
+    return [
+        Document(
+            text=chunk["text"],
+            metadata={**metadata, "page": page + 1, "total_pages": total_pages, "file_path": file_path},
+        )
+        for page, chunk in zip(range(start, stop), chunks)
+    ]
+
+
 class FileManager:
     @staticmethod
     def save_uploaded_file(uploaded_file) -> Optional[str]:
@@ -15,29 +69,139 @@ class FileManager:
             if hasattr(uploaded_file, 'read'):
                 file_extension = os.path.splitext(uploaded_file.name)[1]
                 with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as tmp_file:
-                    tmp_file.write(uploaded_file.read())
+                    shutil.copyfileobj(uploaded_file, tmp_file)
                     return tmp_file.name
             elif isinstance(uploaded_file, str):
                 # If the uploaded_file is a string (e.g., file path)
                 return uploaded_file
             else:
-                print(f"Uploaded file is not a valid file object or path: {uploaded_file}")
+                logger.error(f"Uploaded file is not a valid file object or path: {uploaded_file}")
                 return None
         except Exception as e:
-            print(f"Error saving uploaded file: {e}")
+            logger.error(f"Error saving uploaded file: {e}")
             return None
 
     @staticmethod
-    def load_file(file) -> Optional[List[Document]]:
+    def _local_path(uploaded_file) -> Tuple[Optional[str], bool]:
+        """Where to read the upload from, and whether it is a copy that has to be deleted afterwards."""
+        if isinstance(uploaded_file, str):
+            return uploaded_file, False
+        name = getattr(uploaded_file, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            # Gradio has already written the upload to its own temp file, which it cleans up.
+            return name, False
+        file_path = FileManager.save_uploaded_file(uploaded_file)
+        return file_path, file_path is not None
+
+    @staticmethod
+    def copy_upload(uploaded_file, directory) -> str:
+        """Copy an upload (path or file object) into directory under its original name."""
+        source, owned = FileManager._local_path(uploaded_file)
+        if not source:
+            raise ValueError(f"Cannot read uploaded file: {uploaded_file}")
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, os.path.basename(getattr(uploaded_file, "name", uploaded_file)))
+        try:
+            shutil.copyfile(source, target)
+        finally:
+            if owned:
+                os.unlink(source)
+        return target
+
+    @staticmethod
+    def fingerprint_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def iter_file(file, pages_per_batch: int = 16, workers: int = 1, start_page: int = 0) -> Iterator[List[Document]]:
+        """Yield the pages of a PDF in page order, one batch at a time, as soon as each is parsed.
+
+        With workers > 1 page ranges are parsed in a process pool, at most workers + 1
+        batches ahead of the consumer, so memory stays bounded whatever the page count.
+        Closing the generator stops parsing. Pages before start_page (0-based) are skipped.
+        """
+        file_path, owned = FileManager._local_path(file)
+        if not file_path:
+            raise ValueError(f"Cannot read uploaded file: {file}")
+        try:
+            file_name = os.path.basename(getattr(file, "name", file))
+            file_hash = FileManager.fingerprint_file(file_path)
+            with pymupdf.open(file_path) as pdf:
+                page_count = pdf.page_count
+                # Header levels come from font sizes across the whole document (also when
+                # resuming), so they do not depend on where the batches are cut.
+                hdr_info = pymupdf_rag.IdentifyHeaders(pdf)
+            pages_per_batch = max(1, pages_per_batch)
+            ranges = (
+                (start, min(start + pages_per_batch, page_count))
+                for start in range(start_page, page_count, pages_per_batch)
+            )
+            for documents in FileManager._parse_ranges(file_path, ranges, workers, hdr_info):
+                telemetry.count("rag_loaded_pages_total", len(documents))
+                for document in documents:
+                    FileManager._tag_document(document, file_name, file_hash)
+                yield documents
+        finally:
+            if owned:
+                os.unlink(file_path)
+
+    @staticmethod
+    def _parse_ranges(file_path: str, ranges: Iterator[Tuple[int, int]], workers: int,
+                      hdr_info: pymupdf_rag.IdentifyHeaders) -> Iterator[List[Document]]:
+        if workers <= 1:
+            for start, stop in ranges:
+                with telemetry.span("load_file"):
+                    documents = _parse_page_range(file_path, start, stop, hdr_info)
+                yield documents
+            return
+
+        pool = _parse_pool(workers)
+        pending: Deque[Future] = deque()
+        try:
+            for start, stop in ranges:
+                pending.append(pool.submit(_parse_page_range, file_path, start, stop, hdr_info))
+                if len(pending) <= workers:
+                    continue
+                # Only the time spent waiting here is parsing that did not overlap with indexing.
+                with telemetry.span("load_file"):
+                    documents = pending.popleft().result()
+                yield documents
+            while pending:
+                with telemetry.span("load_file"):
+                    documents = pending.popleft().result()
+                yield documents
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a huge page); start a fresh pool next time.
+            _reset_parse_pool()
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _tag_document(document: Document, file_name: str, file_hash: str) -> None:
+        document.metadata["file_name"] = file_name
+        document.metadata["file_hash"] = file_hash
+        # Temp paths and hashes change between uploads; keep them out of
+        # the embedded text so unchanged chunks hit the embedding cache.
+        for key in ("file_path", "file_hash"):
+            if key not in document.excluded_embed_metadata_keys:
+                document.excluded_embed_metadata_keys.append(key)
+            if key not in document.excluded_llm_metadata_keys:
+                document.excluded_llm_metadata_keys.append(key)
+
+    @staticmethod
+    def load_file(file, pages_per_batch: int = 16, workers: int = 1) -> Optional[List[Document]]:
         if file:
-            file_path = FileManager.save_uploaded_file(file)
-            if file_path:
-                try:
-                    llama_reader = pymupdf4llm.LlamaMarkdownReader()
-                    documents = llama_reader.load_data(file_path)
-                    os.unlink(file_path)
-                    return documents
-                except Exception as e:
-                    logger.error(f"Error loading file content: {e}")
-                    os.unlink(file_path)
+            try:
+                documents = []
+                for batch in FileManager.iter_file(file, pages_per_batch, workers):
+                    documents.extend(batch)
+                return documents
+            except Exception as e:
+                logger.error(f"Error loading file content: {e}")
         return None
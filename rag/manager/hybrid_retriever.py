@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import BaseNode, NodeWithScore, QueryBundle
+from llama_index.core.storage.docstore import BaseDocumentStore
+
+from rag.manager.sparse_index_manager import SparseIndexManager
+
+logger = logging.getLogger(__name__)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense vector results with BM25 results using reciprocal rank fusion.
+
+    Scores are scaled so a node ranked first by both retrievers scores 1.0. They only
+    order the hits: every fused hit scores above 0.4, so similarity_cutoff is applied to
+    the dense scores before fusion instead (BM25 scores have no comparable scale).
+    """
+
+    def __init__(
+        self,
+        dense_retriever: BaseRetriever,
+        sparse_index: SparseIndexManager,
+        docstore: BaseDocumentStore,
+        similarity_top_k: int,
+        sparse_top_k: int,
+        rrf_k: int = 60,
+        similarity_cutoff: float = 0.0,
+    ) -> None:
+        super().__init__()
+        self._dense_retriever = dense_retriever
+        self._sparse_index = sparse_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._sparse_top_k = sparse_top_k
+        self._rrf_k = rrf_k
+        self._similarity_cutoff = similarity_cutoff
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense = self._dense_retriever.retrieve(query_bundle)
+        sparse = self._sparse_index.search(query_bundle.query_str, self._sparse_top_k)
+        return self._fuse(dense, sparse)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense, sparse = await asyncio.gather(
+            self._dense_retriever.aretrieve(query_bundle),
+            asyncio.to_thread(self._sparse_index.search, query_bundle.query_str, self._sparse_top_k),
+        )
+        return self._fuse(dense, sparse)
+
+    def _fuse(self, dense: List[NodeWithScore], sparse: List[Tuple[str, float]]) -> List[NodeWithScore]:
+        scores: Dict[str, float] = defaultdict(float)
+        nodes: Dict[str, BaseNode] = {}
+        dense = [n for n in dense if n.score is None or n.score >= self._similarity_cutoff]
+        for rank, node_with_score in enumerate(dense):
+            node_id = node_with_score.node.node_id
+            scores[node_id] += 1.0 / (self._rrf_k + rank + 1)
+            nodes[node_id] = node_with_score.node
+        for rank, (node_id, _) in enumerate(sparse):
+            scores[node_id] += 1.0 / (self._rrf_k + rank + 1)
+
+        max_score = 2.0 / (self._rrf_k + 1)
+        fused = []
+        for node_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            node = nodes.get(node_id) or self._docstore.get_node(node_id, raise_error=False)
+            if node is None:
+                logger.warning(f"Sparse hit {node_id} is missing from the docstore")
+                continue
+            fused.append(NodeWithScore(node=node, score=score / max_score))
+            if len(fused) >= self._similarity_top_k:
+                break
+        return fused
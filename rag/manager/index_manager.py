@@ -1,100 +1,407 @@
 import os
+import time
+import itertools
+import hashlib
 import logging
 import threading
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from injector import inject, singleton
-from llama_index.embeddings.ollama import OllamaEmbedding
+from llama_index.core.base.embeddings.base import BaseEmbedding
 from llama_index.core.node_parser import MarkdownNodeParser
 from llama_index.core.storage.storage_context import StorageContext
 from llama_index.core import VectorStoreIndex, load_index_from_storage, Document
 from llama_index.core.data_structs import IndexDict
 from llama_index.core.indices.base import BaseIndex
-from llama_index.core.schema import TransformComponent
+from llama_index.core.ingestion import IngestionPipeline
+from llama_index.core.schema import BaseNode, MetadataMode, TransformComponent
+
+from rag import telemetry
+from rag.manager.catalog_manager import CatalogManager
+from rag.manager.response_cache import ResponseCache
+from rag.manager.sparse_index_manager import SparseIndexManager
 
 logger = logging.getLogger(__name__)
 
+# Markdown parsing runs at thousands of pages/s in-process, while IngestionPipeline starts a
+# fresh "spawn" pool (re-importing the app) on every call; below this many documents per
+# worker the pool costs more than it saves.
+MIN_DOCUMENTS_PER_WORKER = 5000
+# Page documents get stable ids "<file_name>::page-<n>"; file fingerprints live in the
+# docstore hash collection under "file::<file_name>".
+PAGE_ID_SEPARATOR = "::page-"
+FILE_HASH_PREFIX = "file::"
+# The index struct is stored under a fixed id, so processes starting together on empty
+# stores all create the same one.
+INDEX_ID = "vector_index"
+# Called with a stage ("nodes_embedded", "nodes_upserted") and a count as a batch moves through
+# update_index; raising from it stops ingestion (e.g. to cancel it).
+Progress = Callable[[str, int], None]
+
 @singleton
 class IndexManager:
     @inject
     def __init__(
         self,
         storage_context: StorageContext,
-        embed_model: OllamaEmbedding,
+        embed_model: BaseEmbedding,
         local_data_path: str,
         show_progress: bool,
-        transformations: List[TransformComponent] = None
+        transformations: List[TransformComponent] = None,
+        num_workers: int = 1,
+        embed_concurrency: int = 1,
+        response_cache: Optional[ResponseCache] = None,
+        sparse_index: Optional[SparseIndexManager] = None,
+        catalog: Optional[CatalogManager] = None,
     ):
         self.storage_context = storage_context
         self.embed_model = embed_model
         self.local_data_path = Path(local_data_path)
         self.show_progress = show_progress
+        self.num_workers = max(1, num_workers)
+        self.embed_concurrency = max(1, embed_concurrency)
+        self.response_cache = response_cache
+        self.sparse_index = sparse_index
+        self.catalog = catalog
         self.transformations = transformations or [
             MarkdownNodeParser(include_metadata=True, include_prev_next_rel=True),
         ]
         if self.embed_model not in self.transformations:
             self.transformations.append(self.embed_model)
-        
+
         self._index_thread_lock = threading.Lock()
         self._index = self._initialize_index()
-        
+        self._backfill_sparse_index()
+        self._backfill_catalog()
+
         if not self.local_data_path.exists():
             self.local_data_path.mkdir(parents=True, exist_ok=True)
 
     def _initialize_index(self) -> BaseIndex[IndexDict]:
-        try:
-            return load_index_from_storage(
-                storage_context=self.storage_context,
-                store_nodes_override=True,
-                show_progress=self.show_progress,
-                embed_model=self.embed_model,
-                transformations=self.transformations,
-            )
-        except ValueError:
+        # Both vector stores keep the node text, so the index struct does not list nodes
+        # (they are in the docstore) and stays the same in every process sharing the stores.
+        index_kwargs = dict(
+            storage_context=self.storage_context,
+            store_nodes_override=False,
+            show_progress=self.show_progress,
+            embed_model=self.embed_model,
+            transformations=self.transformations,
+        )
+        index_ids = [index_struct.index_id for index_struct in self.storage_context.index_store.index_structs()]
+        if not index_ids:
             logger.info("Creating a new vector store index")
-            index = VectorStoreIndex.from_documents(
-                [],
-                storage_context=self.storage_context,
-                store_nodes_override=True,
-                show_progress=self.show_progress,
-                embed_model=self.embed_model,
-                transformations=self.transformations,
-            )
+            index = VectorStoreIndex(index_struct=IndexDict(index_id=INDEX_ID), **index_kwargs)
             self._save_index(index)
             return index
+        # Indexes created before INDEX_ID have a single struct under a random id.
+        index = load_index_from_storage(index_id=INDEX_ID if INDEX_ID in index_ids else index_ids[0], **index_kwargs)
+        if index.index_struct.nodes_dict:
+            logger.info(f"Dropping {len(index.index_struct.nodes_dict)} node ids from the index struct")
+            index.index_struct.nodes_dict.clear()
+            self.storage_context.index_store.add_index_struct(index.index_struct)
+            self._save_index(index)
+        return index
+
+    def _backfill_sparse_index(self) -> None:
+        # One-off for corpora indexed before the sparse index existed; afterwards it is
+        # kept in sync by update_index/delete_many.
+        if self.sparse_index is None or self.sparse_index.count() > 0:
+            return
+        nodes = list(self.storage_context.docstore.docs.values())
+        if nodes:
+            logger.info(f"Building sparse index for {len(nodes)} existing nodes")
+            self.sparse_index.add_nodes(nodes)
+
+    def _backfill_catalog(self) -> None:
+        # Same one-off as the sparse index, for corpora indexed before the catalog existed.
+        if self.catalog is None or self.catalog.stats()["documents"] > 0:
+            return
+        nodes = list(self.storage_context.docstore.docs.values())
+        if not nodes:
+            return
+        logger.info(f"Building the catalog for {len(nodes)} existing nodes")
+        self.catalog.add_nodes(nodes, embed_model=self.embed_model.model_name)
+        for file in self.catalog.list_files(limit=-1):
+            file_hash = self.storage_context.docstore.get_document_hash(f"{FILE_HASH_PREFIX}{file.file_name}")
+            if file_hash:
+                self.catalog.set_file_hash(file.file_name, file_hash)
 
     def _save_index(self, index: BaseIndex[IndexDict]):
         index.storage_context.persist(persist_dir=str(self.local_data_path))
         logger.info(f"Index persisted to {self.local_data_path}")
 
+    @telemetry.traced("ingest")
     def ingest(self, documents: List[Document]) -> List[Document]:
-        # Assuming you have an IngestionHelper class similar to the one in the provided code
-        # from private_gpt.components.ingest.ingest_helper import IngestionHelper
-        
-        # logger.info(f"Ingesting file_name={file_name}")
-        # documents = IngestionHelper.transform_file_into_documents(file_name, file_data)
-        return self.update_index(documents)
-
-    def update_index(self, documents: List[Document]) -> List[Document]:
+        """Index new or changed pages; pages of files already indexed unchanged are skipped."""
+        files: Dict[str, List[Document]] = {}
+        loose_documents = []
+        for document in documents:
+            file_name = document.metadata.get("file_name")
+            if file_name:
+                files.setdefault(file_name, []).append(document)
+            else:
+                loose_documents.append(document)
+
+        ingested = self.update_index(loose_documents) if loose_documents else []
+        for file_name, file_documents in files.items():
+            for changed in self._ingest_file(file_name, [file_documents]):
+                ingested.extend(changed)
+        return ingested
+
+    @telemetry.traced("ingest", mode="stream")
+    def ingest_stream(self, batches: Iterable[List[Document]], progress: Optional[Progress] = None,
+                      resume_from: int = 0) -> Optional[int]:
+        """Index the pages of one file batch by batch, as FileManager.iter_file parses them.
+
+        Only the current batch is held here, and the next one is parsed while this one is
+        embedded. Returns the number of new or changed pages, or None if the file was
+        already indexed unchanged (in which case parsing is stopped after the first batch).
+        When resuming, batches start after page resume_from, and the pages before it are
+        known to be indexed already.
+        """
+        batches = iter(batches)
+        try:
+            first = next(batches, None)
+            if not first:
+                return 0
+            file_name = first[0].metadata.get("file_name")
+            if not file_name:
+                return len(self.update_index([document for batch in (first, *batches) for document in batch], progress))
+            pages = None
+            for changed in self._ingest_file(file_name, itertools.chain([first], batches), progress, resume_from):
+                pages = (pages or 0) + len(changed)
+            return pages
+        finally:
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+
+    def _ingest_file(self, file_name: str, batches: Iterable[List[Document]], progress: Optional[Progress] = None,
+                     resume_from: int = 0) -> Iterator[List[Document]]:
+        """Yield the new or changed pages of each batch after indexing them; yields nothing if the file is unchanged."""
+        docstore = self.storage_context.docstore
+        batches = iter(batches)
+        first = next(batches, None)
+        if not first:
+            return
+        file_hash = first[0].metadata.get("file_hash")
+        file_key = f"{FILE_HASH_PREFIX}{file_name}"
+        if file_hash and docstore.get_document_hash(file_key) == file_hash:
+            logger.info(f"{file_name} is already indexed and unchanged, skipping")
+            return
+
+        indexed_ids = self._get_file_doc_ids(file_name)
+        seen_ids = {f"{file_name}{PAGE_ID_SEPARATOR}{page}" for page in range(1, resume_from + 1)}
+        position, total, new, replaced_total = resume_from, 0, 0, 0
+        for documents in itertools.chain([first], batches):
+            changed, replaced = [], []
+            for document in documents:
+                position += 1
+                document.id_ = f"{file_name}{PAGE_ID_SEPARATOR}{document.metadata.get('page', position)}"
+                seen_ids.add(document.id_)
+                if document.id_ in indexed_ids:
+                    if docstore.get_document_hash(document.id_) == self.fingerprint(document):
+                        continue
+                    replaced.append(document.id_)
+                changed.append(document)
+            total += len(documents)
+            new += len(changed) - len(replaced)
+            replaced_total += len(replaced)
+            if changed:
+                # The previous version of a changed page stays searchable until the new one is
+                # indexed; its nodes are dropped afterwards.
+                stale_node_ids = {doc_id: self._get_node_ids([doc_id]) for doc_id in replaced}
+                try:
+                    self.update_index(changed, progress)
+                finally:
+                    # A cancel raised from progress can come before or after the commit; only
+                    # pages whose new version was committed lose their previous nodes.
+                    committed = [document.id_ for document in changed if document.id_ in stale_node_ids
+                                 and docstore.get_document_hash(document.id_) == self.fingerprint(document)]
+                    self._delete_replaced_nodes(
+                        committed, set().union(*(stale_node_ids[doc_id] for doc_id in committed))
+                    )
+            yield changed
+
+        # Pages that disappeared can only be known once the whole file has been read.
+        removed = indexed_ids - seen_ids
+        if removed:
+            self.delete_many(removed)
+        if file_hash:
+            with self._index_thread_lock:
+                docstore.set_document_hash(file_key, file_hash)
+                self._save_index(self._index)
+            if self.catalog is not None:
+                self.catalog.set_file_hash(file_name, file_hash)
+        logger.info(
+            f"{file_name}: {new} new, {replaced_total} changed, "
+            f"{len(removed)} removed, {total - new - replaced_total} unchanged pages"
+        )
+
+    def _get_node_ids(self, doc_ids: Iterable[str]) -> Set[str]:
+        docstore = self.storage_context.docstore
+        node_ids = set()
+        for doc_id in doc_ids:
+            ref_doc_info = docstore.get_ref_doc_info(doc_id)
+            if ref_doc_info is not None:
+                node_ids.update(ref_doc_info.node_ids)
+        return node_ids
+
+    def _delete_replaced_nodes(self, doc_ids: List[str], node_ids: Set[str]) -> None:
+        """Remove the previous nodes of re-indexed documents; parsing gives new nodes fresh ids."""
+        if not node_ids:
+            return
+        with self._index_thread_lock:
+            self._index.vector_store.delete_nodes(list(node_ids))
+            docstore = self.storage_context.docstore
+            for node_id in node_ids:
+                docstore.delete_document(node_id, raise_error=False)
+            self._save_index(self._index)
+        if self.sparse_index is not None:
+            self.sparse_index.delete_nodes(node_ids)
+        # The catalog already replaced these documents when their new nodes were added.
+        if self.response_cache is not None:
+            self.response_cache.invalidate(doc_ids)
+
+    def _get_file_doc_ids(self, file_name: str) -> Set[str]:
+        if self.catalog is not None:
+            return self.catalog.document_ids(file_name)
+        prefix = f"{file_name}{PAGE_ID_SEPARATOR}"
+        ref_doc_info = self.storage_context.docstore.get_all_ref_doc_info() or {}
+        return {doc_id for doc_id in ref_doc_info if doc_id.startswith(prefix)}
+
+    @staticmethod
+    def fingerprint(document: Document) -> str:
+        # Document.hash also covers metadata such as the upload's temp path, which
+        # changes on every upload, so pages are fingerprinted on their text only.
+        return hashlib.sha256(document.get_content().encode("utf-8")).hexdigest()
+
+    def update_index(self, documents: List[Document], progress: Optional[Progress] = None) -> List[Document]:
+        """Parse, embed and index the documents; progress, if given, is told about embedded and upserted nodes."""
         if not documents:
             logger.warning("No documents provided for indexing.")
             return []
-        
-        with self._index_thread_lock:
-            for document in documents:
-                self._index.insert(document, show_progress=self.show_progress)
-            
+
+        start = time.perf_counter()
+        # Parsing, embedding and the vector store upsert run without the lock;
+        # only the docstore/index store commit has to be serialized.
+        with telemetry.span("parse"):
+            nodes = self._parse_documents(documents)
+        with telemetry.span("embed"):
+            self._embed_nodes(nodes, progress)
+        with telemetry.span("upsert"):
+            node_ids = self._upsert_nodes(nodes)
+
+        with self._index_thread_lock, telemetry.span("commit"):
+            self._commit_nodes(documents, nodes)
             self._save_index(self._index)
-        
+        if self.sparse_index is not None:
+            with telemetry.span("sparse_index"):
+                self.sparse_index.add_nodes(nodes)
+        if self.catalog is not None:
+            self.catalog.add_nodes(nodes, embed_model=self.embed_model.model_name)
+        telemetry.count("rag_ingested_pages_total", len(documents))
+        telemetry.count("rag_ingested_nodes_total", len(nodes))
+        if progress is not None:
+            # Only reported once committed, so a progress callback that raises never leaves
+            # vectors in the store without their docstore entries.
+            progress("nodes_upserted", len(node_ids))
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        logger.info(
+            f"Indexed {len(documents)} pages into {len(nodes)} nodes in {elapsed:.2f}s "
+            f"({len(documents) / elapsed:.1f} pages/s, {len(nodes) / elapsed:.1f} nodes/s)"
+        )
         return documents
 
+    def _parse_documents(self, documents: List[Document]) -> List[BaseNode]:
+        parsers = [t for t in self.transformations if t is not self.embed_model]
+        num_workers = min(self.num_workers, os.cpu_count() or 1, len(documents) // MIN_DOCUMENTS_PER_WORKER)
+        pipeline = IngestionPipeline(transformations=parsers, disable_cache=True)
+        return pipeline.run(
+            documents=documents,
+            num_workers=num_workers if num_workers > 1 else None,
+            show_progress=self.show_progress,
+        )
+
+    def _embed_nodes(self, nodes: Sequence[BaseNode], progress: Optional[Progress] = None) -> None:
+        pending = [node for node in nodes if node.embedding is None]
+        if progress is not None and len(pending) < len(nodes):
+            progress("nodes_embedded", len(nodes) - len(pending))
+        if not pending:
+            return
+        batch_size = self.embed_model.embed_batch_size
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        def embed_batch(batch: List[BaseNode]) -> None:
+            texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+            embeddings = self.embed_model.get_text_embedding_batch(texts)
+            for node, embedding in zip(batch, embeddings):
+                node.embedding = embedding
+            if progress is not None:
+                progress("nodes_embedded", len(batch))
+
+        with ThreadPoolExecutor(max_workers=min(self.embed_concurrency, len(batches))) as executor:
+            # list() re-raises the first embedding error, if any.
+            list(executor.map(embed_batch, batches))
+
+    def _upsert_nodes(self, nodes: Sequence[BaseNode]) -> List[str]:
+        if not nodes:
+            return []
+        return self._index.vector_store.add(list(nodes))
+
+    def _commit_nodes(self, documents: List[Document], nodes: Sequence[BaseNode]) -> None:
+        # The vector store already has the nodes with their text; the docstore keeps them
+        # without embeddings for ref doc tracking, the sparse index backfill and the catalog.
+        nodes_without_embedding = []
+        for node in nodes:
+            node_without_embedding = node.model_copy()
+            node_without_embedding.embedding = None
+            nodes_without_embedding.append(node_without_embedding)
+
+        docstore = self.storage_context.docstore
+        docstore.add_documents(nodes_without_embedding, allow_update=True)
+        for document in documents:
+            docstore.set_document_hash(document.get_doc_id(), self.fingerprint(document))
+
     def delete(self, doc_id: str) -> None:
+        self.delete_many([doc_id])
+
+    def delete_many(self, doc_ids: Iterable[str]) -> None:
+        doc_ids = list(doc_ids)
         with self._index_thread_lock:
-            self._index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            docstore = self.storage_context.docstore
+            for doc_id in doc_ids:
+                self._index.delete_ref_doc(doc_id)
+                # The index leaves the docstore alone when the vector store keeps the text.
+                docstore.delete_ref_doc(doc_id, raise_error=False)
             self._save_index(self._index)
+        if self.sparse_index is not None:
+            self.sparse_index.delete_ref_docs(doc_ids)
+        if self.catalog is not None:
+            self.catalog.delete_documents(doc_ids)
+        if self.response_cache is not None:
+            self.response_cache.invalidate(doc_ids)
+
+    def delete_file(self, file_name: str) -> int:
+        """Remove every page of a file from the index; returns the number of pages removed."""
+        doc_ids = self._get_file_doc_ids(file_name)
+        if doc_ids:
+            self.delete_many(doc_ids)
+        with self._index_thread_lock:
+            # Forget the fingerprint too, so uploading the file again indexes it again.
+            self.storage_context.docstore.delete_document(f"{FILE_HASH_PREFIX}{file_name}", raise_error=False)
+            self._save_index(self._index)
+        logger.info(f"Deleted {file_name} ({len(doc_ids)} pages)")
+        return len(doc_ids)
 
     def get_document_count(self) -> int:
-        return len(self.storage_context.docstore.docs)
+        if self.catalog is not None:
+            return self.catalog.stats()["documents"]
+        return len(self.storage_context.docstore.get_all_ref_doc_info() or {})
 
     def get_node_count(self) -> int:
-        return len([key for key in self.storage_context.docstore.docs.keys() if isinstance(key, str) and key.startswith('node')])
\ No newline at end of file
+        if self.catalog is not None:
+            return self.catalog.stats()["nodes"]
+        return len(self.storage_context.docstore.docs)
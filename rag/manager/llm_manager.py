@@ -1,21 +1,93 @@
+import time
 import logging
+from typing import Any, Dict, Optional
 from injector import inject, singleton
+from llama_index.core.llms import LLM
 from llama_index.llms.ollama import Ollama
 
+from rag import telemetry
+from rag.startup import timed
+
 logger = logging.getLogger(__name__)
 
+CONTEXT_HEADER = "Use the context information below to assist the user."
+
 @singleton
 class LLMManager:
+    """The Ollama model and its lifecycle.
+
+    Every request (including the warm-up) sends the same options, since Ollama
+    reloads the model when num_ctx or num_thread change, and the same prompt
+    prefix: the system prompt comes before the retrieved context, so Ollama can
+    reuse its KV cache for it across turns and sessions.
+    """
 
     @inject
     def __init__(self, config) -> None:
+        self.model = config.LLM_MODEL
+        self.keep_alive = config.LLM_KEEP_ALIVE
+        self.options: Dict[str, Any] = {"num_ctx": config.LLM_CONTEXT_WINDOW}
+        if config.LLM_NUM_THREAD > 0:
+            self.options["num_thread"] = config.LLM_NUM_THREAD
+        self.system_prompt = config.SYSTEM_PROMPT.strip()
+        # Braces are escaped: the template is formatted with the context.
+        escaped = self.system_prompt.replace("{", "{{").replace("}", "}}")
+        self.context_template = f"{escaped}\n\n{CONTEXT_HEADER}\n--------------------\n{{context_str}}\n--------------------\n"
         try:
-            self.llm = Ollama(
-                model=config.LLM_MODEL, 
-                temperature=config.TEMPERATURE, 
-                request_timeout=config.TIMEOUT
-            )
+            self.llm = self._create_llm(config)
         except Exception as e:
             logger.debug(f"Could not load the model! {e}")
             self.llm = None
-    
\ No newline at end of file
+
+    def _create_llm(self, config) -> LLM:
+        return Ollama(
+            model=config.LLM_MODEL,
+            temperature=config.TEMPERATURE,
+            request_timeout=config.TIMEOUT,
+            context_window=config.LLM_CONTEXT_WINDOW,
+            keep_alive=self.keep_alive,
+            additional_kwargs=dict(self.options),
+        )
+
+    @property
+    def prompt_prefix(self) -> str:
+        """The part of every prompt that does not change between turns."""
+        return f"{self.system_prompt}\n\n{CONTEXT_HEADER}\n--------------------\n"
+
+    def _is_loaded(self) -> Optional[bool]:
+        try:
+            return any(model.model == self.model or model.name == self.model for model in self.llm.client.ps().models)
+        except Exception:
+            return None
+
+    def _first_token(self) -> float:
+        start = time.perf_counter()
+        self.llm.client.chat(
+            model=self.model,
+            messages=[{"role": "system", "content": self.prompt_prefix}],
+            options={**self.options, "num_predict": 1},
+            keep_alive=self.keep_alive,
+        )
+        return time.perf_counter() - start
+
+    def warm_up(self) -> None:
+        """Load the model and prefill the prompt prefix, logging cold and warm time to first token."""
+        if self.llm is None or not hasattr(self.llm, "client"):
+            return
+        loaded = self._is_loaded()
+        try:
+            with timed("llm first token (cold)" if loaded is False else "llm first token"):
+                first = self._first_token()
+            with timed("llm first token (warm)"):
+                second = self._first_token()
+        except Exception as e:
+            logger.warning(f"LLM warm-up failed, {self.model} will load on first use: {e}")
+            return
+        if loaded is False:
+            telemetry.record("llm_warm_up", first, state="cold")
+        telemetry.record("llm_warm_up", second, state="warm")
+        state = {True: "already loaded", False: "cold", None: "unknown state"}[loaded]
+        logger.info(
+            f"LLM {self.model} warm ({state}): first token {first * 1000:.0f}ms, "
+            f"then {second * 1000:.0f}ms with the model loaded and the prompt prefix cached"
+        )
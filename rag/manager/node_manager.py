@@ -1,29 +1,78 @@
+import os
 import logging
+from pathlib import Path
 from injector import inject, singleton
 from llama_index.core.storage.docstore import BaseDocumentStore, SimpleDocumentStore
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
 from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.storage.index_store.keyval_index_store import KVIndexStore
 from llama_index.core.storage.index_store.types import BaseIndexStore
 
+from rag.manager.storage.sqlite_kv_store import SQLiteKVStore
+
 logger = logging.getLogger(__name__)
 
+SQLITE_DB_NAME = "store.db"
+# JSON files written by SimpleDocumentStore / SimpleIndexStore.persist
+LEGACY_STORE_FILES = ("docstore.json", "index_store.json")
+
 @singleton
 class NodeManager:
     index_store: BaseIndexStore
     doc_store: BaseDocumentStore
-    
+
     @inject
     def __init__(self, config) -> None:
+        self.kv_store = None
+        if config.DOCSTORE_BACKEND == "sqlite":
+            self._init_sqlite_stores(Path(config.LOCAL_DATA_PATH))
+        elif config.DOCSTORE_BACKEND == "simple":
+            self._init_simple_stores(Path(config.LOCAL_DATA_PATH))
+        else:
+            raise ValueError(f"Unknown DOCSTORE_BACKEND: {config.DOCSTORE_BACKEND}")
+
+    def _init_simple_stores(self, local_data_path: Path) -> None:
         try:
             self.index_store = SimpleIndexStore.from_persist_dir(
-                persist_dir=str(config.LOCAL_DATA_PATH)
+                persist_dir=str(local_data_path)
             )
         except FileNotFoundError:
             logger.debug("Local index store not found, creating a new one")
             self.index_store = SimpleIndexStore()
         try:
             self.doc_store = SimpleDocumentStore.from_persist_dir(
-                persist_dir=str(config.LOCAL_DATA_PATH)
+                persist_dir=str(local_data_path)
             )
         except FileNotFoundError:
             logger.debug("Local document store not found, creating a new one")
-            self.doc_store = SimpleDocumentStore()
\ No newline at end of file
+            self.doc_store = SimpleDocumentStore()
+
+    def _init_sqlite_stores(self, local_data_path: Path) -> None:
+        local_data_path.mkdir(parents=True, exist_ok=True)
+        db_path = local_data_path / SQLITE_DB_NAME
+        if not db_path.exists():
+            self._migrate_legacy_stores(local_data_path, db_path)
+        self.kv_store = SQLiteKVStore(str(db_path))
+        # Same default namespaces as the Simple* stores, so migrated keys line up.
+        self.doc_store = KVDocumentStore(self.kv_store)
+        self.index_store = KVIndexStore(self.kv_store)
+
+    def _migrate_legacy_stores(self, local_data_path: Path, db_path: Path) -> None:
+        legacy_paths = [local_data_path / name for name in LEGACY_STORE_FILES]
+        legacy_paths = [path for path in legacy_paths if path.exists()]
+        if not legacy_paths:
+            return
+        # Build the database under a temporary name so an interrupted migration
+        # is simply redone on the next start.
+        tmp_path = db_path.with_name(f"{SQLITE_DB_NAME}.migrating")
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{tmp_path}{suffix}").unlink(missing_ok=True)
+        kv_store = SQLiteKVStore(str(tmp_path))
+        for legacy_path in legacy_paths:
+            count = kv_store.import_json(str(legacy_path))
+            logger.info(f"Migrated {count} entries from {legacy_path}")
+        kv_store.close()
+        os.replace(tmp_path, db_path)
+        for legacy_path in legacy_paths:
+            os.replace(legacy_path, legacy_path.with_name(f"{legacy_path.name}.migrated"))
+        logger.info(f"Migrated {local_data_path} to {db_path}")
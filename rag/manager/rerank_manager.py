@@ -0,0 +1,135 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional
+from injector import inject, singleton
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from rag.config import Config
+
+logger = logging.getLogger(__name__)
+
+@singleton
+class RerankManager:
+    """Small cross-encoder scored on CPU; torch/transformers are imported on first use."""
+
+    @inject
+    def __init__(self, config: Config) -> None:
+        self.model_name = config.RERANK_MODEL
+        self.batch_size = config.RERANK_BATCH_SIZE
+        self.quantize = config.RERANK_QUANTIZE
+        self._tokenizer = None
+        self._model = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        # One scoring thread: torch already spreads a forward pass over the cores. Callers
+        # wait on it with a timeout, so the latency budget also covers time spent queued.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def _load(self) -> bool:
+        if self._model is not None or self._load_failed:
+            return self._model is not None
+        with self._load_lock:
+            if self._model is None and not self._load_failed:
+                try:
+                    import torch
+                    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+                    tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+                    model.eval()
+                    if self.quantize:
+                        # Dynamic int8 quantization of the linear layers: ~2-3x faster on CPU.
+                        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                    self._tokenizer, self._model = tokenizer, model
+                    logger.info(f"Loaded reranker {self.model_name} (int8={self.quantize})")
+                except Exception as e:
+                    logger.warning(f"Could not load the reranker {self.model_name}, reranking disabled: {e}")
+                    self._load_failed = True
+        return self._model is not None
+
+    def warm_up(self) -> None:
+        self._load()
+
+    def score(self, query: str, texts: List[str], deadline: Optional[float] = None) -> Optional[List[float]]:
+        """Relevance scores for (query, text) pairs, or None if the model is unavailable or the deadline passed."""
+        if not self._load():
+            return None
+        if deadline is None:
+            return self._score(query, texts, None)
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return None
+        future = self._executor.submit(self._score, query, texts, deadline)
+        try:
+            return future.result(timeout=remaining)
+        except FutureTimeoutError:
+            # A batch already running finishes in the background; the rest is skipped.
+            future.cancel()
+            return None
+
+    def _score(self, query: str, texts: List[str], deadline: Optional[float]) -> Optional[List[float]]:
+        import torch
+
+        scores: List[float] = []
+        for start in range(0, len(texts), self.batch_size):
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+            batch = texts[start:start + self.batch_size]
+            inputs = self._tokenizer(
+                [query] * len(batch), batch,
+                padding=True, truncation=True, max_length=512, return_tensors="pt",
+            )
+            with torch.inference_mode():
+                logits = self._model(**inputs).logits
+            # Single-logit models score relevance directly; otherwise use the last ("relevant") class.
+            scores.extend((logits[:, 0] if logits.shape[-1] == 1 else logits[:, -1]).tolist())
+        return scores
+
+
+class CrossEncoderRerank(BaseNodePostprocessor):
+    """Keeps the top_n nodes by cross-encoder score.
+
+    When scoring does not fit in the latency budget (or the model cannot be
+    loaded) the nodes pass through in retrieval order, still cut to top_n.
+    """
+
+    top_n: int = Field(default=2)
+    latency_budget_ms: float = Field(default=300.0)
+    _reranker: RerankManager = PrivateAttr()
+
+    def __init__(self, reranker: RerankManager, top_n: int = 2, latency_budget_ms: float = 300.0) -> None:
+        super().__init__(top_n=top_n, latency_budget_ms=latency_budget_ms)
+        self._reranker = reranker
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CrossEncoderRerank"
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        if query_bundle is None or len(nodes) <= self.top_n:
+            return nodes[:self.top_n]
+
+        start = time.perf_counter()
+        texts = [node.node.get_content(metadata_mode=MetadataMode.NONE) for node in nodes]
+        scores = self._reranker.score(
+            query_bundle.query_str, texts, deadline=start + self.latency_budget_ms / 1000.0
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        if scores is None:
+            logger.info(f"Rerank skipped after {elapsed_ms:.0f}ms, passing through {self.top_n} of {len(nodes)} nodes")
+            return nodes[:self.top_n]
+
+        logger.debug(f"Reranked {len(nodes)} nodes in {elapsed_ms:.0f}ms")
+        reranked = sorted(
+            (NodeWithScore(node=node.node, score=score) for node, score in zip(nodes, scores)),
+            key=lambda node: node.score,
+            reverse=True,
+        )
+        return reranked[:self.top_n]
@@ -0,0 +1,155 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set
+import numpy as np
+from injector import inject, singleton
+from llama_index.core.schema import NodeWithScore
+
+from rag.config import Config
+from rag.manager.catalog_manager import CatalogManager
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CachedResponse:
+    query: str
+    response: str
+    ref_doc_ids: FrozenSet[str]
+    created_at: float
+    last_used: float
+
+@singleton
+class ResponseCache:
+    """Answers keyed by query embedding, matched by cosine similarity.
+
+    Vectors live in a fixed-size matrix (one row per entry) so a lookup is a
+    single matrix-vector product. Entries expire after a TTL, the least recently
+    used one is replaced when the cache is full, and an entry is dropped as soon
+    as any document it cited is deleted or re-ingested, also by another process
+    (read from the catalog's change log before each lookup).
+    """
+
+    @inject
+    def __init__(self, config: Config, catalog: Optional[CatalogManager] = None) -> None:
+        self.enabled = config.RESPONSE_CACHE_ENABLED
+        self.similarity_threshold = config.RESPONSE_CACHE_THRESHOLD
+        self.ttl = config.RESPONSE_CACHE_TTL
+        self.max_entries = config.RESPONSE_CACHE_MAX_ENTRIES
+        self._vectors: Optional[np.ndarray] = None
+        self._occupied = np.zeros(self.max_entries, dtype=bool)
+        # row -> entry, least recently used first
+        self._entries: "OrderedDict[int, CachedResponse]" = OrderedDict()
+        self._rows_by_ref_doc: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.catalog = catalog
+        self._change_seq = catalog.last_change() if catalog is not None and self.enabled else 0
+
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, query_embedding: Sequence[float]) -> Optional[CachedResponse]:
+        if not self.enabled:
+            return None
+        self._apply_changes()
+        query = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if not self._entries or self._vectors.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+            similarities = self._vectors @ query
+            similarities[~self._occupied] = -np.inf
+            row = int(np.argmax(similarities))
+            if similarities[row] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            entry = self._entries[row]
+            entry.last_used = now
+            self._entries.move_to_end(row)
+            self.hits += 1
+            logger.debug(f"Response cache hit (similarity {similarities[row]:.3f}) for cached query {entry.query!r}")
+            return entry
+
+    def put(self, query: str, query_embedding: Sequence[float], response: str,
+            source_nodes: List[NodeWithScore]) -> None:
+        if not self.enabled:
+            return
+        ref_doc_ids = frozenset(n.node.ref_doc_id for n in source_nodes if n.node.ref_doc_id)
+        if not ref_doc_ids:
+            # Without cited sources there is nothing to invalidate the answer on.
+            return
+        vector = self._normalize(query_embedding)
+        now = time.time()
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._occupied[:] = False
+                self._entries.clear()
+                self._rows_by_ref_doc.clear()
+            self._expire(now)
+            if len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._entries)))
+            row = int(np.argmin(self._occupied))
+            self._vectors[row] = vector
+            self._occupied[row] = True
+            self._entries[row] = CachedResponse(query, response, ref_doc_ids, created_at=now, last_used=now)
+            for ref_doc_id in ref_doc_ids:
+                self._rows_by_ref_doc.setdefault(ref_doc_id, set()).add(row)
+
+    def invalidate(self, ref_doc_ids: Iterable[str]) -> int:
+        with self._lock:
+            rows = set()
+            for ref_doc_id in ref_doc_ids:
+                rows |= self._rows_by_ref_doc.get(ref_doc_id, set())
+            for row in rows:
+                self._remove(row)
+        if rows:
+            logger.info(f"Invalidated {len(rows)} cached responses")
+        return len(rows)
+
+    def _apply_changes(self) -> None:
+        if self.catalog is None:
+            return
+        seen = self._change_seq
+        seq, doc_ids = self.catalog.changes_since(seen)
+        if seq == seen:
+            return
+        self._change_seq = seq
+        if doc_ids is None:
+            logger.info("Response cache is too far behind the catalog change log, clearing it")
+            self.clear()
+        else:
+            self.invalidate(doc_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            for row in list(self._entries):
+                self._remove(row)
+
+    def _expire(self, now: float) -> None:
+        expired = [row for row, entry in self._entries.items() if now - entry.created_at > self.ttl]
+        for row in expired:
+            self._remove(row)
+
+    def _remove(self, row: int) -> None:
+        entry = self._entries.pop(row)
+        self._occupied[row] = False
+        for ref_doc_id in entry.ref_doc_ids:
+            rows = self._rows_by_ref_doc.get(ref_doc_id)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._rows_by_ref_doc[ref_doc_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,131 @@
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional, Tuple
+from injector import inject, singleton
+from llama_index.core.chat_engine.types import BaseChatEngine
+from llama_index.core.memory import BaseMemory
+from llama_index.core.storage.chat_store import BaseChatStore, SimpleChatStore
+
+from rag.config import Config
+from rag.manager.storage.sqlite_chat_store import SQLiteChatStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_ID = "default"
+# How often stored histories idle for longer than SESSION_IDLE_TIMEOUT are deleted.
+PRUNE_INTERVAL_SECONDS = 60.0
+
+@dataclass
+class ChatSession:
+    session_id: str
+    chat_engine: BaseChatEngine
+    memory: BaseMemory
+    created_at: float
+    last_used: float
+    # Serializes turns within one session, sync and async alike; different sessions run concurrently.
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @asynccontextmanager
+    async def async_lock(self) -> AsyncIterator[None]:
+        """Hold lock from a coroutine; waiting for it does not block the event loop."""
+        if not self.lock.acquire(blocking=False):
+            acquire = asyncio.ensure_future(asyncio.to_thread(self.lock.acquire))
+            try:
+                await asyncio.shield(acquire)
+            except asyncio.CancelledError:
+                # The thread still gets the lock eventually; give it back then.
+                acquire.add_done_callback(lambda _: self.lock.release())
+                raise
+        try:
+            yield
+        finally:
+            self.lock.release()
+
+@singleton
+class SessionManager:
+    """Chat engines per session, kept in this process, and their histories in chat_store.
+
+    With the "sqlite" backend histories are shared by every process serving the
+    app: an evicted session (or one served by another worker) picks up its
+    conversation where it left off, until it has been idle for
+    SESSION_IDLE_TIMEOUT. With "memory" a history lives as long as its engine.
+    """
+
+    @inject
+    def __init__(self, config: Config) -> None:
+        self.idle_timeout = config.SESSION_IDLE_TIMEOUT
+        self.max_sessions = config.MAX_SESSIONS
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        if config.CHAT_STORE_BACKEND == "sqlite":
+            local_data_path = Path(config.LOCAL_DATA_PATH)
+            local_data_path.mkdir(parents=True, exist_ok=True)
+            self.chat_store: BaseChatStore = SQLiteChatStore(str(local_data_path / "chats.db"))
+        elif config.CHAT_STORE_BACKEND == "memory":
+            self.chat_store = SimpleChatStore()
+        else:
+            raise ValueError(f"Unknown CHAT_STORE_BACKEND: {config.CHAT_STORE_BACKEND}")
+        self.persistent = isinstance(self.chat_store, SQLiteChatStore)
+
+    def get_or_create(self, session_id: str, factory: Callable[[], Tuple[BaseChatEngine, BaseMemory]]) -> ChatSession:
+        now = time.monotonic()
+        self._prune_stored(now)
+        with self._lock:
+            self._evict_idle(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+                return session
+
+            while len(self._sessions) >= self.max_sessions:
+                evicted_id, _ = self._sessions.popitem(last=False)
+                self._forget(evicted_id)
+                logger.info(f"Session limit reached, evicted least recently used session {evicted_id}")
+            chat_engine, memory = factory()
+            session = ChatSession(session_id, chat_engine, memory, created_at=now, last_used=now)
+            self._sessions[session_id] = session
+            return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        self.chat_store.delete_messages(session_id)
+
+    def _forget(self, session_id: str) -> None:
+        # A stored history outlives the engine; it is pruned once idle in every process.
+        if not self.persistent:
+            self.chat_store.delete_messages(session_id)
+
+    def _prune_stored(self, now: float) -> None:
+        if not self.persistent or now - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = now
+        pruned = self.chat_store.prune(self.idle_timeout)
+        if pruned:
+            logger.debug(f"Deleted {pruned} idle chat histories")
+
+    def _evict_idle(self, now: float) -> None:
+        # Sessions are kept in least-recently-used order, so idle ones are at the front.
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used < self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            self._forget(session_id)
+            logger.debug(f"Evicted idle session {session_id}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
@@ -0,0 +1,159 @@
+import re
+import math
+import sqlite3
+import logging
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+from injector import inject, singleton
+from llama_index.core.schema import BaseNode, MetadataMode
+
+from rag.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Keeps codes such as "AC-1042", "form 12.3" or "v2/rev" together as single terms.
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+@singleton
+class SparseIndexManager:
+    """BM25 inverted index over docstore nodes, stored in SQLite.
+
+    Nodes are added and removed as IndexManager ingests and deletes them, so the
+    index never has to be rebuilt at startup. The database is memory-mapped
+    (PRAGMA mmap_size), so loading it is just opening the file.
+    """
+
+    @inject
+    def __init__(self, config: Config) -> None:
+        local_data_path = Path(config.LOCAL_DATA_PATH)
+        local_data_path.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(local_data_path / "sparse_index.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={int(config.SPARSE_MMAP_SIZE)}")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                node_id TEXT PRIMARY KEY,
+                ref_doc_id TEXT,
+                length INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_ref_doc_id ON docs (ref_doc_id);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                node_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, node_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_node_id ON postings (node_id);
+            CREATE TABLE IF NOT EXISTS stats (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO stats (key, value) VALUES ('doc_count', 0), ('total_length', 0);
+            """
+        )
+
+    def add_nodes(self, nodes: Sequence[BaseNode]) -> None:
+        doc_rows, posting_rows = [], []
+        for node in nodes:
+            terms = Counter(tokenize(node.get_content(metadata_mode=MetadataMode.NONE)))
+            doc_rows.append((node.node_id, node.ref_doc_id, sum(terms.values())))
+            posting_rows.extend((term, node.node_id, tf) for term, tf in terms.items())
+        if not doc_rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-adding a node replaces its previous postings.
+                self._delete_node_ids([row[0] for row in doc_rows])
+                self._conn.executemany("INSERT INTO docs (node_id, ref_doc_id, length) VALUES (?, ?, ?)", doc_rows)
+                self._conn.executemany("INSERT INTO postings (term, node_id, tf) VALUES (?, ?, ?)", posting_rows)
+                self._update_stats(len(doc_rows), sum(row[2] for row in doc_rows))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_ref_docs(self, ref_doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for ref_doc_id in ref_doc_ids:
+                    node_ids = [row[0] for row in self._conn.execute(
+                        "SELECT node_id FROM docs WHERE ref_doc_id = ?", (ref_doc_id,)
+                    )]
+                    self._delete_node_ids(node_ids)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def delete_nodes(self, node_ids: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete_node_ids(list(node_ids))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _delete_node_ids(self, node_ids: List[str]) -> None:
+        removed, removed_length = 0, 0
+        for node_id in node_ids:
+            row = self._conn.execute("SELECT length FROM docs WHERE node_id = ?", (node_id,)).fetchone()
+            if row is None:
+                continue
+            self._conn.execute("DELETE FROM postings WHERE node_id = ?", (node_id,))
+            self._conn.execute("DELETE FROM docs WHERE node_id = ?", (node_id,))
+            removed += 1
+            removed_length += row[0]
+        if removed:
+            self._update_stats(-removed, -removed_length)
+
+    def _update_stats(self, doc_delta: int, length_delta: int) -> None:
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE key = 'doc_count'", (doc_delta,))
+        self._conn.execute("UPDATE stats SET value = value + ? WHERE key = 'total_length'", (length_delta,))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT value FROM stats WHERE key = 'doc_count'").fetchone()[0]
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scores = defaultdict(float)
+        with self._lock:
+            doc_count, total_length = (row[0] for row in self._conn.execute(
+                "SELECT value FROM stats WHERE key IN ('doc_count', 'total_length') ORDER BY key"
+            ))
+            if doc_count == 0:
+                return []
+            avg_length = total_length / doc_count
+            for term in terms:
+                postings = self._conn.execute(
+                    "SELECT p.node_id, p.tf, d.length FROM postings p JOIN docs d ON d.node_id = p.node_id "
+                    "WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                for node_id, tf, length in postings:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[node_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
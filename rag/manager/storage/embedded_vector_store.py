@@ -0,0 +1,373 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Iterable, List, Optional
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "vectors.db"
+HNSW_NAME = "hnsw.bin"
+INITIAL_CAPACITY = 1024
+# Rows scored per step of an exact search; bounds the float32 copy made from the float16 matrix.
+SEARCH_BLOCK_ROWS = 16384
+# The HNSW file is rewritten on persist once this many rows (or 10% of the index, if more) are unsaved;
+# rows appended after the last save are re-added from the matrix at startup.
+HNSW_SAVE_MIN_ROWS = 10000
+# Tombstoned rows are compacted away at startup once they outnumber the live ones.
+COMPACT_MIN_DEAD_ROWS = 1000
+SQLITE_MAX_VARIABLES = 500
+
+
+class EmbeddedVectorStore(BasePydanticVectorStore):
+    """In-process vector store: a float16 memory-mapped matrix of normalized vectors under
+    data_dir, searched exactly in blocks or through an optional hnswlib index.
+
+    Rows are only ever appended; deleting a node (or re-adding one) tombstones its row.
+    Like a Qdrant payload, each row's node (text and metadata) is kept in SQLite next to
+    the matrix, so query results come back as nodes.
+    """
+
+    stores_text: bool = True
+    is_embedding_query: bool = True
+    data_dir: str
+    use_hnsw: bool = True
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    hnsw_ef: int = 64
+
+    _lock: threading.RLock = PrivateAttr()
+    _conn: sqlite3.Connection = PrivateAttr()
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _rows: int = PrivateAttr(default=0)
+    _capacity: int = PrivateAttr(default=0)
+    _matrix: Optional[np.memmap] = PrivateAttr(default=None)
+    _alive: np.ndarray = PrivateAttr()
+    _node_ids: List[str] = PrivateAttr(default_factory=list)
+    _hnsw: Any = PrivateAttr(default=None)
+    _hnsw_saved_rows: int = PrivateAttr(default=0)
+
+    def __init__(self, data_dir: str, use_hnsw: bool = True, hnsw_m: int = 16,
+                 hnsw_ef_construct: int = 100, hnsw_ef: int = 64) -> None:
+        super().__init__(data_dir=str(data_dir), use_hnsw=use_hnsw, hnsw_m=hnsw_m,
+                         hnsw_ef_construct=hnsw_ef_construct, hnsw_ef=hnsw_ef)
+        Path(self.data_dir).mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._alive = np.zeros(0, dtype=bool)
+        self._conn = sqlite3.connect(str(Path(self.data_dir) / DB_NAME), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            " row INTEGER PRIMARY KEY,"
+            " node_id TEXT NOT NULL,"
+            " ref_doc_id TEXT,"
+            " payload TEXT,"
+            " deleted INTEGER NOT NULL DEFAULT 0"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rows_node_id ON rows (node_id) WHERE deleted = 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rows_ref_doc_id ON rows (ref_doc_id) WHERE deleted = 0")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "EmbeddedVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def _vectors_path(self) -> Path:
+        # The file name changes on compaction, so switching to the compacted matrix is one commit.
+        return Path(self.data_dir) / (self._get_meta("vectors_file") or "vectors-0.f16")
+
+    def _load(self) -> None:
+        dim = self._get_meta("dim")
+        if dim is None:
+            return
+        self._dim = int(dim)
+        rows = self._conn.execute("SELECT node_id, deleted FROM rows ORDER BY row").fetchall()
+        self._rows = len(rows)
+        self._node_ids = [node_id for node_id, _ in rows]
+        self._open_matrix(max(INITIAL_CAPACITY, self._rows))
+        self._alive = np.zeros(self._capacity, dtype=bool)
+        self._alive[:self._rows] = [not deleted for _, deleted in rows]
+        dead = self._rows - int(self._alive.sum())
+        if dead >= COMPACT_MIN_DEAD_ROWS and dead > self._rows - dead:
+            self._compact()
+        if self.use_hnsw:
+            self._load_hnsw()
+        logger.info(f"Embedded vector store: {int(self._alive.sum())} vectors of {self._dim} dims in {self.data_dir}")
+
+    def _open_matrix(self, capacity: int) -> None:
+        path = self._vectors_path
+        size = capacity * self._dim * np.dtype(np.float16).itemsize
+        with open(path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(path, dtype=np.float16, mode="r+", shape=(capacity, self._dim))
+        self._capacity = capacity
+
+    def _reserve(self, rows: int) -> None:
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2)
+        self._matrix.flush()
+        self._open_matrix(capacity)
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - self._alive.size, dtype=bool)])
+        if self._hnsw is not None:
+            self._hnsw.resize_index(capacity)
+
+    def _compact(self) -> None:
+        live = np.flatnonzero(self._alive[:self._rows])
+        old_path = self._vectors_path
+        generation = int(self._get_meta("generation") or 0) + 1
+        new_name = f"vectors-{generation}.f16"
+        capacity = max(INITIAL_CAPACITY, live.size)
+        compacted = np.memmap(Path(self.data_dir) / new_name, dtype=np.float16, mode="w+", shape=(capacity, self._dim))
+        for start in range(0, live.size, SEARCH_BLOCK_ROWS):
+            block = live[start:start + SEARCH_BLOCK_ROWS]
+            compacted[start:start + block.size] = self._matrix[block]
+        compacted.flush()
+        del compacted
+        kept = self._conn.execute("SELECT node_id, ref_doc_id, payload FROM rows WHERE deleted = 0 ORDER BY row").fetchall()
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute("DELETE FROM rows")
+            self._conn.executemany(
+                "INSERT INTO rows (row, node_id, ref_doc_id, payload) VALUES (?, ?, ?, ?)",
+                [(row, *columns) for row, columns in enumerate(kept)],
+            )
+            self._set_meta("vectors_file", new_name)
+            self._set_meta("generation", generation)
+            self._set_meta("hnsw_rows", 0)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        logger.info(f"Compacted embedded vector store from {self._rows} to {len(kept)} rows")
+        self._matrix = None
+        old_path.unlink(missing_ok=True)
+        (Path(self.data_dir) / HNSW_NAME).unlink(missing_ok=True)
+        self._rows = len(kept)
+        self._node_ids = [node_id for node_id, _, _ in kept]
+        self._open_matrix(capacity)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:self._rows] = True
+
+    def _load_hnsw(self) -> None:
+        try:
+            import hnswlib
+        except ImportError:
+            logger.warning("hnswlib is not installed; the embedded vector store uses exact search")
+            return
+        # hnswlib keeps its own float32 copy of the vectors in RAM.
+        index = hnswlib.Index(space="cosine", dim=self._dim)
+        path = Path(self.data_dir) / HNSW_NAME
+        saved = int(self._get_meta("hnsw_rows") or 0)
+        if saved and saved <= self._rows and path.exists():
+            index.load_index(str(path), max_elements=self._capacity)
+        else:
+            index.init_index(max_elements=self._capacity, M=self.hnsw_m, ef_construction=self.hnsw_ef_construct)
+            saved = 0
+        for start in range(saved, self._rows, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, self._rows)
+            index.add_items(np.asarray(self._matrix[start:stop], dtype=np.float32), np.arange(start, stop))
+        for row in np.flatnonzero(~self._alive[:self._rows]):
+            try:
+                index.mark_deleted(int(row))
+            except RuntimeError:
+                pass  # already deleted in the saved index
+        self._hnsw = index
+        self._hnsw_saved_rows = saved
+
+    def _live_rows(self, column: str, values: Iterable[str]) -> List[int]:
+        values = list(values)
+        rows = []
+        for start in range(0, len(values), SQLITE_MAX_VARIABLES):
+            chunk = values[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(row for row, in self._conn.execute(
+                f"SELECT row FROM rows WHERE deleted = 0 AND {column} IN ({placeholders})", chunk
+            ))
+        return rows
+
+    def _tombstone(self, rows: List[int]) -> None:
+        for start in range(0, len(rows), SQLITE_MAX_VARIABLES):
+            chunk = rows[start:start + SQLITE_MAX_VARIABLES]
+            self._conn.execute(
+                f"UPDATE rows SET deleted = 1, payload = NULL WHERE row IN ({','.join('?' * len(chunk))})", chunk
+            )
+        self._alive[rows] = False
+        if self._hnsw is not None:
+            for row in rows:
+                self._hnsw.mark_deleted(row)
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        node_ids = [node.node_id for node in nodes]
+        with self._lock:
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._set_meta("dim", self._dim)
+                self._open_matrix(INITIAL_CAPACITY)
+                self._alive = np.zeros(self._capacity, dtype=bool)
+                if self.use_hnsw:
+                    self._load_hnsw()
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional embeddings, got {vectors.shape[1]}")
+            start, stop = self._rows, self._rows + len(nodes)
+            self._reserve(stop)
+            # The vectors are written before the rows that point at them are committed.
+            self._matrix[start:stop] = vectors
+            self._conn.execute("BEGIN")
+            try:
+                # Re-adding a node replaces it.
+                self._tombstone(self._live_rows("node_id", node_ids))
+                self._conn.executemany(
+                    "INSERT INTO rows (row, node_id, ref_doc_id, payload) VALUES (?, ?, ?, ?)",
+                    [(start + i, node.node_id, node.ref_doc_id, self._payload(node)) for i, node in enumerate(nodes)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._node_ids.extend(node_ids)
+            self._alive[start:stop] = True
+            self._rows = stop
+            if self._hnsw is not None:
+                self._hnsw.add_items(vectors, np.arange(start, stop))
+        return node_ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            self._delete_rows(self._live_rows("ref_doc_id", [ref_doc_id]))
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None,
+                     **delete_kwargs: Any) -> None:
+        if filters is not None:
+            raise ValueError("EmbeddedVectorStore does not support metadata filters")
+        with self._lock:
+            self._delete_rows(self._live_rows("node_id", node_ids or []))
+
+    def _delete_rows(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        self._conn.execute("BEGIN")
+        try:
+            self._tombstone(rows)
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._delete_rows(list(np.flatnonzero(self._alive[:self._rows])))
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("EmbeddedVectorStore does not support metadata filters")
+        vector = np.asarray(query.query_embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            rows, matrix, alive, hnsw = self._rows, self._matrix, self._alive, self._hnsw
+            restrict = None
+            if query.node_ids or query.doc_ids:
+                restrict = self._live_rows("node_id", query.node_ids or []) + self._live_rows("ref_doc_id", query.doc_ids or [])
+            live = int(alive[:rows].sum())
+            top_k = min(query.similarity_top_k, live if restrict is None else len(restrict))
+            if top_k <= 0:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            if hnsw is not None and restrict is None:
+                try:
+                    hnsw.set_ef(max(self.hnsw_ef, top_k))
+                    labels, distances = hnsw.knn_query(vector, k=top_k)
+                    return self._result(labels[0], 1.0 - distances[0])
+                except RuntimeError:
+                    pass  # too few reachable live rows for k; search exactly instead
+        # Exact search runs outside the lock: the matrix is append-only and rows < self._rows are final.
+        if restrict is not None:
+            candidates = np.asarray(sorted(restrict), dtype=np.int64)
+            scores = np.asarray(matrix[candidates], dtype=np.float32) @ vector
+        else:
+            candidates = None
+            scores = np.empty(rows, dtype=np.float32)
+            for start in range(0, rows, SEARCH_BLOCK_ROWS):
+                stop = min(start + SEARCH_BLOCK_ROWS, rows)
+                scores[start:stop] = np.asarray(matrix[start:stop], dtype=np.float32) @ vector
+            scores[~alive[:rows]] = -np.inf
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        labels = candidates[best] if candidates is not None else best
+        return self._result(labels, scores[best])
+
+    @staticmethod
+    def _payload(node: BaseNode) -> str:
+        return json.dumps(node_to_metadata_dict(node, remove_text=False, flat_metadata=False))
+
+    def _result(self, rows: np.ndarray, similarities: np.ndarray) -> VectorStoreQueryResult:
+        rows = [int(row) for row in rows]
+        with self._lock:
+            payloads = dict(self._conn.execute(
+                f"SELECT row, payload FROM rows WHERE row IN ({','.join('?' * len(rows))})", rows
+            ).fetchall())
+        nodes, ids, scores = [], [], []
+        for row, similarity in zip(rows, similarities):
+            # A row deleted since it was scored has no payload left.
+            if payloads.get(row) is None:
+                continue
+            nodes.append(metadata_dict_to_node(json.loads(payloads[row])))
+            ids.append(self._node_ids[row])
+            scores.append(float(similarity))
+        return VectorStoreQueryResult(nodes=nodes, similarities=scores, ids=ids)
+
+    def persist(self, persist_path: str = None, fs: Any = None) -> None:
+        # Everything lives under data_dir; persist_path (from StorageContext.persist) is not used.
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            unsaved = self._rows - self._hnsw_saved_rows
+            if self._hnsw is not None and unsaved and unsaved >= max(HNSW_SAVE_MIN_ROWS, self._hnsw_saved_rows // 10):
+                self._save_hnsw()
+
+    def _save_hnsw(self) -> None:
+        path = Path(self.data_dir) / HNSW_NAME
+        tmp_path = path.with_name(f"{HNSW_NAME}.tmp")
+        self._hnsw.save_index(str(tmp_path))
+        os.replace(tmp_path, path)
+        self._set_meta("hnsw_rows", self._rows)
+        self._hnsw_saved_rows = self._rows
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            if self._hnsw is not None and self._rows > self._hnsw_saved_rows:
+                self._save_hnsw()
+            self._conn.close()
@@ -0,0 +1,119 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable, List, Optional
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.llms import ChatMessage
+from llama_index.core.storage.chat_store.base import BaseChatStore
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteChatStore(BaseChatStore):
+    """Chat histories in SQLite, one row per session, so every process serving
+    the app sees the same conversation and it survives a restart.
+
+    A history is bounded by the chat memory's token limit, so it is rewritten
+    as a whole on each change.
+    """
+
+    db_path: str
+
+    _lock: threading.Lock = PrivateAttr()
+    _conn: sqlite3.Connection = PrivateAttr()
+
+    def __init__(self, db_path: str) -> None:
+        super().__init__(db_path=db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chats (
+                key TEXT PRIMARY KEY,
+                messages TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS chats_updated ON chats (updated);
+            """
+        )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "SQLiteChatStore"
+
+    @staticmethod
+    def _dumps(messages: List[ChatMessage]) -> str:
+        return json.dumps([message.model_dump(mode="json") for message in messages])
+
+    @staticmethod
+    def _loads(value: Optional[str]) -> List[ChatMessage]:
+        return [ChatMessage.model_validate(message) for message in json.loads(value)] if value else []
+
+    def _read(self, key: str) -> List[ChatMessage]:
+        row = self._conn.execute("SELECT messages FROM chats WHERE key = ?", (key,)).fetchone()
+        return self._loads(row[0] if row else None)
+
+    def _write(self, key: str, messages: List[ChatMessage]) -> None:
+        if messages:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chats (key, messages, updated) VALUES (?, ?, ?)",
+                (key, self._dumps(messages), time.time()),
+            )
+        else:
+            self._conn.execute("DELETE FROM chats WHERE key = ?", (key,))
+
+    def set_messages(self, key: str, messages: List[ChatMessage]) -> None:
+        with self._lock:
+            self._write(key, messages)
+
+    def get_messages(self, key: str) -> List[ChatMessage]:
+        with self._lock:
+            return self._read(key)
+
+    def add_message(self, key: str, message: ChatMessage) -> None:
+        self._update(key, lambda messages: messages.append(message))
+
+    def delete_messages(self, key: str) -> Optional[List[ChatMessage]]:
+        with self._lock:
+            messages = self._read(key)
+            self._conn.execute("DELETE FROM chats WHERE key = ?", (key,))
+        return messages or None
+
+    def delete_message(self, key: str, idx: int) -> Optional[ChatMessage]:
+        return self._update(key, lambda messages: messages.pop(idx) if 0 <= idx < len(messages) else None)
+
+    def delete_last_message(self, key: str) -> Optional[ChatMessage]:
+        return self._update(key, lambda messages: messages.pop() if messages else None)
+
+    def _update(self, key: str, change: Callable[[List[ChatMessage]], Optional[ChatMessage]]) -> Optional[ChatMessage]:
+        # Read-modify-write in one write transaction, so concurrent turns from other processes are not lost.
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                messages = self._read(key)
+                result = change(messages)
+                self._write(key, messages)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def get_keys(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT key FROM chats")]
+
+    def prune(self, idle_seconds: float) -> int:
+        """Forget histories not updated within idle_seconds; returns how many."""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM chats WHERE updated < ?", (time.time() - idle_seconds,)
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
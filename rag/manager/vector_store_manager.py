@@ -1,37 +1,219 @@
 import typing
-from qdrant_client import QdrantClient
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http import models as rest
+from qdrant_client.local.qdrant_local import QdrantLocal
 from injector import inject, singleton
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
 from llama_index.core.vector_stores.types import VectorStore
 from llama_index.vector_stores.qdrant import QdrantVectorStore
 from llama_index.core.indices.vector_store import VectorIndexRetriever
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.storage.docstore import BaseDocumentStore
 
 from rag.config import Config
+from rag.manager.hybrid_retriever import HybridRetriever
+from rag.manager.sparse_index_manager import SparseIndexManager
+from rag.manager.storage.embedded_vector_store import EmbeddedVectorStore
+
+logger = logging.getLogger(__name__)
+
+# Under LOCAL_DATA_PATH, for VECTOR_STORE_BACKEND = "embedded".
+EMBEDDED_VECTORS_DIR = "vectors"
+
+# Metadata fields the app filters or deletes by; Qdrant recommends a payload index for each.
+PAYLOAD_INDEXES = [
+    {"field_name": "file_name", "field_schema": rest.PayloadSchemaType.KEYWORD},
+    {"field_name": "page", "field_schema": rest.PayloadSchemaType.INTEGER},
+]
+
+
+def quantization_config(config: Config) -> Optional[rest.QuantizationConfig]:
+    if config.QDRANT_QUANTIZATION == "none":
+        return None
+    # Quantized vectors stay in RAM even when the originals are on disk; they are what the
+    # HNSW search touches, the originals are only read to rescore the candidates.
+    if config.QDRANT_QUANTIZATION == "scalar":
+        return rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(type=rest.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if config.QDRANT_QUANTIZATION == "binary":
+        return rest.BinaryQuantization(binary=rest.BinaryQuantizationConfig(always_ram=True))
+    raise ValueError(f"Unknown QDRANT_QUANTIZATION: {config.QDRANT_QUANTIZATION}")
+
+
+def search_params(config: Config) -> Optional[rest.SearchParams]:
+    quantization = None
+    if config.QDRANT_QUANTIZATION != "none":
+        quantization = rest.QuantizationSearchParams(
+            rescore=config.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=config.QDRANT_OVERSAMPLING if config.QDRANT_QUANTIZATION_RESCORE else None,
+        )
+    if not config.QDRANT_HNSW_EF and quantization is None:
+        return None
+    return rest.SearchParams(hnsw_ef=config.QDRANT_HNSW_EF or None, quantization=quantization)
+
+
+class TunedQdrantVectorStore(QdrantVectorStore):
+    """QdrantVectorStore that creates its collection with our vector/HNSW settings and
+    upserts large node lists as parallel batches.
+
+    The vector size is only known from the first embedded node, so the dense vector
+    params are filled in when the collection is created.
+    """
+
+    _on_disk: bool = PrivateAttr(default=False)
+    _hnsw_config: Optional[rest.HnswConfigDiff] = PrivateAttr(default=None)
+    _upsert_concurrency: int = PrivateAttr(default=1)
+
+    def __init__(self, on_disk: bool = False, hnsw_config: Optional[rest.HnswConfigDiff] = None,
+                 upsert_concurrency: int = 1, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._on_disk = on_disk
+        self._hnsw_config = hnsw_config
+        self._upsert_concurrency = max(1, upsert_concurrency)
+
+    def _vector_params(self, vector_size: int) -> rest.VectorParams:
+        return rest.VectorParams(
+            size=vector_size,
+            distance=rest.Distance.COSINE,
+            on_disk=self._on_disk,
+            hnsw_config=self._hnsw_config,
+        )
+
+    def _create_collection(self, collection_name: str, vector_size: int) -> None:
+        self._dense_config = self._dense_config or self._vector_params(vector_size)
+        super()._create_collection(collection_name, vector_size)
+
+    async def _acreate_collection(self, collection_name: str, vector_size: int) -> None:
+        self._dense_config = self._dense_config or self._vector_params(vector_size)
+        await super()._acreate_collection(collection_name, vector_size)
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if self._upsert_concurrency == 1 or len(nodes) <= self.batch_size:
+            return super().add(nodes, **add_kwargs)
+        batches = [nodes[i:i + self.batch_size] for i in range(0, len(nodes), self.batch_size)]
+        # The first batch creates the collection if it does not exist yet.
+        ids = super().add(batches[0], **add_kwargs)
+        with ThreadPoolExecutor(max_workers=min(self._upsert_concurrency, len(batches) - 1)) as executor:
+            for batch_ids in executor.map(lambda batch: QdrantVectorStore.add(self, batch, **add_kwargs), batches[1:]):
+                ids.extend(batch_ids)
+        return ids
+
 
 @singleton
 class VectorStoreManager:
     
     @inject
     def __init__(self, config: Config):
+        self.config = config
+        self.client, self.aclient = None, None
+        self.search_params = None
+        if config.VECTOR_STORE_BACKEND == "embedded":
+            self.vector_store = EmbeddedVectorStore(
+                data_dir=str(Path(config.LOCAL_DATA_PATH) / EMBEDDED_VECTORS_DIR),
+                use_hnsw=config.EMBEDDED_HNSW,
+                hnsw_m=config.EMBEDDED_HNSW_M,
+                hnsw_ef_construct=config.EMBEDDED_HNSW_EF_CONSTRUCT,
+                hnsw_ef=config.EMBEDDED_HNSW_EF,
+            )
+        elif config.VECTOR_STORE_BACKEND == "qdrant":
+            self.search_params = search_params(config)
+            self.vector_store = self._create_qdrant_store(config)
+        else:
+            raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {config.VECTOR_STORE_BACKEND}")
+
+    def _create_qdrant_store(self, config: Config) -> VectorStore:
         try:
-            client = QdrantClient(url="http://localhost:6333")
-            self.vector_store = typing.cast(
+            self.client, self.aclient = self._create_clients(config)
+            self._update_collection(config)
+            # The embedded (":memory:" or path) client is not thread-safe.
+            local = isinstance(getattr(self.client, "_client", None), QdrantLocal)
+            return typing.cast(
                 VectorStore,
-                QdrantVectorStore(
-                    client=client,
+                TunedQdrantVectorStore(
+                    client=self.client,
+                    aclient=self.aclient,
                     collection_name=config.QDRANT_COLLECTION,
+                    batch_size=config.UPSERT_BATCH_SIZE,
+                    quantization_config=quantization_config(config),
+                    payload_indexes=PAYLOAD_INDEXES,
+                    on_disk=config.QDRANT_ON_DISK,
+                    hnsw_config=rest.HnswConfigDiff(m=config.QDRANT_HNSW_M, ef_construct=config.QDRANT_HNSW_EF_CONSTRUCT),
+                    upsert_concurrency=1 if local else config.QDRANT_UPSERT_CONCURRENCY,
                 ),
             )
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Qdrant: {str(e)}")
 
-    def get_retriever(self, index, similarity_top_k: int = 5) -> VectorIndexRetriever:
+    def _create_clients(self, config: Config) -> Tuple[QdrantClient, Optional[AsyncQdrantClient]]:
+        client_kwargs = dict(
+            host=config.QDRANT_HOST,
+            port=config.QDRANT_PORT,
+            grpc_port=config.QDRANT_GRPC_PORT,
+            prefer_grpc=config.QDRANT_GRPC,
+        )
+        client = QdrantClient(**client_kwargs)
+        # Used by the async retrieval path (VectorStoreIndex.aquery / achat).
+        aclient = AsyncQdrantClient(**client_kwargs)
+        return client, aclient
+
+    def _update_collection(self, config: Config) -> None:
+        """Bring an existing collection in line with Config; new ones are created with it."""
+        if not self.client.collection_exists(config.QDRANT_COLLECTION):
+            return
+        current = self.client.get_collection(config.QDRANT_COLLECTION).config
+        vectors = current.params.vectors
+        if not isinstance(vectors, rest.VectorParams):
+            # Named vectors (e.g. a collection created with hybrid search) are left alone.
+            return
+        hnsw = current.hnsw_config
+        quantization = quantization_config(config)
+        changes = {}
+        if (hnsw.m, hnsw.ef_construct) != (config.QDRANT_HNSW_M, config.QDRANT_HNSW_EF_CONSTRUCT):
+            changes["hnsw_config"] = rest.HnswConfigDiff(m=config.QDRANT_HNSW_M, ef_construct=config.QDRANT_HNSW_EF_CONSTRUCT)
+        if type(current.quantization_config) is not type(quantization):
+            changes["quantization_config"] = quantization or rest.Disabled.DISABLED
+        if bool(vectors.on_disk) != config.QDRANT_ON_DISK:
+            changes["vectors_config"] = {"": rest.VectorParamsDiff(on_disk=config.QDRANT_ON_DISK)}
+        if changes:
+            # Qdrant rebuilds the affected segments in the background.
+            logger.info(f"Updating {config.QDRANT_COLLECTION}: {', '.join(changes)}")
+            self.client.update_collection(config.QDRANT_COLLECTION, **changes)
+
+    def get_retriever(self, index, similarity_top_k: int = 5,
+                      sparse_index: Optional[SparseIndexManager] = None,
+                      docstore: Optional[BaseDocumentStore] = None) -> BaseRetriever:
         if not index:
             raise ValueError("Index cannot be None")
-        return VectorIndexRetriever(
+        retriever = VectorIndexRetriever(
             index=index,
             similarity_top_k=similarity_top_k,
+            vector_store_kwargs={"search_params": self.search_params} if self.search_params else {},
+        )
+        if self.config.RETRIEVAL_MODE == "dense":
+            return retriever
+        if self.config.RETRIEVAL_MODE != "hybrid":
+            raise ValueError(f"Unknown RETRIEVAL_MODE: {self.config.RETRIEVAL_MODE}")
+        if sparse_index is None or docstore is None:
+            raise ValueError("Hybrid retrieval needs a sparse index and the docstore")
+        # Not index.docstore: an index built from_vector_store has an empty one of its own.
+        return HybridRetriever(
+            dense_retriever=retriever,
+            sparse_index=sparse_index,
+            docstore=docstore,
+            similarity_top_k=similarity_top_k,
+            sparse_top_k=self.config.SPARSE_TOP_K,
+            rrf_k=self.config.RRF_K,
+            similarity_cutoff=self.config.SIMILARITY_CUTTOFF,
         )
 
     def close(self) -> None:
-        if hasattr(self, 'client'):
+        if isinstance(self.vector_store, EmbeddedVectorStore):
+            self.vector_store.close()
+        elif self.client is not None:
             self.client.close()
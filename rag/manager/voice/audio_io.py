@@ -0,0 +1,71 @@
+import io
+import wave
+from typing import BinaryIO, Iterator, Tuple, Union
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int = SAMPLE_RATE) -> np.ndarray:
+    """Linear-interpolation resampling; good enough for speech going into Whisper."""
+    audio = np.asarray(audio, dtype=np.float32)
+    if orig_sr == target_sr or audio.size == 0:
+        return audio
+    duration = audio.size / orig_sr
+    target = np.linspace(0.0, duration, int(round(duration * target_sr)), endpoint=False)
+    source = np.arange(audio.size) / orig_sr
+    return np.interp(target, source, audio).astype(np.float32)
+
+
+def to_float_mono(audio: np.ndarray) -> np.ndarray:
+    """Integer PCM or float audio, mono or (samples, channels), to float32 mono in [-1, 1]."""
+    audio = np.asarray(audio)
+    if np.issubdtype(audio.dtype, np.integer):
+        info = np.iinfo(audio.dtype)
+        # Unsigned PCM (8-bit WAV) is centred on the middle of its range.
+        offset = (info.max + 1) / 2 if info.min == 0 else 0.0
+        audio = (audio.astype(np.float32) - offset) / max(abs(info.min), info.max - offset)
+    audio = audio.astype(np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    return audio
+
+
+def read_wav(source: Union[str, BinaryIO]) -> Tuple[np.ndarray, int]:
+    """A PCM WAV file (path or file object) as float32 mono, and its sample rate."""
+    with wave.open(source, "rb") as wav:
+        dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[wav.getsampwidth()]
+        frames = np.frombuffer(wav.readframes(wav.getnframes()), dtype=dtype)
+        return to_float_mono(frames.reshape(-1, wav.getnchannels())), wav.getframerate()
+
+
+def wav_bytes(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Float audio in [-1, 1] as a 16-bit mono PCM WAV file."""
+    pcm = (np.clip(np.asarray(audio, dtype=np.float32), -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def wav_chunks(path: str, chunk_ms: int = 30, sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Yield a PCM WAV file as float32 mono chunks, like a microphone would deliver them."""
+    audio, file_rate = read_wav(path)
+    audio = resample(audio, file_rate, sample_rate)
+    chunk_size = int(sample_rate * chunk_ms / 1000)
+    for start in range(0, audio.size, chunk_size):
+        yield audio[start:start + chunk_size]
+
+
+def microphone_chunks(chunk_ms: int = 30, sample_rate: int = SAMPLE_RATE) -> Iterator[np.ndarray]:
+    """Yield microphone audio until the generator is closed."""
+    import sounddevice as sd
+
+    block_size = int(sample_rate * chunk_ms / 1000)
+    with sd.InputStream(samplerate=sample_rate, channels=1, dtype="float32", blocksize=block_size) as stream:
+        while True:
+            block, _ = stream.read(block_size)
+            yield block[:, 0].copy()
@@ -0,0 +1,35 @@
+import re
+from typing import List
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+class SentenceSplitter:
+    """Cuts a token stream into sentences as soon as each one is complete.
+
+    Sentences shorter than min_chars are joined with the next one, so
+    abbreviations and list markers do not become separate TTS calls.
+    """
+
+    def __init__(self, min_chars: int = 20) -> None:
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        parts = SENTENCE_BOUNDARY.split(self._buffer)
+        # The last part has no boundary after it yet.
+        self._buffer = parts.pop()
+        sentences, pending = [], ""
+        for part in parts:
+            pending = f"{pending} {part.strip()}".strip()
+            if len(pending) >= self.min_chars:
+                sentences.append(pending)
+                pending = ""
+        if pending:
+            self._buffer = f"{pending} {self._buffer}"
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest, self._buffer = self._buffer.strip(), ""
+        return [rest] if rest else []
@@ -1,7 +1,9 @@
 import logging
+import threading
 from injector import inject, singleton
-import torch
-from transformers import AutoTokenizer, AutoModelForTextToSpeech
+
+from rag import telemetry
+from rag.startup import timed
 
 logger = logging.getLogger(__name__)
 
@@ -9,26 +11,46 @@ logger = logging.getLogger(__name__)
 class TextToVoiceManager:
     @inject
     def __init__(self, config) -> None:
-        try:
-            self.tokenizer, self.model = self.load_model(config.TTS_MODEL_PATH)
-        except Exception as e:
-            logger.debug(f"Could not load the model! {e}")
-            self.tokenizer, self.model = None, None
+        # The model (and torch) is loaded on first use or by warm_up(), not at startup.
+        self.model_path = config.TTS_MODEL_PATH
+        self.tokenizer, self.model = None, None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        # One synthesis at a time: parallel generate calls only fight over the same CPU cores.
+        self._generate_lock = threading.Lock()
 
     @staticmethod
     def load_model(model_path):
+        from transformers import AutoTokenizer, AutoModelForTextToSpeech
         tokenizer = AutoTokenizer.from_pretrained(model_path)
         model = AutoModelForTextToSpeech.from_pretrained(model_path)
+        model.eval()
         return tokenizer, model
 
+    def _ensure_loaded(self) -> bool:
+        if self.model is not None or self._load_failed:
+            return self.model is not None
+        with self._load_lock:
+            if self.model is None and not self._load_failed:
+                try:
+                    with timed("text to voice model"):
+                        self.tokenizer, self.model = self.load_model(self.model_path)
+                except Exception as e:
+                    logger.debug(f"Could not load the model! {e}")
+                    self._load_failed = True
+        return self.model is not None
+
+    def warm_up(self) -> None:
+        self._ensure_loaded()
+
     def text_to_speech(self, text):
-        if self.tokenizer is None or self.model is None:
+        if not self._ensure_loaded():
             logger.error("Model not loaded. Cannot convert text to speech.")
             return None
+        import torch
 
         inputs = self.tokenizer(text, return_tensors="pt")
-        self.model.eval()
-        with torch.no_grad():
+        with telemetry.span("tts"), self._generate_lock, torch.no_grad():
             speech = self.model.generate_speech(inputs["input_ids"], self.tokenizer)
 
-        return speech.numpy()
\ No newline at end of file
+        return speech.numpy()
@@ -0,0 +1,110 @@
+import logging
+from collections import deque
+from typing import Deque, List, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Events returned by EnergyVAD.feed / flush.
+SEGMENT = "segment"  # a short pause: this audio can be transcribed while the user keeps talking
+END = "end"  # end of the utterance: the remaining audio, possibly empty
+
+
+class EnergyVAD:
+    """Frame-energy voice activity detector for 16 kHz mono float audio.
+
+    A frame is speech when its RMS exceeds both a fixed floor and a multiple of
+    the running noise level. A short pause closes a segment, a long pause (or
+    max_utterance_s of audio) closes the utterance.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 30,
+        energy_threshold: float = 0.01,
+        noise_ratio: float = 3.0,
+        segment_silence_ms: int = 300,
+        end_silence_ms: int = 800,
+        max_utterance_s: float = 15.0,
+        pre_roll_ms: int = 150,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.segment_silence_frames = max(1, segment_silence_ms // frame_ms)
+        self.end_silence_frames = max(self.segment_silence_frames, end_silence_ms // frame_ms)
+        self.max_utterance_frames = int(max_utterance_s * 1000 / frame_ms)
+        self._pre_roll: Deque[np.ndarray] = deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._noise_level = energy_threshold / noise_ratio
+        self.reset()
+
+    def reset(self) -> None:
+        self._segment: List[np.ndarray] = []
+        self._segment_has_speech = False
+        self._in_utterance = False
+        self._silent_frames = 0
+        self._utterance_frames = 0
+        self._pre_roll.clear()
+
+    def _is_speech(self, frame: np.ndarray) -> bool:
+        rms = float(np.sqrt(np.mean(frame * frame)))
+        speech = rms > max(self.energy_threshold, self._noise_level * self.noise_ratio)
+        if not speech:
+            self._noise_level = 0.95 * self._noise_level + 0.05 * rms
+        return speech
+
+    def _take_segment(self) -> np.ndarray:
+        # Trailing silence after the last segment is dropped: Whisper tends to hallucinate on it.
+        has_speech = self._segment_has_speech and self._segment
+        audio = np.concatenate(self._segment) if has_speech else np.zeros(0, dtype=np.float32)
+        self._segment = []
+        self._segment_has_speech = False
+        return audio
+
+    def feed(self, chunk: np.ndarray) -> List[Tuple[str, np.ndarray]]:
+        audio = np.concatenate([self._pending, np.asarray(chunk, dtype=np.float32).reshape(-1)])
+        usable = len(audio) - len(audio) % self.frame_size
+        self._pending = audio[usable:]
+        events = []
+        for start in range(0, usable, self.frame_size):
+            frame = audio[start:start + self.frame_size]
+            speech = self._is_speech(frame)
+            if not self._in_utterance:
+                if not speech:
+                    self._pre_roll.append(frame)
+                    continue
+                # Keep a little audio from before the onset so the first phoneme is not clipped.
+                self._in_utterance = True
+                self._segment.extend(self._pre_roll)
+                self._pre_roll.clear()
+
+            self._segment.append(frame)
+            self._utterance_frames += 1
+            if speech:
+                self._segment_has_speech = True
+                self._silent_frames = 0
+                if self._utterance_frames < self.max_utterance_frames:
+                    continue
+            else:
+                self._silent_frames += 1
+
+            if self._silent_frames >= self.end_silence_frames or self._utterance_frames >= self.max_utterance_frames:
+                events.append((END, self._take_segment()))
+                self.reset()
+            elif self._silent_frames == self.segment_silence_frames and self._segment_has_speech:
+                events.append((SEGMENT, self._take_segment()))
+        return events
+
+    def flush(self) -> List[Tuple[str, np.ndarray]]:
+        """End of input: close the utterance if one is open."""
+        if not self._in_utterance:
+            return []
+        if self._pending.size:
+            self._segment.append(self._pending)
+            self._pending = np.zeros(0, dtype=np.float32)
+        audio = self._take_segment()
+        self.reset()
+        return [(END, audio)]
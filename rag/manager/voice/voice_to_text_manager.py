@@ -1,34 +1,117 @@
-import torch
+import time
+import queue
 import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+import numpy as np
 from injector import inject, singleton
-from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
+
+from rag import telemetry
+from rag.startup import timed
 
 logger = logging.getLogger(__name__)
 
 @singleton
 class VoiceToTextManager:
+    """Whisper behind a single bounded worker thread.
+
+    Concurrent transcriptions are queued and run in batches of up to
+    WHISPER_BATCH_SIZE, so users share one model instead of racing on it.
+    """
+
     @inject
     def __init__(self, config) -> None:
-        try:
-            self.processor, self.model = self.load_model(config.AUDIO_MODEL_PATH)
-        except Exception as e:
-            logger.debug(f"Could not load the model! {e}")
-            self.processor, self.model = None, None
+        # The model (and torch) is loaded on first use or by warm_up(), not at startup.
+        self.model_path = config.AUDIO_MODEL_PATH
+        self.quantize = config.WHISPER_QUANTIZE
+        self.batch_size = max(1, config.WHISPER_BATCH_SIZE)
+        self.batch_wait = config.WHISPER_BATCH_WAIT_MS / 1000.0
+        self.processor, self.model = None, None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        self._requests: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue(maxsize=config.WHISPER_QUEUE_SIZE)
+        self._worker: Optional[threading.Thread] = None
 
     @staticmethod
-    def load_model(model_path):
+    def load_model(model_path, quantize=False):
+        import torch
+        from transformers import AutoProcessor, AutoModelForSpeechSeq2Seq
         processor = AutoProcessor.from_pretrained(model_path)
         model = AutoModelForSpeechSeq2Seq.from_pretrained(model_path)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
         return processor, model
 
+    def _ensure_loaded(self) -> bool:
+        if self.model is not None or self._load_failed:
+            return self.model is not None
+        with self._load_lock:
+            if self.model is None and not self._load_failed:
+                try:
+                    with timed("voice to text model"):
+                        self.processor, self.model = self.load_model(self.model_path, self.quantize)
+                    self._worker = threading.Thread(target=self._run, name="whisper", daemon=True)
+                    self._worker.start()
+                except Exception as e:
+                    logger.debug(f"Could not load the model! {e}")
+                    self._load_failed = True
+        return self.model is not None
+
+    def warm_up(self) -> None:
+        self._ensure_loaded()
+
     def transcribe_audio(self, audio_input):
-        if self.processor is None or self.model is None:
+        """Transcribe 16 kHz mono float audio; blocks until the worker has run its batch."""
+        if not self._ensure_loaded():
             logger.error("Model not loaded. Cannot transcribe audio.")
             return None
+        future: Future = Future()
+        try:
+            self._requests.put_nowait((np.asarray(audio_input, dtype=np.float32), future))
+        except queue.Full:
+            logger.error(f"Transcription queue is full ({self._requests.maxsize} waiting).")
+            return None
+        try:
+            with telemetry.span("asr"):
+                return future.result()
+        except Exception as e:
+            logger.error(f"Transcription failed: {e}")
+            return None
 
-        input_features = self.processor(audio_input, sampling_rate=16000, return_tensors="pt").input_features
-        self.model.eval()
-        with torch.no_grad():
-            predicted_ids = self.model.generate(inputs=input_features)
-        transcription = self.processor.batch_decode(predicted_ids, skip_special_tokens=True)[0]
-        return transcription
\ No newline at end of file
+    def _run(self) -> None:
+        while True:
+            batch = [self._requests.get()]
+            # Give concurrent requests a moment to join this batch.
+            deadline = time.perf_counter() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._transcribe_batch(batch)
+
+    def _transcribe_batch(self, batch: List[Tuple[np.ndarray, Future]]) -> None:
+        import torch
+
+        start = time.perf_counter()
+        try:
+            with telemetry.span("asr_batch"):
+                input_features = self.processor(
+                    [audio for audio, _ in batch], sampling_rate=16000, return_tensors="pt"
+                ).input_features
+                with torch.no_grad():
+                    predicted_ids = self.model.generate(inputs=input_features)
+                transcriptions = self.processor.batch_decode(predicted_ids, skip_special_tokens=True)
+            telemetry.count("rag_transcriptions_total", len(batch))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), transcription in zip(batch, transcriptions):
+            future.set_result(transcription)
+        logger.debug(f"Transcribed a batch of {len(batch)} in {(time.perf_counter() - start) * 1000:.0f}ms")
@@ -1,19 +1,40 @@
-from typing import List
+import time
+import asyncio
+import logging
+import threading
+from typing import AsyncGenerator, Generator, List, Optional
 from injector import inject, singleton
-from llama_index.core.chat_engine import ContextChatEngine
-from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.indices.vector_store import VectorStoreIndex
 from llama_index.core.postprocessor import SimilarityPostprocessor
-from llama_index.core.indices.postprocessor import MetadataReplacementPostProcessor
-from llama_index.core import get_response_synthesizer
 from llama_index.core.schema import NodeWithScore
+from llama_index.core.memory import ChatMemoryBuffer
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.utils import get_tokenizer
 
+from rag.manager.chat_engine import StreamingContextChatEngine
 from rag.manager.llm_manager import LLMManager
 from rag.manager.embed_manager import EmbeddingManager
 from rag.manager.vector_store_manager import VectorStoreManager
 from rag.manager.node_manager import NodeManager
+from rag.manager.session_manager import DEFAULT_SESSION_ID, ChatSession, SessionManager
+from rag.manager.response_cache import ResponseCache
+from rag.manager.sparse_index_manager import SparseIndexManager
+from rag.manager.rerank_manager import CrossEncoderRerank, RerankManager
+from rag.manager.context_packer import ContextPacker
+from rag.services.request_queue import QueueFullError, RequestQueue
 from llama_index.core.storage import StorageContext
 from rag.config import Config
+from rag import telemetry
+
+logger = logging.getLogger(__name__)
+
+EMPTY_RESPONSE_MESSAGE = "I apologize, but I couldn't generate a response based on the retrieved information. This might be due to insufficient or irrelevant context. Could you please rephrase your question or ask about a different topic?"
+ERROR_RESPONSE_MESSAGE = "I apologize, but an error occurred while processing your request. Please try again or contact support if the issue persists."
+BUSY_RESPONSE_MESSAGE = "The assistant is busy answering other questions right now. Please try again in a moment."
+# Raised when the LLM request queue is full or a request waited too long for a slot.
+QUEUE_ERRORS = (QueueFullError, asyncio.TimeoutError, TimeoutError)
+# Room kept in the context window for the answer when sizing the retrieved context.
+ANSWER_TOKEN_RESERVE = 512
 
 @singleton
 class ChatService:
@@ -24,9 +45,17 @@ class ChatService:
         llm_component: LLMManager,
         vector_store_component: VectorStoreManager,
         embedding_component: EmbeddingManager,
-        node_store_component: NodeManager
+        node_store_component: NodeManager,
+        session_manager: SessionManager,
+        request_queue: RequestQueue,
+        response_cache: ResponseCache,
+        sparse_index: SparseIndexManager,
+        rerank_manager: RerankManager,
         ):
         self.config = config
+        self.response_cache = response_cache
+        self.session_manager = session_manager
+        self.request_queue = request_queue
         self.llm = llm_component
         self.embedding_component = embedding_component
         self.vector_store_component = vector_store_component
@@ -42,62 +71,332 @@ class ChatService:
             embed_model=embedding_component.embedding_model,
             show_progress=True,
         )
-
-    def _setup_chat_engine(self, system_prompt) -> ContextChatEngine:
-        vector_index_retriever = self.vector_store_component.get_retriever(
+        # Shared by every session; each session only adds its own engine and memory.
+        self._retriever = self.vector_store_component.get_retriever(
             index=self.index,
             similarity_top_k=self.config.SIMILARITY_TOP_K,
+            sparse_index=sparse_index,
+            docstore=node_store_component.doc_store,
         )
-        node_postprocessors = [
-            MetadataReplacementPostProcessor(target_metadata_key="window"),
+        self._node_postprocessors = [
             SimilarityPostprocessor(
                 similarity_cutoff=self.config.SIMILARITY_CUTTOFF,
             ),
         ]
-        
-        response_synthesizer = get_response_synthesizer(
-            response_mode="compact",
+        if self.config.RERANK_ENABLED:
+            # Runs after the cutoff: it replaces similarity scores with cross-encoder scores.
+            self._node_postprocessors.append(
+                CrossEncoderRerank(
+                    rerank_manager,
+                    top_n=self.config.RERANK_TOP_K,
+                    latency_budget_ms=self.config.RERANK_LATENCY_BUDGET_MS,
+                )
+            )
+        if self.config.CONTEXT_PACKING_ENABLED:
+            # Last, so the budget applies to exactly what goes into the prompt.
+            self._node_postprocessors.append(
+                ContextPacker(
+                    token_budget=self._context_token_budget(),
+                    dedup_threshold=self.config.CONTEXT_DEDUP_THRESHOLD,
+                )
+            )
+        self._node_postprocessors = telemetry.trace_postprocessors(self._node_postprocessors)
+        telemetry.gauge("rag_llm_queue", request_queue.stats)
+        telemetry.gauge("rag_response_cache", response_cache.stats)
+        telemetry.gauge("rag_embedding_cache", embedding_component.cache_stats)
+        telemetry.gauge("rag_query_embedding_batches", embedding_component.batch_stats)
+        telemetry.gauge("rag_sessions", lambda: {"active": len(session_manager)})
+
+    def _context_token_budget(self) -> int:
+        if self.config.CONTEXT_TOKEN_BUDGET > 0:
+            return self.config.CONTEXT_TOKEN_BUDGET
+        prompt_tokens = len(get_tokenizer()(self.llm.prompt_prefix))
+        budget = (self.config.LLM_CONTEXT_WINDOW - self.config.CHAT_MEMORY_TOKEN_LIMIT
+                  - prompt_tokens - ANSWER_TOKEN_RESERVE)
+        if budget < 256:
+            logger.warning(f"LLM_CONTEXT_WINDOW leaves only {budget} tokens for retrieved context; using 256")
+        return max(256, budget)
+
+    def _setup_chat_engine(self, memory: ChatMemoryBuffer) -> StreamingContextChatEngine:
+        # The system prompt is part of the context template, ahead of the retrieved context,
+        # so every prompt starts with the same prefix. The engine builds its own compact-and-refine
+        # synthesizer around the chat history on every turn.
+        return StreamingContextChatEngine.from_defaults(
+            context_template=self.llm.context_template,
+            retriever=self._retriever,
             llm=self.llm.llm,
+            memory=memory,
+            node_postprocessors=self._node_postprocessors,
         )
-        
-        return ContextChatEngine.from_defaults(
-            system_prompt=system_prompt,
-            retriever=vector_index_retriever,
+
+    def _create_session_engine(self, session_id: str):
+        memory = ChatMemoryBuffer.from_defaults(
+            token_limit=self.config.CHAT_MEMORY_TOKEN_LIMIT,
             llm=self.llm.llm,
-            node_postprocessors=node_postprocessors,
-            response_synthesizer=response_synthesizer,
-            verbose=True,
-        )
-    
-    def chat(self, message: str) -> str:
-        system_prompt = """
-            You are an AI assistant designed to provide accurate and concise answers based on retrieved bank documents.
-            """
-        chat_engine = self._setup_chat_engine(
-            system_prompt=system_prompt,
+            chat_store=self.session_manager.chat_store,
+            chat_store_key=session_id,
         )
+        return self._setup_chat_engine(memory=memory), memory
+
+    def _get_session(self, session_id: str) -> ChatSession:
+        return self.session_manager.get_or_create(session_id, lambda: self._create_session_engine(session_id))
+
+    @staticmethod
+    def _truncate_history(session: ChatSession) -> None:
+        # ChatMemoryBuffer only truncates on read; drop what it would never return.
+        session.memory.set(session.memory.get())
+
+    @telemetry.traced("chat", mode="sync")
+    def chat(self, message: str, session_id: str = DEFAULT_SESSION_ID) -> str:
+        telemetry.annotate(session_id=session_id)
+        session = self._get_session(session_id)
+        try:
+            with session.lock:
+                query_embedding = self._get_query_embedding(session, message)
+                cached = self._get_cached_response(session, message, query_embedding)
+                if cached is not None:
+                    return cached
+                with self.request_queue.sync_slot():
+                    # ContextChatEngine retrieves once and hands the same nodes to synthesis.
+                    wrapped_response = session.chat_engine.chat(message)
+                    self._truncate_history(session)
+            self._cache_response(message, query_embedding, wrapped_response.response, wrapped_response.source_nodes)
+            return self._handle_response(wrapped_response)
+        except QUEUE_ERRORS as e:
+            logger.warning(f"Rejected chat request: {e}")
+            telemetry.annotate(status="rejected")
+            return BUSY_RESPONSE_MESSAGE
+        except Exception as e:
+            logger.exception(f"Error occurred: {str(e)}")
+            telemetry.annotate(status="error")
+            return ERROR_RESPONSE_MESSAGE
+
+    @telemetry.traced("chat", mode="async")
+    async def achat(self, message: str, session_id: str = DEFAULT_SESSION_ID) -> str:
+        telemetry.annotate(session_id=session_id)
+        session = self._get_session(session_id)
         try:
-            # Retrieve nodes
-            retriever = chat_engine._retriever
-            retrieved_nodes = retriever.retrieve(message)
-            
-            print(f"Retrieved {len(retrieved_nodes)} nodes")
-            for i, node in enumerate(retrieved_nodes):
-                print(f"Node {i + 1}:")
-                print(f"  Content: {node.node.get_content()[:100]}...")
-                print(f"  Score: {node.score}")
-
-            # Generate response
-            wrapped_response = chat_engine.chat(message)
-            
-            print(f"Raw response: {wrapped_response}")
-            print(f"Response content: {wrapped_response.response}")
-            
-            if not wrapped_response.response:
-                print("Empty response received from ContextChatEngine")
-                return "I apologize, but I couldn't generate a response based on the retrieved information. This might be due to insufficient or irrelevant context. Could you please rephrase your question or ask about a different topic?"
-            
-            return wrapped_response.response
+            async with session.async_lock():
+                query_embedding = await self._aget_query_embedding(session, message)
+                cached = self._get_cached_response(session, message, query_embedding)
+                if cached is not None:
+                    return cached
+                async with self.request_queue.slot():
+                    wrapped_response = await session.chat_engine.achat(message)
+                    self._truncate_history(session)
+            self._cache_response(message, query_embedding, wrapped_response.response, wrapped_response.source_nodes)
+            return self._handle_response(wrapped_response)
+        except QUEUE_ERRORS as e:
+            logger.warning(f"Rejected chat request: {e}")
+            telemetry.annotate(status="rejected")
+            return BUSY_RESPONSE_MESSAGE
         except Exception as e:
-            print(f"Error occurred: {str(e)}")
-            return "I apologize, but an error occurred while processing your request. Please try again or contact support if the issue persists."
\ No newline at end of file
+            logger.exception(f"Error occurred: {str(e)}")
+            telemetry.annotate(status="error")
+            return ERROR_RESPONSE_MESSAGE
+
+    def _uses_response_cache(self, session: ChatSession) -> bool:
+        # Cached answers are shared by every session and keyed on the message alone, so only
+        # a conversation's first question qualifies: a follow-up ("and the second one?")
+        # means something different in each conversation.
+        return self.response_cache.enabled and not session.memory.get_all()
+
+    def _get_query_embedding(self, session: ChatSession, message: str) -> Optional[List[float]]:
+        """The key for the response cache, or None when this message bypasses it."""
+        if not self._uses_response_cache(session):
+            return None
+        # Served from the embedding cache when the retriever embeds the same query.
+        return self.embedding_component.embedding_model.get_query_embedding(message)
+
+    async def _aget_query_embedding(self, session: ChatSession, message: str) -> Optional[List[float]]:
+        if not self._uses_response_cache(session):
+            return None
+        return await self.embedding_component.embedding_model.aget_query_embedding(message)
+
+    def _get_cached_response(self, session: ChatSession, message: str,
+                             query_embedding: Optional[List[float]]) -> Optional[str]:
+        if query_embedding is None:
+            return None
+        entry = self.response_cache.lookup(query_embedding)
+        if entry is None:
+            return None
+        # Keep the conversation consistent as if the engine had answered.
+        session.memory.put(ChatMessage(role=MessageRole.USER, content=message))
+        session.memory.put(ChatMessage(role=MessageRole.ASSISTANT, content=entry.response))
+        self._truncate_history(session)
+        logger.info("Answered from the response cache")
+        telemetry.annotate(status="cached")
+        return entry.response
+
+    def _cache_response(self, message: str, query_embedding: Optional[List[float]], response: Optional[str],
+                        source_nodes: List[NodeWithScore]) -> None:
+        if query_embedding is not None and response:
+            self.response_cache.put(message, query_embedding, response, source_nodes)
+
+    def _handle_response(self, wrapped_response) -> str:
+        self._log_source_nodes(wrapped_response.source_nodes)
+        logger.debug(f"Response content: {wrapped_response.response}")
+        if not wrapped_response.response:
+            logger.warning("Empty response received from ContextChatEngine")
+            telemetry.annotate(status="empty")
+            return EMPTY_RESPONSE_MESSAGE
+        return wrapped_response.response
+
+    @telemetry.traced("chat", mode="stream")
+    def stream_chat(
+        self,
+        message: str,
+        session_id: str = DEFAULT_SESSION_ID,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Generator[str, None, None]:
+        """Yield the answer token by token. Closing the generator or setting cancel_event stops generation.
+
+        The turn is added to the session's history only once the answer is complete.
+        """
+        telemetry.annotate(session_id=session_id)
+        session = self._get_session(session_id)
+        start = time.perf_counter()
+        first_token_at = None
+        token_count = 0
+        with session.lock:
+            try:
+                query_embedding = self._get_query_embedding(session, message)
+                cached = self._get_cached_response(session, message, query_embedding)
+                if cached is None:
+                    self.request_queue.acquire()
+            except QUEUE_ERRORS as e:
+                logger.warning(f"Rejected chat request: {e}")
+                telemetry.annotate(status="rejected")
+                yield BUSY_RESPONSE_MESSAGE
+                return
+            except Exception as e:
+                logger.exception(f"Error occurred: {str(e)}")
+                telemetry.annotate(status="error")
+                yield ERROR_RESPONSE_MESSAGE
+                return
+            if cached is not None:
+                yield cached
+                return
+            try:
+                source_nodes, response_gen = session.chat_engine.stream_turn(message)
+                self._log_source_nodes(source_nodes)
+                cancelled = False
+                response = ""
+                try:
+                    for token in response_gen:
+                        if cancel_event is not None and cancel_event.is_set():
+                            logger.info(f"Streaming chat cancelled for session {session_id}")
+                            cancelled = True
+                            break
+                        if not token:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            telemetry.record("first_token", first_token_at - start)
+                        token_count += 1
+                        response += token
+                        yield token
+                finally:
+                    # Closes the LLM stream, which ends the Ollama request, when the caller
+                    # goes away or cancels.
+                    response_gen.close()
+                if token_count == 0 and not cancelled:
+                    logger.warning("Empty response received from ContextChatEngine")
+                    yield EMPTY_RESPONSE_MESSAGE
+                elif not cancelled:
+                    session.chat_engine.record_turn(message, response)
+                    self._cache_response(message, query_embedding, response, source_nodes)
+            except Exception as e:
+                logger.exception(f"Error occurred: {str(e)}")
+                telemetry.annotate(status="error")
+                yield ERROR_RESPONSE_MESSAGE
+            finally:
+                self.request_queue.release()
+                self._truncate_history(session)
+                self._log_stream_metrics(start, first_token_at, token_count)
+
+    @telemetry.traced("chat", mode="async_stream")
+    async def astream_chat(
+        self,
+        message: str,
+        session_id: str = DEFAULT_SESSION_ID,
+    ) -> AsyncGenerator[str, None]:
+        """Async counterpart of stream_chat; cancelling the consuming task stops generation."""
+        telemetry.annotate(session_id=session_id)
+        session = self._get_session(session_id)
+        start = time.perf_counter()
+        first_token_at = None
+        token_count = 0
+        async with session.async_lock():
+            try:
+                query_embedding = await self._aget_query_embedding(session, message)
+                cached = self._get_cached_response(session, message, query_embedding)
+                if cached is None:
+                    await self.request_queue.aacquire()
+            except QUEUE_ERRORS as e:
+                logger.warning(f"Rejected chat request: {e}")
+                telemetry.annotate(status="rejected")
+                yield BUSY_RESPONSE_MESSAGE
+                return
+            except Exception as e:
+                logger.exception(f"Error occurred: {str(e)}")
+                telemetry.annotate(status="error")
+                yield ERROR_RESPONSE_MESSAGE
+                return
+            if cached is not None:
+                yield cached
+                return
+            try:
+                source_nodes, response_gen = await session.chat_engine.astream_turn(message)
+                self._log_source_nodes(source_nodes)
+                response = ""
+                try:
+                    async for token in response_gen:
+                        if not token:
+                            continue
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            telemetry.record("first_token", first_token_at - start)
+                        token_count += 1
+                        response += token
+                        yield token
+                finally:
+                    await response_gen.aclose()
+                if token_count == 0:
+                    logger.warning("Empty response received from ContextChatEngine")
+                    yield EMPTY_RESPONSE_MESSAGE
+                else:
+                    session.chat_engine.record_turn(message, response)
+                    self._cache_response(message, query_embedding, response, source_nodes)
+            except Exception as e:
+                logger.exception(f"Error occurred: {str(e)}")
+                telemetry.annotate(status="error")
+                yield ERROR_RESPONSE_MESSAGE
+            finally:
+                self.request_queue.release()
+                self._truncate_history(session)
+                self._log_stream_metrics(start, first_token_at, token_count)
+
+    @staticmethod
+    def _log_stream_metrics(start: float, first_token_at: Optional[float], token_count: int) -> None:
+        end = time.perf_counter()
+        if first_token_at is None:
+            logger.info(f"Stream finished after {end - start:.2f}s without tokens")
+            return
+        decode_time = end - first_token_at
+        tokens_per_second = (token_count - 1) / decode_time if token_count > 1 and decode_time > 0 else 0.0
+        logger.info(
+            f"Stream: time to first token {first_token_at - start:.2f}s, "
+            f"{token_count} tokens in {end - start:.2f}s ({tokens_per_second:.1f} tokens/s)"
+        )
+
+    def reset_chat(self, session_id: str = DEFAULT_SESSION_ID) -> None:
+        self.session_manager.remove(session_id)
+
+    @staticmethod
+    def _log_source_nodes(source_nodes: List[NodeWithScore]) -> None:
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug(f"Retrieved {len(source_nodes)} nodes")
+        for i, node in enumerate(source_nodes):
+            logger.debug(f"Node {i + 1}: score={node.score} content={node.node.get_content()[:100]}...")
@@ -0,0 +1,443 @@
+import os
+import time
+import uuid
+import atexit
+import shutil
+import socket
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
+from injector import inject, singleton
+from llama_index.core import Document
+
+from rag.config import Config
+from rag.manager.file_manager import FileManager
+from rag.manager.index_manager import IndexManager
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+# Per-file progress counters, in pipeline order.
+STAGES = ("pages_parsed", "nodes_embedded", "nodes_upserted")
+# One process at a time runs jobs; it renews its lease several times per lease period.
+RUNNER_LEASE_SECONDS = 30.0
+JOB_POLL_SECONDS = 2.0
+
+
+class JobCancelled(Exception):
+    pass
+
+
+@dataclass
+class JobFile:
+    position: int
+    file_name: str
+    path: str
+    status: str
+    total_pages: int
+    pages_parsed: int
+    nodes_embedded: int
+    nodes_upserted: int
+    pages_committed: int
+    error: Optional[str]
+
+
+@dataclass
+class Job:
+    job_id: str
+    status: str
+    created: float
+    started: Optional[float]
+    finished: Optional[float]
+    error: Optional[str]
+    cancel_requested: bool
+    files: List[JobFile] = field(default_factory=list)
+
+
+class JobStore:
+    """Ingestion jobs and their per-file progress in SQLite, so they survive a restart.
+
+    pages_committed is the checkpoint: pages up to it are in the index, and a
+    resumed file starts parsing after it. The runner row is a lease naming the
+    one process that runs jobs; any process may submit, cancel or read them.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                file_name TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total_pages INTEGER NOT NULL DEFAULT 0,
+                pages_parsed INTEGER NOT NULL DEFAULT 0,
+                nodes_embedded INTEGER NOT NULL DEFAULT 0,
+                nodes_upserted INTEGER NOT NULL DEFAULT 0,
+                pages_committed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (job_id, position)
+            );
+            CREATE TABLE IF NOT EXISTS runner (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                owner TEXT NOT NULL,
+                heartbeat REAL NOT NULL
+            );
+            """
+        )
+
+    def create_job(self, job_id: str, files: List[Tuple[str, str]]) -> None:
+        """files: (file_name, path) pairs, processed in order."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, status, created) VALUES (?, ?, ?)", (job_id, QUEUED, time.time())
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_files (job_id, position, file_name, path, status) VALUES (?, ?, ?, ?, ?)",
+                    [(job_id, position, file_name, path, QUEUED) for position, (file_name, path) in enumerate(files)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def claim_next(self) -> Optional[str]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = ? AND cancel_requested = 0 ORDER BY created LIMIT 1",
+                    (QUEUED,),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, started = coalesce(started, ?) WHERE job_id = ?",
+                        (RUNNING, time.time(), row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def requeue_interrupted(self, exclude: Iterable[str] = ()) -> int:
+        """Jobs left running by a previous runner go back to the queue; cancelled ones stay cancelled."""
+        exclude = list(exclude)
+        not_excluded = f"AND job_id NOT IN ({', '.join('?' * len(exclude))})" if exclude else ""
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET status = ?, finished = ? WHERE status IN (?, ?) AND cancel_requested = 1 {not_excluded}",
+                (CANCELLED, time.time(), QUEUED, RUNNING, *exclude),
+            )
+            return self._conn.execute(
+                f"UPDATE jobs SET status = ? WHERE status = ? {not_excluded}", (QUEUED, RUNNING, *exclude)
+            ).rowcount
+
+    def acquire_runner(self, owner: str, lease: float) -> bool:
+        """Take or renew the runner lease; False while another owner holds an unexpired one."""
+        now = time.time()
+        with self._lock:
+            return self._conn.execute(
+                "INSERT INTO runner (id, owner, heartbeat) VALUES (1, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET owner = excluded.owner, heartbeat = excluded.heartbeat "
+                "WHERE runner.owner = excluded.owner OR runner.heartbeat < ?",
+                (owner, now, now - lease),
+            ).rowcount > 0
+
+    def release_runner(self, owner: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM runner WHERE owner = ?", (owner,))
+
+    def finish_job(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE job_id = ?",
+                (status, time.time(), error, job_id),
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Flag the job for cancellation, and cancel it outright if still queued.
+
+        Returns its status before, or None if there is no such job.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+                if row is not None and row[0] not in FINISHED:
+                    self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE job_id = ?", (job_id,))
+                if row is not None and row[0] == QUEUED:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, finished = ? WHERE job_id = ?", (CANCELLED, time.time(), job_id)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def update_file(self, job_id: str, position: int, **values: Any) -> None:
+        columns = ", ".join(f"{column} = ?" for column in values)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE job_files SET {columns} WHERE job_id = ? AND position = ?",
+                (*values.values(), job_id, position),
+            )
+
+    def complete_file(self, job_id: str, position: int) -> None:
+        # Parsing stops early for an unchanged file, which is still fully indexed.
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_files SET status = ?, pages_parsed = total_pages, pages_committed = total_pages "
+                "WHERE job_id = ? AND position = ?",
+                (DONE, job_id, position),
+            )
+
+    def add_progress(self, job_id: str, position: int, stage: str, count: int) -> None:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage: {stage}")
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE job_files SET {stage} = {stage} + ? WHERE job_id = ? AND position = ?",
+                (count, job_id, position),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        jobs = self._load("WHERE job_id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def list_jobs(self, limit: int = 20) -> List[Job]:
+        """Most recent first."""
+        return self._load("ORDER BY created DESC LIMIT ?", (limit,))
+
+    def _load(self, clause: str, params: tuple) -> List[Job]:
+        with self._lock:
+            jobs = [
+                Job(job_id, status, created, started, finished, error, bool(cancel_requested))
+                for job_id, status, created, started, finished, error, cancel_requested in self._conn.execute(
+                    "SELECT job_id, status, created, started, finished, error, cancel_requested "
+                    f"FROM jobs {clause}", params
+                ).fetchall()
+            ]
+            by_id = {job.job_id: job for job in jobs}
+            if by_id:
+                placeholders = ", ".join("?" * len(by_id))
+                for job_id, *values in self._conn.execute(
+                    "SELECT job_id, position, file_name, path, status, total_pages, pages_parsed, nodes_embedded, "
+                    f"nodes_upserted, pages_committed, error FROM job_files WHERE job_id IN ({placeholders}) "
+                    "ORDER BY position", tuple(by_id)
+                ).fetchall():
+                    by_id[job_id].files.append(JobFile(*values))
+        return jobs
+
+    def prune(self, keep: int) -> List[str]:
+        """Forget finished jobs beyond the most recent `keep`; returns their ids."""
+        with self._lock:
+            job_ids = [row[0] for row in self._conn.execute(
+                f"SELECT job_id FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) "
+                "ORDER BY created DESC LIMIT -1 OFFSET ?", (*FINISHED, keep)
+            ).fetchall()]
+            for job_id in job_ids:
+                self._conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        return job_ids
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+@singleton
+class IngestJobService:
+    """Runs ingestion jobs on background worker threads.
+
+    A job is a list of uploaded files, copied under LOCAL_DATA_PATH/uploads so
+    it can be resumed after a crash. Files are indexed one after the other,
+    batch by batch through IndexManager.ingest_stream. Cancellation takes
+    effect at the next batch of pages or embeddings; pages committed until then
+    stay indexed, like an interrupted upload.
+
+    When several processes share LOCAL_DATA_PATH (API workers), all of them
+    accept jobs but only the holder of the runner lease runs them, so files are
+    never indexed twice concurrently. Another process takes over, resuming the
+    interrupted jobs, once the lease expires.
+    """
+
+    @inject
+    def __init__(self, config: Config, index_manager: IndexManager) -> None:
+        self.config = config
+        self.index_manager = index_manager
+        local_data_path = Path(config.LOCAL_DATA_PATH)
+        local_data_path.mkdir(parents=True, exist_ok=True)
+        self.uploads_path = local_data_path / "uploads"
+        self.store = JobStore(str(local_data_path / "jobs.db"))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake_up = threading.Event()
+        self._runner = threading.Event()
+        self._running: Set[str] = set()
+        self._running_lock = threading.Lock()
+        threading.Thread(target=self._hold_runner_lease, name="ingest-runner-lease", daemon=True).start()
+        for i in range(max(1, config.INGEST_JOB_WORKERS)):
+            threading.Thread(target=self._run, name=f"ingest-job-{i}", daemon=True).start()
+        atexit.register(self.store.release_runner, self.owner)
+
+    def submit(self, files: Iterable[Any]) -> str:
+        """Queue the uploaded files (paths or file objects) as one job and return its id."""
+        job_id = uuid.uuid4().hex[:12]
+        stored = []
+        for position, file in enumerate(files):
+            # One directory per file keeps the original name, which is the file's key in the index.
+            path = FileManager.copy_upload(file, self.uploads_path / job_id / str(position))
+            stored.append((Path(path).name, path))
+        if not stored:
+            raise ValueError("No files to ingest")
+        self.store.create_job(job_id, stored)
+        for pruned in self.store.prune(self.config.INGEST_JOB_HISTORY):
+            shutil.rmtree(self.uploads_path / pruned, ignore_errors=True)
+        logger.info(f"Queued ingestion job {job_id} with {len(stored)} files")
+        self._wake_up.set()
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Request cancellation; returns the job's status at the time, or None if it does not exist."""
+        status = self.store.request_cancel(job_id)
+        if status == QUEUED:
+            self._remove_uploads(job_id)
+        return status
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 20) -> List[Job]:
+        return self.store.list_jobs(limit)
+
+    def _check_cancelled(self, job_id: str) -> None:
+        # Read from the store: the request may have come through another process.
+        if self.store.cancel_requested(job_id):
+            raise JobCancelled(job_id)
+
+    def _hold_runner_lease(self) -> None:
+        while True:
+            try:
+                held = self.store.acquire_runner(self.owner, RUNNER_LEASE_SECONDS)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not renew the ingestion runner lease: {e}")
+                held = self._runner.is_set()
+            if held and not self._runner.is_set():
+                with self._running_lock:
+                    running = set(self._running)
+                resumed = self.store.requeue_interrupted(exclude=running)
+                if resumed:
+                    logger.info(f"Resuming {resumed} interrupted ingestion jobs")
+                logger.debug(f"Ingestion jobs run in this process ({self.owner})")
+                self._runner.set()
+                self._wake_up.set()
+            elif not held and self._runner.is_set():
+                logger.warning("Another process took over running ingestion jobs")
+                self._runner.clear()
+            time.sleep(RUNNER_LEASE_SECONDS / 6)
+
+    def _run(self) -> None:
+        while True:
+            job_id = self.store.claim_next() if self._runner.is_set() else None
+            if job_id is None:
+                self._wake_up.wait(timeout=JOB_POLL_SECONDS)
+                self._wake_up.clear()
+                continue
+            with self._running_lock:
+                self._running.add(job_id)
+            try:
+                self._run_job(job_id)
+            except Exception as e:
+                logger.exception(f"Ingestion job {job_id} failed: {e}")
+                self.store.finish_job(job_id, FAILED, str(e))
+            finally:
+                with self._running_lock:
+                    self._running.discard(job_id)
+
+    def _run_job(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        start = time.perf_counter()
+        errors = []
+        for file in job.files:
+            if file.status in FINISHED:
+                continue
+            try:
+                self._check_cancelled(job_id)
+                self.store.update_file(job_id, file.position, status=RUNNING, error=None)
+                self._ingest_file(job_id, file)
+                self.store.complete_file(job_id, file.position)
+            except JobCancelled:
+                self.store.update_file(job_id, file.position, status=CANCELLED)
+                self.store.finish_job(job_id, CANCELLED)
+                self._remove_uploads(job_id)
+                logger.info(f"Ingestion job {job_id} cancelled during {file.file_name}")
+                return
+            except Exception as e:
+                logger.exception(f"Ingesting {file.file_name} in job {job_id} failed: {e}")
+                self.store.update_file(job_id, file.position, status=FAILED, error=str(e))
+                errors.append(f"{file.file_name}: {e}")
+        self.store.finish_job(job_id, FAILED if errors else DONE, "; ".join(errors) or None)
+        self._remove_uploads(job_id)
+        logger.info(f"Ingestion job {job_id} finished in {time.perf_counter() - start:.1f}s ({len(errors)} failed files)")
+
+    def _ingest_file(self, job_id: str, file: JobFile) -> None:
+        resume_from = file.pages_committed
+        if resume_from:
+            logger.info(f"Resuming {file.file_name} in job {job_id} after page {resume_from}")
+        self.store.update_file(job_id, file.position, pages_parsed=resume_from)
+        batches = FileManager.iter_file(
+            file.path, self.config.PDF_PAGES_PER_BATCH, self.config.PDF_PARSE_WORKERS, start_page=resume_from
+        )
+
+        def progress(stage: str, count: int) -> None:
+            # Called from the embedding threads too; raising here stops the batch before it is committed.
+            self._check_cancelled(job_id)
+            self.store.add_progress(job_id, file.position, stage, count)
+
+        self.index_manager.ingest_stream(
+            self._checkpointed(job_id, file, batches), progress=progress, resume_from=resume_from
+        )
+
+    def _checkpointed(self, job_id: str, file: JobFile, batches: Iterator[List[Document]]) -> Iterator[List[Document]]:
+        documents = next(batches, None)
+        while documents is not None:
+            self._check_cancelled(job_id)
+            self.store.update_file(job_id, file.position, total_pages=documents[0].metadata.get("total_pages", 0))
+            self.store.add_progress(job_id, file.position, "pages_parsed", len(documents))
+            yield documents
+            # Asked for the next batch: this one has been committed to the index. The last
+            # one is not checkpointed here: removing stale pages and storing the file hash
+            # come after it, and a resume has to redo them (complete_file marks the end).
+            documents = next(batches, None)
+            if documents is not None:
+                self.store.update_file(job_id, file.position, pages_committed=documents[0].metadata["page"] - 1)
+
+    def _remove_uploads(self, job_id: str) -> None:
+        shutil.rmtree(self.uploads_path / job_id, ignore_errors=True)
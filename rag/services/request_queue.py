@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Deque, Dict, Optional
+from injector import inject, singleton
+
+from rag import telemetry
+from rag.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class _Waiter:
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+
+    def wake(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._set_result)
+        else:
+            self.event.set()
+
+    def _set_result(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+@singleton
+class RequestQueue:
+    """FIFO admission control in front of the LLM, shared by sync and async callers.
+
+    At most max_concurrency requests hold a slot; up to max_waiting more wait in
+    arrival order and the rest are rejected with QueueFullError.
+    """
+
+    @inject
+    def __init__(self, config: Config) -> None:
+        self.max_concurrency = max(1, config.LLM_MAX_CONCURRENCY)
+        self.max_waiting = config.LLM_QUEUE_SIZE
+        self.wait_timeout = config.LLM_QUEUE_TIMEOUT
+        self._active = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    async def aacquire(self) -> None:
+        waiter = self._enqueue(asyncio.get_running_loop())
+        if waiter is not None:
+            with telemetry.span("queue_wait"):
+                try:
+                    await asyncio.wait_for(waiter.future, self.wait_timeout)
+                except BaseException:
+                    self._abandon(waiter)
+                    raise
+
+    def acquire(self) -> None:
+        waiter = self._enqueue(None)
+        if waiter is not None:
+            with telemetry.span("queue_wait"):
+                if not waiter.event.wait(self.wait_timeout):
+                    self._abandon(waiter)
+                    raise TimeoutError(f"Waited {self.wait_timeout}s for an LLM slot")
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def sync_slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _enqueue(self, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Take a free slot (returns None) or join the queue (returns the waiter)."""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._waiters:
+                self._active += 1
+                return None
+            if len(self._waiters) >= self.max_waiting:
+                telemetry.count("rag_llm_queue_rejected_total")
+                raise QueueFullError(f"{len(self._waiters)} requests already waiting for the LLM")
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            logger.debug(f"Request queued, {len(self._waiters)} waiting")
+            return waiter
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        # The slot was handed over while we were giving up; pass it on.
+        self.release()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter so late arrivals cannot overtake it.
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+            else:
+                self._active -= 1
+                return
+        waiter.wake()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "active": self._active,
+                "waiting": len(self._waiters),
+                "max_concurrency": self.max_concurrency,
+            }
@@ -1,15 +1,61 @@
+import time
+import queue
 import logging
-import sounddevice as sd
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Generator, Iterable, List, Optional
 import numpy as np
-from scipy.io.wavfile import write
 from injector import inject, singleton
+from rag import telemetry
 from rag.config import Config
 from rag.services.chat_service import ChatService
+from rag.manager.session_manager import DEFAULT_SESSION_ID
 from rag.manager.voice.voice_to_text_manager import VoiceToTextManager
 from rag.manager.voice.text_to_voice_manager import TextToVoiceManager
+from rag.manager.voice.audio_io import SAMPLE_RATE, microphone_chunks, resample, to_float_mono
+from rag.manager.voice.sentence_splitter import SentenceSplitter
+from rag.manager.voice.vad import END, EnergyVAD
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class SpeechChunk:
+    transcription: str
+    text: str
+    audio: np.ndarray
+    sample_rate: int
+
+@dataclass
+class VoiceTurnMetrics:
+    """perf_counter timestamps of one streaming voice turn."""
+    speech_end: Optional[float] = None
+    transcribed: Optional[float] = None
+    first_token: Optional[float] = None
+    first_audio: Optional[float] = None
+    finished: Optional[float] = None
+    tts_seconds: float = 0.0
+    sentences: int = 0
+
+    @staticmethod
+    def _ms(start: Optional[float], end: Optional[float]) -> str:
+        return f"{(end - start) * 1000:.0f}ms" if start is not None and end is not None else "n/a"
+
+    def log(self) -> None:
+        for stage, start, end in (
+            ("voice_asr_after_speech", self.speech_end, self.transcribed),
+            ("voice_first_audio", self.speech_end, self.first_audio),
+        ):
+            if start is not None and end is not None:
+                telemetry.record(stage, end - start)
+        logger.info(
+            f"Voice turn: asr {self._ms(self.speech_end, self.transcribed)} after end of speech, "
+            f"llm first token {self._ms(self.transcribed, self.first_token)}, "
+            f"first audio {self._ms(self.speech_end, self.first_audio)} after end of speech, "
+            f"tts {self.tts_seconds * 1000:.0f}ms for {self.sentences} sentences, "
+            f"total {self._ms(self.speech_end, self.finished)}"
+        )
+
 @singleton
 class VoiceChatService:
     @inject
@@ -24,6 +70,7 @@ class VoiceChatService:
         self.text_to_voice = text_to_voice
 
     def record_audio(self, duration=5, sample_rate=16000):
+        import sounddevice as sd
         logger.info(f"Recording audio for {duration} seconds...")
         audio = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1)
         sd.wait()
@@ -32,33 +79,45 @@ class VoiceChatService:
     def transcribe_audio(self, audio):
         return self.voice_to_text.transcribe_audio(audio)
 
-    def chat(self, transcription):
-        return self.chat_service.chat(transcription)
+    def chat(self, transcription, session_id=DEFAULT_SESSION_ID):
+        return self.chat_service.chat(transcription, session_id=session_id)
 
     def text_to_speech(self, text):
         return self.text_to_voice.text_to_speech(text)
 
     def save_audio(self, audio, filename="output.wav", sample_rate=16000):
+        from scipy.io.wavfile import write
         write(filename, sample_rate, audio)
 
-    def run_voice_chat(self):
+    def run_voice_chat(self, session_id=DEFAULT_SESSION_ID):
+        """Record from the server's microphone and answer; see voice_chat."""
         try:
-            # Record audio
             audio = self.record_audio(duration=self.config.RECORDING_DURATION)
-            
+        except Exception as e:
+            logger.error(f"An error occurred while recording audio: {str(e)}")
+            return None, "I'm sorry, an error occurred. Please try again or contact support if the issue persists.", None
+        return self.voice_chat(audio, SAMPLE_RATE, session_id=session_id)
+
+    @telemetry.traced("voice_chat")
+    def voice_chat(self, audio, sample_rate=SAMPLE_RATE, session_id=DEFAULT_SESSION_ID):
+        """Answer an in-memory clip. Returns (transcription, response, speech); speech is None if TTS failed."""
+        try:
+            # Uploaded audio can be any rate, integer PCM and stereo; Whisper wants 16 kHz mono float.
+            audio = resample(to_float_mono(audio), sample_rate, SAMPLE_RATE)
+
             # Transcribe audio to text
             transcription = self.transcribe_audio(audio)
             if not transcription:
                 logger.error("Failed to transcribe audio.")
-                return None, "I'm sorry, I couldn't understand the audio. Could you please try again?"
+                return None, "I'm sorry, I couldn't understand the audio. Could you please try again?", None
 
             logger.info(f"Transcription: {transcription}")
             
             # Get chat response
-            response = self.chat(transcription)
+            response = self.chat(transcription, session_id=session_id)
             if not response:
                 logger.error("Failed to generate chat response.")
-                return transcription, "I apologize, but I couldn't generate a response. Please try asking in a different way."
+                return transcription, "I apologize, but I couldn't generate a response. Please try asking in a different way.", None
 
             logger.info(f"Chat response: {response}")
             
@@ -66,19 +125,111 @@ class VoiceChatService:
             speech = self.text_to_speech(response)
             if speech is None:
                 logger.error("Failed to convert text to speech.")
-                return transcription, response
+                return transcription, response, None
 
-            # Save the response audio
-            self.save_audio(speech)
-            
-            return transcription, response
+            return transcription, response, np.asarray(speech, dtype=np.float32)
 
         except Exception as e:
             logger.error(f"An error occurred during voice chat: {str(e)}")
-            return None, "I'm sorry, an error occurred. Please try again or contact support if the issue persists."
+            return None, "I'm sorry, an error occurred. Please try again or contact support if the issue persists.", None
+
+    @telemetry.traced("voice_stream")
+    def streaming_voice_chat(
+        self,
+        audio_chunks: Optional[Iterable[np.ndarray]] = None,
+        session_id: str = DEFAULT_SESSION_ID,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Generator[SpeechChunk, None, None]:
+        """Listen for one utterance and speak the answer sentence by sentence.
+
+        audio_chunks is 16 kHz mono float audio (the microphone by default; see
+        audio_io.wav_chunks for offline use). Speech is transcribed segment by
+        segment while the user is still talking, and each sentence of the answer
+        is synthesized while the LLM is still generating the next one.
+        """
+        metrics = VoiceTurnMetrics()
+        transcription = self._listen(audio_chunks if audio_chunks is not None else microphone_chunks(), metrics)
+        if not transcription:
+            logger.info("No speech detected.")
+            return
+        logger.info(f"Transcription: {transcription}")
+        try:
+            yield from self._speak(transcription, session_id, metrics, cancel_event)
+        finally:
+            metrics.finished = time.perf_counter()
+            metrics.log()
 
-    def streaming_voice_chat(self):
-        # This method could be implemented for a streaming version of the voice chat
-        # It would involve continuous audio recording, real-time transcription,
-        # and immediate responses
-        pass
\ No newline at end of file
+    def _listen(self, audio_chunks: Iterable[np.ndarray], metrics: VoiceTurnMetrics) -> str:
+        vad = EnergyVAD(
+            sample_rate=SAMPLE_RATE,
+            energy_threshold=self.config.VAD_ENERGY_THRESHOLD,
+            segment_silence_ms=self.config.VAD_SEGMENT_SILENCE_MS,
+            end_silence_ms=self.config.VAD_END_SILENCE_MS,
+            max_utterance_s=self.config.MAX_UTTERANCE_SECONDS,
+        )
+        # One worker keeps Whisper calls in order and off the capture loop.
+        futures: List[Future] = []
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr") as executor:
+            try:
+                ended = False
+                for chunk in audio_chunks:
+                    for event, audio in vad.feed(chunk):
+                        if audio.size:
+                            futures.append(executor.submit(self.transcribe_audio, audio))
+                        if event == END:
+                            # Anything after it in this chunk belongs to the next utterance.
+                            ended = True
+                            break
+                    if ended:
+                        break
+                else:
+                    for _, audio in vad.flush():
+                        if audio.size:
+                            futures.append(executor.submit(self.transcribe_audio, audio))
+            finally:
+                close = getattr(audio_chunks, "close", None)
+                if close is not None:
+                    close()
+            metrics.speech_end = time.perf_counter()
+            segments = [future.result() for future in futures]
+        metrics.transcribed = time.perf_counter()
+        return " ".join(segment.strip() for segment in segments if segment).strip()
+
+    def _speak(self, transcription: str, session_id: str, metrics: VoiceTurnMetrics,
+               cancel_event: Optional[threading.Event]) -> Generator[SpeechChunk, None, None]:
+        cancel_event = cancel_event or threading.Event()
+        sentences: "queue.Queue[Optional[str]]" = queue.Queue()
+
+        def generate():
+            splitter = SentenceSplitter()
+            try:
+                for token in self.chat_service.stream_chat(transcription, session_id=session_id,
+                                                           cancel_event=cancel_event):
+                    if metrics.first_token is None:
+                        metrics.first_token = time.perf_counter()
+                    for sentence in splitter.feed(token):
+                        sentences.put(sentence)
+                for sentence in splitter.flush():
+                    sentences.put(sentence)
+            except Exception as e:
+                logger.error(f"An error occurred during streaming voice chat: {str(e)}")
+            finally:
+                sentences.put(None)
+
+        producer = threading.Thread(target=generate, name="voice-llm", daemon=True)
+        producer.start()
+        try:
+            while (sentence := sentences.get()) is not None:
+                start = time.perf_counter()
+                speech = self.text_to_speech(sentence)
+                metrics.tts_seconds += time.perf_counter() - start
+                metrics.sentences += 1
+                if speech is None:
+                    continue
+                if metrics.first_audio is None:
+                    metrics.first_audio = time.perf_counter()
+                yield SpeechChunk(transcription, sentence, np.asarray(speech, dtype=np.float32),
+                                  self.config.TTS_SAMPLE_RATE)
+        finally:
+            # Stops generation when the caller closes the stream early.
+            cancel_event.set()
@@ -0,0 +1,42 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+_started_at = time.perf_counter()
+_timings: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def timed(component: str) -> Iterator[None]:
+    """Record how long building or loading a component took, for the startup report."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _timings[component] = elapsed
+        logger.debug(f"{component} ready in {elapsed * 1000:.0f}ms")
+
+
+def startup_report() -> Dict[str, float]:
+    with _lock:
+        return dict(_timings)
+
+
+def log_startup_report() -> None:
+    timings = startup_report()
+    if not timings:
+        return
+    width = max(len(component) for component in timings)
+    lines = [
+        f"  {component:<{width}}  {seconds * 1000:8.0f}ms"
+        for component, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True)
+    ]
+    total = time.perf_counter() - _started_at
+    logger.info("Startup report (slowest first):\n" + "\n".join(lines) + f"\n  {'since process start':<{width}}  {total * 1000:8.0f}ms")
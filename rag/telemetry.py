@@ -0,0 +1,518 @@
+"""Stage timings, counters and per-request traces, exported in Prometheus text format.
+
+Everything here is a no-op until configure() is called with TELEMETRY_ENABLED:
+span() and request() then return a shared null context and count() returns
+immediately, and no LlamaIndex handlers are installed.
+"""
+import json
+import time
+import inspect
+import functools
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.span import SimpleSpan
+from llama_index.core.instrumentation.span_handlers import BaseSpanHandler
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+logger = logging.getLogger(__name__)
+# One JSON line per request; route it to its own handler to collect structured logs.
+request_logger = logging.getLogger("rag.requests")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_NOOP = nullcontext()
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Mapping[str, Any]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, bounds: Tuple[float, ...] = BUCKETS) -> None:
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._histograms: Dict[LabelKey, _Histogram] = {}
+        self._counters: Dict[LabelKey, float] = defaultdict(float)
+        self._gauges: Dict[str, Callable[[], Mapping[str, float]]] = {}
+
+    def observe(self, name: str, value: float, labels: Mapping[str, Any], buckets: Tuple[float, ...] = BUCKETS) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float, labels: Mapping[str, Any]) -> None:
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def gauge(self, prefix: str, collect: Callable[[], Mapping[str, float]]) -> None:
+        """collect() returns {suffix: value}; exported as <prefix>_<suffix> when scraped."""
+        with self._lock:
+            self._gauges[prefix] = collect
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = {key: (h.bounds, list(h.buckets), h.total, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        lines: List[str] = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), (bounds, buckets, total, count) in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            for bound, bucket in zip(bounds, buckets):
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {bucket}")
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for prefix, collect in sorted(gauges.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                logger.debug(f"Gauge {prefix} failed: {e}")
+                continue
+            for suffix, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE {prefix}_{suffix} gauge")
+                    lines.append(f"{prefix}_{suffix} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    def __init__(self, kind: str, attributes: Dict[str, Any]) -> None:
+        self.kind = kind
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.status = "ok"
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, float] = defaultdict(float)
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] += seconds
+
+    def add_count(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counts[name] += value
+
+    def to_dict(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "status": self.status,
+                "total_ms": round(elapsed * 1000, 2),
+                "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()},
+                **({"counts": dict(self.counts)} if self.counts else {}),
+                **self.attributes,
+            }
+
+
+metrics = Metrics()
+_enabled = False
+_log_requests = False
+_configure_lock = threading.Lock()
+_server: Optional[ThreadingHTTPServer] = None
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("rag_request_trace", default=None)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def configure(config) -> None:
+    """Turn collection on or off from Config; installs the LlamaIndex handlers once."""
+    global _enabled, _log_requests
+    with _configure_lock:
+        _log_requests = config.TELEMETRY_REQUEST_LOG
+        if not config.TELEMETRY_ENABLED or _enabled:
+            return
+        _enabled = True
+        _install_llama_index_handlers()
+        if config.METRICS_PORT:
+            start_metrics_server(config.METRICS_PORT)
+
+
+def record(stage: str, seconds: float, trace: Optional[RequestTrace] = None, **labels: Any) -> None:
+    if not _enabled:
+        return
+    metrics.observe("rag_stage_seconds", seconds, {"stage": stage, **labels})
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_stage(stage, seconds)
+
+
+@contextmanager
+def _span(stage: str, labels: Dict[str, Any]):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start, **labels)
+
+
+def span(stage: str, **labels: Any):
+    """Time a pipeline stage: with telemetry.span("parse"): ..."""
+    if not _enabled:
+        return _NOOP
+    return _span(stage, labels)
+
+
+def count(name: str, value: float = 1.0, trace: Optional[RequestTrace] = None, **labels: Any) -> None:
+    if not _enabled:
+        return
+    metrics.inc(name, value, labels)
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.add_count(name, value)
+
+
+def histogram(name: str, value: float, buckets: Tuple[float, ...], **labels: Any) -> None:
+    """Observe a value that is not a duration (a batch size, say) with its own bucket bounds."""
+    if not _enabled:
+        return
+    metrics.observe(name, value, labels, buckets)
+
+
+def gauge(prefix: str, collect: Callable[[], Mapping[str, float]]) -> None:
+    """Export the numeric values of a stats() dict as gauges, read at scrape time."""
+    metrics.gauge(prefix, collect)
+
+
+def annotate(status: Optional[str] = None, **attributes: Any) -> None:
+    """Attach attributes (or a status such as "cached") to the current request's log line."""
+    if not _enabled:
+        return
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attributes.update(attributes)
+        if status is not None:
+            trace.status = status
+
+
+@contextmanager
+def _bound(trace: RequestTrace):
+    """Make trace the current one until the block ends, in this context only."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def _request(kind: str, attributes: Dict[str, Any], bind: bool = True):
+    # Generators pass bind=False and bind the trace around each step themselves: they may
+    # be resumed from another context, and must not leave it set while suspended.
+    trace = RequestTrace(kind, attributes)
+    previous = _current_trace.get()
+    if bind:
+        _current_trace.set(trace)
+    try:
+        yield trace
+    except GeneratorExit:
+        trace.status = "cancelled"
+        raise
+    except BaseException:
+        trace.status = "error"
+        raise
+    finally:
+        if bind:
+            _current_trace.set(previous)
+        elapsed = time.perf_counter() - trace.start
+        metrics.observe("rag_request_seconds", elapsed, {"kind": kind})
+        metrics.inc("rag_requests_total", 1, {"kind": kind, "status": trace.status})
+        if _log_requests:
+            request_logger.info(json.dumps(trace.to_dict(elapsed), default=str))
+
+
+def request(kind: str, **attributes: Any):
+    """Scope one user-facing request; stages recorded inside it are summed into its log line."""
+    if not _enabled:
+        return _NOOP
+    return _request(kind, attributes)
+
+
+def traced(kind: str, **attributes: Any):
+    """Decorator form of request() for functions, coroutines and (async) generators."""
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                agen = func(*args, **kwargs)
+                if not _enabled:
+                    try:
+                        async for item in agen:
+                            yield item
+                    finally:
+                        # Unlike yield from, async for does not close the inner generator.
+                        await agen.aclose()
+                    return
+                with _request(kind, attributes, bind=False) as trace:
+                    try:
+                        while True:
+                            with _bound(trace):
+                                try:
+                                    item = await agen.__anext__()
+                                except StopAsyncIteration:
+                                    break
+                            yield item
+                    finally:
+                        with _bound(trace):
+                            await agen.aclose()
+            return async_gen_wrapper
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                gen = func(*args, **kwargs)
+                if not _enabled:
+                    return (yield from gen)
+                # The trace is current only while the generator runs, not between its items.
+                with _request(kind, attributes, bind=False) as trace:
+                    try:
+                        while True:
+                            with _bound(trace):
+                                try:
+                                    item = next(gen)
+                                except StopIteration as stop:
+                                    return stop.value
+                            yield item
+                    finally:
+                        with _bound(trace):
+                            gen.close()
+            return gen_wrapper
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def coroutine_wrapper(*args, **kwargs):
+                with request(kind, **attributes):
+                    return await func(*args, **kwargs)
+            return coroutine_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request(kind, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format % args)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> None:
+    global _server
+    if _server is not None:
+        return
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Could not start the metrics endpoint on port {port}: {e}")
+        return
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Prometheus metrics on http://{host}:{port}/metrics")
+
+
+# LlamaIndex methods (by name) whose dispatcher spans are recorded as stages.
+_SPAN_STAGES = {
+    "retrieve": "retrieve",
+    "aretrieve": "retrieve",
+    "get_query_embedding": "embed_query",
+    "aget_query_embedding": "embed_query",
+    "get_text_embedding_batch": "embed_batch",
+    "aget_text_embedding_batch": "embed_batch",
+}
+_LLM_START_EVENTS = ("LLMChatStartEvent", "LLMCompletionStartEvent")
+_LLM_PROGRESS_EVENTS = ("LLMChatInProgressEvent", "LLMCompletionInProgressEvent")
+_LLM_END_EVENTS = ("LLMChatEndEvent", "LLMCompletionEndEvent")
+
+
+class _StageSpanHandler(BaseSpanHandler[SimpleSpan]):
+    """Times retrieval and embedding calls made anywhere inside LlamaIndex."""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StageSpanHandler"
+
+    def new_span(self, id_: str, bound_args: inspect.BoundArguments, instance: Optional[Any] = None,
+                 parent_span_id: Optional[str] = None, tags: Optional[Dict[str, Any]] = None,
+                 **kwargs: Any) -> Optional[SimpleSpan]:
+        # Span ids look like "<Class>.<method>-<uuid>".
+        stage = _SPAN_STAGES.get(id_.split("-", 1)[0].rpartition(".")[2])
+        if stage is None:
+            return None
+        parent = self.open_spans.get(parent_span_id) if parent_span_id else None
+        if parent is not None and parent.metadata["stage"] == stage:
+            # A wrapper delegating to an inner model (CachedEmbedding -> OllamaEmbedding).
+            return None
+        component = type(instance).__name__ if instance is not None else ""
+        return SimpleSpan(id_=id_, parent_id=parent_span_id, metadata={
+            "stage": stage, "component": component, "start": time.perf_counter(),
+            "trace": _current_trace.get(), "texts": len(bound_args.arguments.get("texts") or ()),
+        })
+
+    def prepare_to_exit_span(self, id_: str, bound_args: inspect.BoundArguments, instance: Optional[Any] = None,
+                             result: Optional[Any] = None, **kwargs: Any) -> Optional[SimpleSpan]:
+        span = self.open_spans.get(id_)
+        if span is None:
+            return None
+        meta = span.metadata
+        record(meta["stage"], time.perf_counter() - meta["start"], trace=meta["trace"], component=meta["component"])
+        if meta["texts"]:
+            count("rag_embedded_texts_total", meta["texts"], trace=meta["trace"])
+        return span
+
+    def prepare_to_drop_span(self, id_: str, bound_args: inspect.BoundArguments, instance: Optional[Any] = None,
+                             err: Optional[BaseException] = None, **kwargs: Any) -> Optional[SimpleSpan]:
+        span = self.open_spans.get(id_)
+        if span is not None:
+            count("rag_stage_errors_total", stage=span.metadata["stage"])
+        return span
+
+
+class _LLMEventHandler(BaseEventHandler):
+    """LLM call duration, time to first token and token counts.
+
+    Ollama reports prompt/completion token counts and its own prefill
+    (prompt_eval_duration) and decode (eval_duration) times in the raw response.
+    """
+
+    _calls: Dict[str, Tuple[float, Optional[RequestTrace], bool]] = PrivateAttr(default_factory=dict)
+    # Events fire from every thread making LLM calls.
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LLMEventHandler"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        name = event.class_name()
+        key = str(event.span_id)
+        if name in _LLM_START_EVENTS:
+            with self._lock:
+                if len(self._calls) >= 1024:
+                    # Streams abandoned before their end event; drop the oldest.
+                    self._calls.pop(next(iter(self._calls)))
+                self._calls[key] = (time.perf_counter(), _current_trace.get(), False)
+        elif name in _LLM_PROGRESS_EVENTS:
+            with self._lock:
+                call = self._calls.get(key)
+                first = call is not None and not call[2]
+                if first:
+                    self._calls[key] = (call[0], call[1], True)
+            if first:
+                record("llm_first_token", time.perf_counter() - call[0], trace=call[1])
+        elif name in _LLM_END_EVENTS:
+            with self._lock:
+                call = self._calls.pop(key, None)
+            if call is None:
+                return
+            start, trace, _ = call
+            record("llm", time.perf_counter() - start, trace=trace)
+            self._record_usage(getattr(event, "response", None), trace)
+
+    @staticmethod
+    def _record_usage(response: Any, trace: Optional[RequestTrace]) -> None:
+        if response is None:
+            return
+        usage: Dict[str, Any] = {}
+        for source in (getattr(response, "additional_kwargs", None), getattr(response, "raw", None)):
+            if isinstance(source, Mapping):
+                usage.update({k: v for k, v in source.items() if k not in usage})
+        if usage.get("prompt_eval_count"):
+            count("rag_llm_prompt_tokens_total", usage["prompt_eval_count"], trace=trace)
+        if usage.get("eval_count"):
+            count("rag_llm_completion_tokens_total", usage["eval_count"], trace=trace)
+        # Ollama durations are in nanoseconds. A long load means the model had been unloaded.
+        if usage.get("load_duration"):
+            record("llm_load", usage["load_duration"] / 1e9, trace=trace)
+        if usage.get("prompt_eval_duration"):
+            record("llm_prefill", usage["prompt_eval_duration"] / 1e9, trace=trace)
+        if usage.get("eval_duration"):
+            record("llm_decode", usage["eval_duration"] / 1e9, trace=trace)
+
+
+class TracedPostprocessor(BaseNodePostprocessor):
+    _inner: BaseNodePostprocessor = PrivateAttr()
+
+    def __init__(self, inner: BaseNodePostprocessor) -> None:
+        super().__init__()
+        self._inner = inner
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TracedPostprocessor"
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore],
+                           query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        with span("postprocess", component=self._inner.class_name()):
+            return self._inner.postprocess_nodes(nodes, query_bundle=query_bundle)
+
+
+def _install_llama_index_handlers() -> None:
+    dispatcher = get_dispatcher()
+    dispatcher.add_span_handler(_StageSpanHandler())
+    dispatcher.add_event_handler(_LLMEventHandler())
+
+
+def trace_postprocessors(postprocessors: List[BaseNodePostprocessor]) -> List[BaseNodePostprocessor]:
+    """Wrap node postprocessors so each one is timed; unchanged when telemetry is off."""
+    if not _enabled:
+        return postprocessors
+    return [TracedPostprocessor(postprocessor) for postprocessor in postprocessors]
@@ -0,0 +1,85 @@
+import json
+import time
+import asyncio
+from dataclasses import replace
+
+import pytest
+from injector import Injector
+from llama_index.core import Document
+from llama_index.core.chat_engine import ContextChatEngine
+from qdrant_client import QdrantClient
+
+import api
+from rag.config import Config
+from rag.manager.index_manager import IndexManager
+from rag.manager.session_manager import SessionManager
+from rag.services.chat_service import ERROR_RESPONSE_MESSAGE
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from benchmarks.harness import BenchmarkModule
+
+NUM_TOKENS = 40
+TOKEN_MS = 50
+
+
+@pytest.fixture
+def injector(tmp_path, monkeypatch):
+    config = replace(Config(), LOCAL_DATA_PATH=str(tmp_path), SHOW_PROGRESS=False, RERANK_ENABLED=False,
+                     CHAT_STORE_BACKEND="memory", RESPONSE_CACHE_ENABLED=False)
+    llm = FakeLLM(num_tokens=NUM_TOKENS, token_ms=TOKEN_MS)
+    injector = Injector([BenchmarkModule(config, QdrantClient(":memory:"), llm, FakeEmbedding())])
+    injector.get(IndexManager).ingest([
+        Document(text="Fixed deposits pay 7% a year.", id_="rates.pdf::page-0",
+                 metadata={"file_name": "rates.pdf", "page": 0}),
+    ])
+
+    async def aget_nodes(engine, message):
+        return engine._get_nodes(message)
+
+    # The harness' in-memory Qdrant has no async client; retrieve through the sync one.
+    monkeypatch.setattr(ContextChatEngine, "_aget_nodes", aget_nodes)
+    monkeypatch.setattr(api, "injector", injector)
+    return injector
+
+
+async def stream_and_disconnect(message, session_id):
+    """POST /chat/stream as an ASGI server would, with a client that leaves after the first chunk.
+
+    TestClient only returns a streamed body once the app has finished it, so it cannot
+    disconnect halfway.
+    """
+    first_chunk = asyncio.Event()
+    chunks = []
+    request = {"type": "http.request", "body": json.dumps({"message": message, "session_id": session_id}).encode(),
+               "more_body": False}
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/chat/stream", "raw_path": b"/chat/stream", "root_path": "",
+             "query_string": b"", "headers": [(b"content-type", b"application/json")],
+             "client": ("testclient", 50000), "server": ("testserver", 80)}
+    received_request = False
+
+    async def receive():
+        nonlocal received_request
+        if not received_request:
+            received_request = True
+            return request
+        await first_chunk.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            chunks.append(message["body"].decode())
+            first_chunk.set()
+
+    await api.app(scope, receive, send)
+    return chunks
+
+
+def test_disconnecting_from_the_stream_stops_generation(injector):
+    begin = time.perf_counter()
+    chunks = asyncio.run(stream_and_disconnect("What do fixed deposits pay?", "s"))
+    elapsed = time.perf_counter() - begin
+
+    assert 1 <= len(chunks) < NUM_TOKENS
+    assert ERROR_RESPONSE_MESSAGE not in chunks
+    assert elapsed < NUM_TOKENS * TOKEN_MS / 1000.0 / 2
+    assert injector.get(SessionManager).get("s").memory.get_all() == []
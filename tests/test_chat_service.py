@@ -0,0 +1,94 @@
+import time
+import asyncio
+import threading
+from dataclasses import replace
+
+from injector import Injector
+from llama_index.core import Document
+from llama_index.core.chat_engine import ContextChatEngine
+from qdrant_client import QdrantClient
+
+from rag.config import Config
+from rag.manager.index_manager import IndexManager
+from rag.services.chat_service import ChatService
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from benchmarks.harness import BenchmarkModule
+
+# Long enough that waiting for the whole answer is obvious next to stopping after a token.
+NUM_TOKENS = 40
+TOKEN_MS = 50
+
+
+def chat_service(tmp_path):
+    config = replace(Config(), LOCAL_DATA_PATH=str(tmp_path), SHOW_PROGRESS=False, RERANK_ENABLED=False,
+                     CHAT_STORE_BACKEND="memory", RESPONSE_CACHE_ENABLED=False)
+    llm = FakeLLM(num_tokens=NUM_TOKENS, token_ms=TOKEN_MS)
+    injector = Injector([BenchmarkModule(config, QdrantClient(":memory:"), llm, FakeEmbedding())])
+    injector.get(IndexManager).ingest([
+        Document(text="Fixed deposits pay 7% a year.", id_="rates.pdf::page-0",
+                 metadata={"file_name": "rates.pdf", "page": 0}),
+    ])
+    return injector.get(ChatService)
+
+
+def history(service, session_id):
+    return service.session_manager.get(session_id).memory.get_all()
+
+
+def test_closing_the_stream_stops_generation_and_forgets_the_turn(tmp_path):
+    service = chat_service(tmp_path)
+    tokens = service.stream_chat("What do fixed deposits pay?", session_id="s")
+    next(tokens)
+    next(tokens)
+
+    begin = time.perf_counter()
+    tokens.close()
+
+    assert time.perf_counter() - begin < 3 * TOKEN_MS / 1000.0
+    assert history(service, "s") == []
+
+
+def test_cancel_event_stops_generation_and_forgets_the_turn(tmp_path):
+    service = chat_service(tmp_path)
+    cancel_event = threading.Event()
+    received = []
+
+    begin = time.perf_counter()
+    for token in service.stream_chat("What do fixed deposits pay?", session_id="s", cancel_event=cancel_event):
+        received.append(token)
+        cancel_event.set()
+
+    assert len(received) == 1
+    assert time.perf_counter() - begin < NUM_TOKENS * TOKEN_MS / 1000.0 / 2
+    assert history(service, "s") == []
+
+
+def test_closing_the_async_stream_stops_generation_and_forgets_the_turn(tmp_path, monkeypatch):
+    service = chat_service(tmp_path)
+
+    async def aget_nodes(engine, message):
+        return engine._get_nodes(message)
+
+    # The harness' in-memory Qdrant has no async client; retrieve through the sync one.
+    monkeypatch.setattr(ContextChatEngine, "_aget_nodes", aget_nodes)
+
+    async def stream_and_close():
+        tokens = service.astream_chat("What do fixed deposits pay?", session_id="s")
+        await tokens.__anext__()
+        await tokens.__anext__()
+        begin = time.perf_counter()
+        await tokens.aclose()
+        return time.perf_counter() - begin
+
+    assert asyncio.run(stream_and_close()) < 3 * TOKEN_MS / 1000.0
+    assert history(service, "s") == []
+
+
+def test_a_finished_stream_is_added_to_the_history(tmp_path):
+    service = chat_service(tmp_path)
+    answer = "".join(service.stream_chat("What do fixed deposits pay?", session_id="s"))
+
+    assert [(message.role.value, message.content) for message in history(service, "s")] == [
+        ("user", "What do fixed deposits pay?"),
+        ("assistant", answer),
+    ]
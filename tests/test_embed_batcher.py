@@ -0,0 +1,80 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from rag.manager.embed_batcher import BatchedQueryEmbedding
+from benchmarks.fakes import FakeEmbedding
+
+CALLERS = 8
+
+
+class Backend:
+    """Records every call; the first one is held until the other callers are queued behind it."""
+
+    def __init__(self, error=None):
+        self.embed_model = FakeEmbedding()
+        self.error = error
+        self.calls = []
+        self.batcher = None
+        self.started = threading.Event()
+
+    def embed_queries(self, queries):
+        if not self.calls:
+            self.started.set()
+            deadline = time.monotonic() + 5
+            while self.batcher.stats()["queued"] < CALLERS and time.monotonic() < deadline:
+                time.sleep(0.001)
+        self.calls.append(list(queries))
+        if self.error is not None:
+            raise self.error
+        return self.embed_model.get_text_embedding_batch(queries)
+
+
+def batcher(backend):
+    backend.batcher = BatchedQueryEmbedding(backend.embed_model, backend.embed_queries, max_batch_size=16)
+    return backend.batcher
+
+
+def embed_concurrently(backend, queries):
+    """The first query keeps the worker busy while the others arrive."""
+    embedding = batcher(backend)
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        first = executor.submit(embedding.get_query_embedding, queries[0])
+        backend.started.wait(5)
+        rest = [executor.submit(embedding.get_query_embedding, query) for query in queries[1:]]
+        return [future.result() for future in [first, *rest]]
+
+
+def test_concurrent_queries_are_sent_in_one_call():
+    backend = Backend()
+    queries = [f"question {i} about savings rates" for i in range(CALLERS + 1)]
+
+    embed_concurrently(backend, queries)
+
+    assert [len(call) for call in backend.calls] == [1, CALLERS]
+    assert sorted(backend.calls[1]) == sorted(queries[1:])
+    assert backend.batcher.stats()["max_batch_size"] == CALLERS
+
+
+def test_each_caller_gets_the_embedding_of_its_own_query():
+    backend = Backend()
+    queries = [f"question {i} about savings rates" for i in range(CALLERS + 1)]
+
+    embeddings = embed_concurrently(backend, queries)
+
+    assert embeddings == [backend.embed_model.get_query_embedding(query) for query in queries]
+
+
+def test_a_backend_error_reaches_every_waiter():
+    backend = Backend(error=ValueError("embedding server unavailable"))
+    embedding = batcher(backend)
+
+    with ThreadPoolExecutor(max_workers=CALLERS + 1) as executor:
+        futures = [executor.submit(embedding.get_query_embedding, f"question {i}") for i in range(CALLERS + 1)]
+        for future in futures:
+            with pytest.raises(ValueError, match="embedding server unavailable"):
+                future.result()
+
+    assert sum(len(call) for call in backend.calls) == CALLERS + 1
@@ -0,0 +1,111 @@
+from dataclasses import replace
+
+import pytest
+from injector import Injector
+from llama_index.core import Document
+from qdrant_client import QdrantClient
+
+from rag.config import Config
+from rag.manager.index_manager import IndexManager
+from rag.services.ingest_jobs import JobCancelled
+from benchmarks.fakes import FakeEmbedding, FakeLLM
+from benchmarks.harness import BenchmarkModule
+
+
+def pages(file_name, count):
+    return [
+        Document(text=f"{file_name} page {page} about savings rates", id_=f"{file_name}::page-{page}",
+                 metadata={"file_name": file_name, "page": page})
+        for page in range(count)
+    ]
+
+
+def index_manager(tmp_path, client):
+    config = replace(Config(), LOCAL_DATA_PATH=str(tmp_path), SHOW_PROGRESS=False, RERANK_ENABLED=False)
+    return Injector([BenchmarkModule(config, client, FakeLLM(), FakeEmbedding())]).get(IndexManager)
+
+
+def test_delete_file_removes_its_nodes_from_the_docstore(tmp_path):
+    client = QdrantClient(":memory:")
+    manager = index_manager(tmp_path, client)
+    manager.ingest(pages("a.pdf", 3) + pages("b.pdf", 2))
+
+    assert manager.delete_file("a.pdf") == 3
+
+    # A restart rebuilds the catalog and sparse index from the docstore when they are missing,
+    # so nodes left behind there would bring the deleted file back.
+    restarted = index_manager(tmp_path, client)
+    docstore = restarted.storage_context.docstore
+    assert sorted(node.ref_doc_id for node in docstore.docs.values()) == ["b.pdf::page-0", "b.pdf::page-1"]
+    assert docstore.get_document_hash("a.pdf::page-0") is None
+    assert [file.file_name for file in restarted.catalog.list_files()] == ["b.pdf"]
+    assert len(restarted.ingest(pages("a.pdf", 3))) == 3
+
+
+def test_reingesting_a_changed_page_replaces_its_nodes(tmp_path):
+    client = QdrantClient(":memory:")
+    manager = index_manager(tmp_path, client)
+    manager.ingest(pages("a.pdf", 2))
+    changed = pages("a.pdf", 2)
+    changed[1].set_content("a.pdf page 1 about loan charges")
+    searchable_while_embedding = []
+
+    def progress(event, count):
+        if event == "nodes_embedded":
+            searchable_while_embedding.append(client.count(Config().QDRANT_COLLECTION).count)
+
+    assert manager.ingest_stream([changed], progress) == 1
+
+    # The previous version of the page is only dropped once the new one is indexed.
+    assert searchable_while_embedding == [2]
+    docstore = manager.storage_context.docstore
+    node_ids = docstore.get_ref_doc_info("a.pdf::page-1").node_ids
+    assert [docstore.get_node(node_id).get_content() for node_id in node_ids] == ["a.pdf page 1 about loan charges"]
+    assert len(docstore.docs) == 2
+    assert client.count(Config().QDRANT_COLLECTION).count == 2
+    assert manager.sparse_index.count() == 2
+
+
+def cancel_on(stage):
+    def progress(event, count):
+        if event == stage:
+            raise JobCancelled("job")
+    return progress
+
+
+def page_texts(manager):
+    docstore = manager.storage_context.docstore
+    return sorted(node.get_content() for node in docstore.docs.values())
+
+
+def test_cancelling_a_batch_before_it_is_committed_keeps_the_old_pages(tmp_path):
+    client = QdrantClient(":memory:")
+    manager = index_manager(tmp_path, client)
+    manager.ingest(pages("a.pdf", 3))
+    changed = pages("a.pdf", 3)
+    for document in changed:
+        document.set_content(document.get_content().replace("savings rates", "loan charges"))
+
+    with pytest.raises(JobCancelled):
+        manager.ingest_stream([changed], cancel_on("nodes_embedded"))
+
+    assert page_texts(manager) == [f"a.pdf page {page} about savings rates" for page in range(3)]
+    assert client.count(Config().QDRANT_COLLECTION).count == 3
+    assert manager.sparse_index.count() == 3
+
+
+def test_cancelling_a_batch_after_it_is_committed_drops_the_old_pages(tmp_path):
+    client = QdrantClient(":memory:")
+    manager = index_manager(tmp_path, client)
+    manager.ingest(pages("a.pdf", 3))
+    changed = pages("a.pdf", 3)
+    for document in changed:
+        document.set_content(document.get_content().replace("savings rates", "loan charges"))
+
+    with pytest.raises(JobCancelled):
+        manager.ingest_stream([changed], cancel_on("nodes_upserted"))
+
+    # A resumed job finds these pages unchanged, so their old nodes would never be removed.
+    assert page_texts(manager) == [f"a.pdf page {page} about loan charges" for page in range(3)]
+    assert client.count(Config().QDRANT_COLLECTION).count == 3
+    assert manager.sparse_index.count() == 3
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from rag.manager.session_manager import ChatSession
+
+
+def session():
+    return ChatSession("s", chat_engine=SimpleNamespace(), memory=SimpleNamespace(), created_at=0.0, last_used=0.0)
+
+
+def test_async_turns_wait_for_a_sync_turn_of_the_same_session():
+    chat_session = session()
+    order = []
+
+    async def async_turn():
+        async with chat_session.async_lock():
+            order.append("async")
+
+    with chat_session.lock:
+        thread = threading.Thread(target=asyncio.run, args=(async_turn(),))
+        thread.start()
+        thread.join(0.2)
+        order.append("sync")
+    thread.join()
+
+    assert order == ["sync", "async"]
+
+
+def test_a_cancelled_wait_does_not_keep_the_lock():
+    chat_session = session()
+
+    async def cancel_while_waiting():
+        waiter = asyncio.ensure_future(chat_session.async_lock().__aenter__())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        chat_session.lock.release()
+        await asyncio.sleep(0.05)
+
+    chat_session.lock.acquire()
+    asyncio.run(cancel_while_waiting())
+
+    assert chat_session.lock.acquire(timeout=1)
@@ -0,0 +1,94 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from rag.config import Config
+from rag.manager.voice.audio_io import SAMPLE_RATE, wav_bytes, wav_chunks
+from rag.manager.voice.vad import END, SEGMENT, EnergyVAD
+from rag.services.voice_service import VoiceChatService
+
+
+def speech(ms):
+    t = np.arange(int(SAMPLE_RATE * ms / 1000)) / SAMPLE_RATE
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(ms):
+    return np.zeros(int(SAMPLE_RATE * ms / 1000), dtype=np.float32)
+
+
+def write_wav(tmp_path, *parts):
+    path = tmp_path / "input.wav"
+    path.write_bytes(wav_bytes(np.concatenate(parts)))
+    return str(path)
+
+
+def vad_events(path, vad, chunk_ms=30):
+    events = [event for chunk in wav_chunks(path, chunk_ms=chunk_ms) for event in vad.feed(chunk)]
+    return events + vad.flush()
+
+
+def test_vad_segments_on_a_short_pause_and_ends_on_a_long_one(tmp_path):
+    path = write_wav(tmp_path, silence(300), speech(600), silence(400), speech(600), silence(1000))
+
+    events = vad_events(path, EnergyVAD(segment_silence_ms=300, end_silence_ms=800))
+
+    # The final pause first closes the second segment, then the utterance; the trailing
+    # silence is dropped, so the end carries no audio.
+    assert [event for event, _ in events] == [SEGMENT, SEGMENT, END]
+    for _, audio in events[:2]:
+        assert 0.6 <= audio.size / SAMPLE_RATE <= 1.2
+    assert events[2][1].size == 0
+
+
+def test_vad_ends_an_utterance_at_max_length(tmp_path):
+    path = write_wav(tmp_path, speech(2500))
+
+    events = vad_events(path, EnergyVAD(max_utterance_s=1.0))
+
+    assert [event for event, _ in events] == [END, END, END]
+    assert events[0][1].size / SAMPLE_RATE <= 1.1
+
+
+def test_vad_ignores_silence(tmp_path):
+    assert vad_events(write_wav(tmp_path, silence(2000)), EnergyVAD()) == []
+
+
+class FakeChatService:
+    def __init__(self):
+        self.messages = []
+
+    def stream_chat(self, message, session_id=None, cancel_event=None):
+        self.messages.append(message)
+        yield from ["Deposits earn three ", "percent a year. ", "Loans cost seven ", "percent a year."]
+
+
+def voice_service(transcripts):
+    heard = iter(transcripts)
+    return VoiceChatService(
+        Config(),
+        chat_service=FakeChatService(),
+        voice_to_text=SimpleNamespace(transcribe_audio=lambda audio: next(heard)),
+        text_to_voice=SimpleNamespace(text_to_speech=lambda text: np.zeros(len(text), dtype=np.float32)),
+    )
+
+
+def test_streaming_voice_chat_answers_one_utterance_sentence_by_sentence(tmp_path):
+    path = write_wav(tmp_path, speech(600), silence(400), speech(600), silence(1000))
+    service = voice_service(["what are", "the rates"])
+
+    chunks = list(service.streaming_voice_chat(wav_chunks(path)))
+
+    assert service.chat_service.messages == ["what are the rates"]
+    assert [chunk.text for chunk in chunks] == ["Deposits earn three percent a year.", "Loans cost seven percent a year."]
+    assert all(chunk.transcription == "what are the rates" for chunk in chunks)
+
+
+def test_streaming_voice_chat_stops_listening_at_the_end_of_the_utterance(tmp_path):
+    # One large chunk holds the end of the first utterance and all of a second one.
+    path = write_wav(tmp_path, speech(600), silence(1000), speech(600), silence(1000))
+    service = voice_service(["first question", "second question"])
+
+    list(service.streaming_voice_chat(wav_chunks(path, chunk_ms=5000)))
+
+    assert service.chat_service.messages == ["first question"]